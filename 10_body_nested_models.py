@@ -1,9 +1,41 @@
+from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import FastAPI, Path
-from pydantic import BaseModel, HttpUrl
+from fastapi import FastAPI, HTTPException, Path, Query, Request
+from pydantic import BaseModel, HttpUrl, TypeAdapter, ValidationError
 
-app = FastAPI()
+from bulk import BatchError, summary
+from fast_json import json_response
+from image_metadata import ImageMetadata
+from item_repository import SQLiteRepository
+from metrics import install_metrics
+from process_pool import ProcessPool
+from stream_ingest import STREAM_MAX_BODY_BYTES, install_body_limit, json_array_items, pipeline
+from tag_index import TagIndex
+
+# NOTE: CPU heavy work runs in other processes, the workers start with the app
+process_pool = ProcessPool()
+# NOTE: the PUT handlers save the items here ( see item_repository.py )
+items_repo = SQLiteRepository(collection="nested_items")
+# NOTE: tag -> item ids bitmaps, loaded from items_repo on startup and updated on every PUT
+#       ( see tag_index.py and /items_by_tags/ )
+tag_index = TagIndex()
+# NOTE: size / type of the item images, fetched in the background ( see image_metadata.py )
+image_metadata = ImageMetadata()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    async with process_pool.lifespan(app), items_repo.lifespan(app), image_metadata.lifespan(app):
+        await tag_index.load(items_repo.scan())  # the saved items survive a restart, the index too
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
+# NOTE: 413 for bodies over $MAX_BODY_BYTES, the streaming PUT takes up to $STREAM_MAX_BODY_BYTES
+install_body_limit(app, routes={"/items_model_stream/": STREAM_MAX_BODY_BYTES})
+install_metrics(app)  # /metrics ( added last -> outermost, counts the 413s too )
+image_metadata.install(app)
 
 
 class Item(BaseModel):
@@ -48,16 +80,24 @@ class ItemModel(BaseModel):
     image: Image | None = None
 
 
+class ItemModelRow(ItemModel):
+    item_id: int
+
+
 @app.put("/items/{item_id}")
 async def update_item(item_id: Annotated[int, Path()], item: Item):
+    await items_repo.upsert(item_id, item)
+    tag_index.update(item_id, item.tags)
     results = {"item_id": item_id, "item": item}
-    return results
+    return json_response(results)
 
 
 @app.put("/items_fix_string/{item_id}")
 async def update_item_fix_string(item_id: Annotated[int, Path()], item: Item):
+    await items_repo.upsert(item_id, item)
+    tag_index.update(item_id, item.tags)
     results = {"item_id": item_id, "item": item}
-    return results
+    return json_response(results)
 
 
 # NOTE: set type -> declare set instead of list in ItemSet
@@ -92,8 +132,10 @@ async def update_item_set(item_id: Annotated[int, Path()], item: ItemSet):
     }
 
     """
+    await items_repo.upsert(item_id, item)
+    tag_index.update(item_id, item.tags)
     results = {"item_id": item_id, "item": item}
-    return results
+    return json_response(results)
 
 
 # NOTE: Nested model
@@ -114,9 +156,128 @@ async def update_item_model(item_id: Annotated[int, Path()], item: ItemModel):
         }
     }
 
+    the response also has "image_metadata": width / height / type / sha256 of the image,
+    null until the image has been fetched once ( the fetch never delays the response )
     """
+    # before the write -> nothing after the save can turn a saved item into an error response
+    meta = image_metadata.lookup(item.image.url) if item.image is not None else None
+    await items_repo.upsert(item_id, item)
+    tag_index.update(item_id, item.tags)
     results = {"item_id": item_id, "item": item}
-    return results
+    if item.image is not None:
+        results["image_metadata"] = meta
+    return json_response(results)
+
+
+@app.get("/images/metadata/")
+async def read_image_metadata(url: str):
+    """
+    http://127.0.0.1:8000/images/metadata/?url=http://example.com/baz.jpg
+
+    200 + metadata when the image is known, 202 while it is being fetched
+    """
+    meta = image_metadata.lookup(url)
+    if meta is None:
+        return json_response({"url": url, "status": "pending"}, status_code=202)
+    return json_response(meta)
+
+
+# NOTE: query items by tags with the bitmap index instead of scanning every item
+@app.get("/items_by_tags/")
+async def read_items_by_tags(
+    all_of: Annotated[list[str], Query()] = [],
+    any_of: Annotated[list[str], Query()] = [],
+    none_of: Annotated[list[str], Query()] = [],
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """
+    http://127.0.0.1:8000/items_by_tags/?all_of=rock&all_of=metal&none_of=pop
+    -> ids of the items tagged rock AND metal AND NOT pop
+
+    http://127.0.0.1:8000/items_by_tags/?any_of=1&any_of=2&limit=10
+    -> ids of the items tagged 1 OR 2 ( ItemSet tags are indexed as strings )
+    """
+    result = tag_index.query(all_of, any_of, none_of)
+    return {"count": len(result), "item_ids": result.page(offset, limit)}
+
+
+# NOTE: CPU heavy validation in a process pool
+@process_pool.offload
+def summarize_item_models(body: bytes) -> dict:
+    """
+    runs in a worker process -> validating a big body doesn't block the event loop
+    """
+    try:
+        items = TypeAdapter(list[ItemModel]).validate_json(body)
+    except ValidationError as e:
+        return {"errors": e.errors(include_url=False, include_input=False, include_context=False)[:100]}
+    return {
+        "count": len(items),
+        "total_price": sum(item.price for item in items),
+        "tags": sorted(set().union(*(item.tags for item in items))),
+        "images": sum(item.image is not None for item in items),
+    }
+
+
+@app.put("/items_model_batch/")
+async def update_item_model_batch(request: Request):
+    """
+    request body = JSON array of ItemModel ( can be very big )
+
+    the body is validated in another process ( see process_pool.py ),
+    light endpoints of this app keep running on the event loop meanwhile.
+    """
+    summary = await summarize_item_models(await request.body())
+    if "errors" in summary:
+        return json_response({"detail": summary["errors"]}, status_code=422)
+    return json_response(summary)
+
+
+# NOTE: streaming ingestion -> the body is never in memory as a whole
+@app.put("/items_model_stream/")
+async def upsert_item_models_stream(request: Request):
+    """
+    request body = JSON array of ItemModel + item_id, hundreds of MB are fine
+
+    [
+        {"item_id": 1, "name": "Foo", "price": 42.0, "tags": ["rock"]},
+        {"item_id": 2, "name": "Bar", "price": 3.5, "image": {"url": "http://example.com/bar.jpg", "name": "Bar"}}
+    ]
+
+    every element is validated when it arrives and saved in batches of 500 while the rest
+    of the body is still read ( see stream_ingest.py ), the response is a summary like /items_bulk/.
+    """
+    received = created = failed = 0
+    errors: dict[int, list[dict]] = {}  # the first 100 bad rows
+
+    async def valid_rows():
+        nonlocal received, failed
+        async for row, item, row_errors in json_array_items(request, ItemModelRow):
+            received += 1
+            if row_errors is None:
+                yield item
+            else:
+                failed += 1
+                if len(errors) < 100:
+                    errors[row] = row_errors
+
+    async def save(batch: list[ItemModelRow]):
+        nonlocal created
+        created += await items_repo.upsert_many(
+            (item.item_id, item.model_dump_json(exclude={"item_id"}).encode()) for item in batch
+        )
+        for item in batch:
+            tag_index.update(item.item_id, item.tags)
+
+    try:
+        await pipeline(valid_rows(), save, batch_size=500)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = summary(received, created, received - failed - created, errors)
+    result["failed"] = failed
+    return json_response(result)
+
 
 #NOTE: special type and validation
 
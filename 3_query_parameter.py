@@ -1,24 +1,58 @@
-from fastapi import FastAPI
+from typing import Literal
 
-app = FastAPI()
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
 
-fake_items_db = list(
-    {
-        "id": i,
-        "name": f"Item {i}",
-        "description": f"Description for item {i}",
-        "price": round(10 + i * 0.5, 2),
-        "is_available": i % 3 != 0,
-        "category": ["electronics", "clothing", "food", "books", "toys"][i % 5],
-        "rating": round(3 + (i % 5) * 0.5, 1),
-        "created_at": f"2023-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
-    }
-    for i in range(0, 100)
-)
+from item_records import ItemTable
+from item_store import ItemStore, make_fake_items
+from metrics import install_metrics
+from shared_state import SharedResponseCache
+from single_flight import SingleFlight
+
+# NOTE: the response cache lives in shared memory -> a page cached by one worker is a hit in all of them
+shared_cache = SharedResponseCache("3_query_parameter", slots=4096, slot_bytes=16 * 1024)
+
+app = FastAPI(lifespan=shared_cache.lifespan)  # startup empties the cache of the last run
+install_metrics(app)  # /metrics
+shared_cache.install(app)
+
+# NOTE: concurrent identical requests share one run of the handler
+single_flight = SingleFlight()
+single_flight.install(app)
+
+
+
+class Item(BaseModel):
+    """
+    public item, built from a compact row only when it is sent
+    """
+
+    id: int
+    name: str
+    description: str | None = None
+    price: float
+    is_available: bool
+    category: str
+    rating: float
+    created_at: str
+    updated_at: str | None = None
+
+
+def to_items(rows) -> list[Item]:
+    # the rows are already typed -> model_construct skips validation
+    return [Item.model_construct(**row.to_dict()) for row in rows]
+
+
+# NOTE: rows are packed in columns ( see item_records.py ), not one dict per item
+fake_items_db = ItemTable.from_items(make_fake_items(100))
+
+# NOTE: index the rows once -> get by id is O(1), paging is a range slice
+items_store = ItemStore(rows=fake_items_db)
 
 
 # NOTE: query parameters
-@app.get("/items/")
+@app.get("/items/", response_model=list[Item])
+@shared_cache.cached(ttl=10)  # same skip/limit -> same page, keep the JSON for 10 seconds
 async def read_item(
     skip: int = 0, limit: int = 10
 ):  # skip and limit are query parameters
@@ -28,15 +62,37 @@ async def read_item(
     http://localhost:8000/items/?limit=20 ( pass only limit )
     http://localhost:8000/items/?skip=10&limit=1000 ( pass both skip and limit )
     """
-    return list(
-        item
-        for item in fake_items_db
-        if item["id"] >= skip and item["id"] < skip + limit
-    )
+    return to_items(items_store.id_range(skip, skip + limit))
+
+
+# NOTE: cursor ( keyset ) pagination
+@app.get("/items_cursor/")
+async def read_item_cursor(
+    limit: int = 10,
+    cursor: str | None = None,
+    order_by: Literal["id", "created_at", "updated_at"] = "id",
+):
+    """
+    skip/limit has to walk over `skip` rows and the pages shift when rows are added or removed.
+    the cursor remembers where the last page stopped -> every page costs the same.
+
+    http://localhost:8000/items_cursor/?limit=20 ( first page )
+    http://localhost:8000/items_cursor/?limit=20&cursor=<next_cursor> ( next page )
+    http://localhost:8000/items_cursor/?order_by=created_at
+
+    next_cursor = null -> this is the last page
+    """
+    try:
+        items, next_cursor = items_store.keyset_page(order_by, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": to_items(items), "next_cursor": next_cursor}
 
 
 # NOTE: optional parameters
 @app.get("/items/{item_id}")
+@shared_cache.cached(ttl=60)  # hits skip the handler
+@single_flight.coalesce()  # concurrent misses run it once
 async def read_items(
     item_id: int, q: str | None = None, short: bool = False
 ):  # q and short is optional parameter
@@ -85,15 +141,11 @@ async def read_user_query_item(item_id: int, needy: str):
     ✅ http://localhost:8000/item_query/55?needy=asdfadsf #you pass needy
     ❌ http://localhost:8000/item_query/55 # you need to pass needy query parameter
     """
-    item = filter(
-        lambda item: item["id"] == item_id, fake_items_db
-    )  # get filter iterator
-    item = list(item)[0]  # convert to list and get first element
-    return {"item": item, "needy": needy}
+    item = items_store.get(item_id)  # hash lookup instead of filter + list()[0]
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return {"item": Item.model_construct(**item.to_dict()), "needy": needy}
 
 
 if __name__ == "__main__":
-    item = filter(lambda item: item["id"] == 12, fake_items_db)
-    item = list(item)[0]
-    # item = item[0]
-    print(item)
+    print(to_items([items_store.get(12)]))
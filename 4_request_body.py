@@ -1,6 +1,11 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 
+from bulk import BatchError, summary, validate_batch
+from fast_json import json_response
+from item_repository import SQLiteRepository
+from metrics import install_metrics
+
 """
 request body = data that send from client to server(API)
 response body = data the send from server(API) to client
@@ -25,7 +30,15 @@ class Item(BaseModel):
     tax: float | None = None
 
 
-app = FastAPI()
+class BulkItem(Item):
+    item_id: int
+
+
+# NOTE: PUT handlers save here ( SQLite file $ITEMS_DB, WAL, see item_repository.py )
+items_repo = SQLiteRepository(collection="request_body_items")
+
+app = FastAPI(lifespan=items_repo.lifespan)
+install_metrics(app)  # /metrics
 
 
 @app.post("/items/")
@@ -33,8 +46,10 @@ async def create_item(item: Item):
     """
     use pydantic == request body
     fastapi will recognize the request body is pydantic class
+
+    json_response -> serialize the model to JSON bytes directly ( see fast_json.py )
     """
-    return item
+    return json_response(item)
 
 # NOTE: request body + path + query parameters
 @app.put("/items/{item_id}")
@@ -44,10 +59,51 @@ async def update_item(item_id:int, item: Item, q:str | None = None):
     item = request body
     q = query parameter
     """
+    await items_repo.upsert(item_id, item)  # committed before the response is sent
     result = {"item_id": item_id, **item.dict()}
     if q:
         result.update({"q": q})
-    return result
+    return json_response(result)
+
+
+# NOTE: bulk upsert -> many items in one request
+@app.put("/items_bulk/")
+async def upsert_items_bulk(request: Request):
+    """
+    body = JSON array or NDJSON ( Content-Type: application/x-ndjson ) of BulkItem
+
+    [
+        {"item_id": 1, "name": "Foo", "price": 42.0},
+        {"item_id": 2, "name": "Bar", "price": 3.5, "tax": 0.5}
+    ]
+
+    all rows are validated in one pass ( see bulk.py ).
+    bad rows are reported by row number, the good rows are still saved.
+    the response is a summary, the items are not sent back.
+    """
+    body = await request.body()
+    try:
+        valid, errors = validate_batch(
+            BulkItem, body, request.headers.get("content-type", "")
+        )
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # one transaction for the whole batch
+    created = await items_repo.upsert_many(
+        (row.item_id, row.model_dump_json(exclude={"item_id"}).encode()) for _, row in valid
+    )
+    return summary(len(valid) + len(errors), created, len(valid) - created, errors)
+
+
+@app.get("/items/{item_id}")
+async def read_item(item_id: int):
+    """
+    http://localhost:8000/items/42 ( an item saved by PUT /items/42 or PUT /items_bulk/ )
+    """
+    item = await items_repo.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return json_response({"item_id": item_id, **item})
 
 
 """
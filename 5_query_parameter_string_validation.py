@@ -1,10 +1,26 @@
-import random
+import hashlib
+import json
+from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import FastAPI, Query
+from fastapi import Body, Depends, FastAPI, Path, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import AfterValidator
 
-app = FastAPI()
+from id_catalog import IdCatalog
+from metrics import install_metrics
+from shared_state import SharedSnapshot
+from validators import CompiledQuery, cached_validator
+
+@asynccontextmanager
+async def lifespan(app):
+    # the shared id catalog is built / mapped on startup, not by the first request
+    async with id_catalog_snapshot.lifespan(app):  # defined below, next to its data
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
+install_metrics(app)  # /metrics
 
 #
 # @app.get("/items/")
@@ -187,6 +203,14 @@ data = {
     "imdb-tt0371724": "The Hitchhiker's Guide to the Galaxy",
     "isbn-9781439512982": "Isaac Asimov: The Complete Stories, Vol. 2",
 }
+# NOTE: sorted, array backed index of `data` -> O(1) random sample, prefix search ( see id_catalog.py )
+# kept once in shared memory for every worker, read in place ( see shared_state.py )
+id_catalog_snapshot = SharedSnapshot(
+    "id_catalog",
+    build=lambda: IdCatalog.from_mapping(data).to_bytes(),
+    load=IdCatalog.from_buffer,
+    version=hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16],
+)
 
 
 def check_valid_id(id: str):
@@ -199,9 +223,98 @@ def check_valid_id(id: str):
 async def read_item_custom_validation(
     id: Annotated[str | None, AfterValidator(check_valid_id)] = None,
 ):
+    id_catalog = id_catalog_snapshot.get()
     if id:
-        item = data.get(id)
+        item = id_catalog.get(id)
     else:
-        id, item = random.choice(list(data.items()))
+        id, item = id_catalog.sample()  # no list(data.items()) copy per request
     return {"id": id, "name": item}
 
+
+# NOTE: id catalog lookup
+@app.get("/item_ids/")
+async def read_item_ids(
+    prefix: Annotated[str | None, Query(max_length=50)] = None,
+    type: Annotated[str | None, Query(max_length=20)] = None,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(gt=0, le=1000)] = 10,
+):
+    """
+    http://localhost:8000/item_ids/ ( count of ids per type )
+    http://localhost:8000/item_ids/?prefix=isbn-978 ( ids that start with isbn-978 )
+    http://localhost:8000/item_ids/?type=imdb ( every imdb id )
+    """
+    id_catalog = id_catalog_snapshot.get()
+    if prefix is not None:
+        items = id_catalog.prefix(prefix, offset, limit)
+    elif type is not None:
+        items = id_catalog.by_type(type, offset, limit)
+    else:
+        return {"total": len(id_catalog), "types": id_catalog.types()}
+    return {"items": [{"id": id, "name": name} for id, name in items]}
+
+
+@app.put("/item_ids/{id}")
+async def update_item_id(
+    id: Annotated[str, Path(max_length=50), AfterValidator(check_valid_id)],
+    name: Annotated[str, Body(embed=True, max_length=200)],
+):
+    """
+    add / rename one id, every worker reads the new catalog from its next request on
+
+    request body: {"name": "The Hitchhiker's Guide to the Galaxy"}
+    """
+
+    def change(catalog: IdCatalog) -> bytes:
+        return IdCatalog([*catalog.items(), (id, name)]).to_bytes()  # the new pair wins
+
+    # rebuilding is O(n log n) -> not on the event loop
+    generation = await run_in_threadpool(id_catalog_snapshot.update, change)
+    return {"id": id, "name": name, "generation": generation}
+
+
+# NOTE: compiled validation for hot endpoints
+"""
+the endpoints above are checked by FastAPI + pydantic on every request.
+the check itself is cheap, most of the time goes to FastAPI looking at the annotation
+of every parameter again. CompiledQuery ( see validators.py ) builds one check function
+at startup and reads the raw query string in a dependency:
+    ^fixquery$       -> q == "fixquery"
+    check_valid_id   -> memoized in a bounded LRU ( cached_validator )
+the rules are the same as the endpoints above, errors are still a 422.
+"""
+fixquery_query = CompiledQuery("q", min_length=3, max_length=50, pattern="^fixquery$")
+custom_id_query = CompiledQuery("id", validators=[cached_validator()(check_valid_id)])
+
+
+@app.get(
+    "/items_query_validate_compiled/",
+    openapi_extra={"parameters": [fixquery_query.parameter]},
+)
+async def read_item_query_validate_compiled(
+    q: Annotated[str | None, Depends(fixquery_query)],
+):
+    """
+    same as /items_query_validate/
+    """
+    if q:
+        return {"q": q}
+    return {"q": "success but no query"}
+
+
+@app.get(
+    "/item_custom_validation_compiled/",
+    openapi_extra={"parameters": [custom_id_query.parameter]},
+)
+async def read_item_custom_validation_compiled(
+    id: Annotated[str | None, Depends(custom_id_query)],
+):
+    """
+    same as /item_custom_validation/
+    """
+    id_catalog = id_catalog_snapshot.get()
+    if id:
+        item = id_catalog.get(id)
+    else:
+        id, item = id_catalog.sample()  # no list(data.items()) copy per request
+    return {"id": id, "name": item}
@@ -2,10 +2,19 @@ from typing import Annotated
 
 from fastapi import FastAPI, Path, Query
 
+from metrics import install_metrics
+from single_flight import SingleFlight
+
 app = FastAPI()
+install_metrics(app)  # /metrics
+
+# NOTE: concurrent identical requests share one run of the handler
+single_flight = SingleFlight()
+single_flight.install(app)
 
 
 @app.get("/items/{item_id}")
+@single_flight.coalesce()  # key: path + query ( item-query )
 async def read_items(
     item_id: Annotated[
         int,
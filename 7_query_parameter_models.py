@@ -1,9 +1,26 @@
+from datetime import date
 from typing import Annotated, Literal
 
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel, Field
 
-app = FastAPI()
+from item_columns import ColumnarCatalog
+from item_store import ItemStore, make_fake_items
+from metrics import install_metrics
+from ndjson import ndjson_response
+from shared_state import SharedResponseCache
+
+# NOTE: cached pages live in shared memory -> a hit for every worker ( see shared_state.py ),
+#       a page of 100 items is ~25 KB -> 64 KiB slots
+shared_cache = SharedResponseCache("7_query_parameter_models", slots=1024, slot_bytes=64 * 1024)
+
+app = FastAPI(lifespan=shared_cache.lifespan)  # startup empties the cache of the last run
+install_metrics(app)  # /metrics
+shared_cache.install(app)
+
+fake_items_db = list(make_fake_items(100))
+items_store = ItemStore(fake_items_db)
+catalog = ColumnarCatalog.from_items(fake_items_db)  # NumPy columns for filtering
 
 
 class FilterParams(BaseModel):
@@ -12,17 +29,89 @@ class FilterParams(BaseModel):
     tags: list[str] = []
     order_by: Literal["created_at", "updated_at"] = "created_at"
 
+
+class CatalogFilterParams(FilterParams):
+    category: str | None = None
+    is_available: bool | None = None
+    min_price: float | None = Field(None, ge=0)
+    max_price: float | None = Field(None, ge=0)
+    min_rating: float | None = Field(None, ge=0)
+    max_rating: float | None = Field(None, ge=0)
+    created_from: date | None = None
+    created_to: date | None = None
+
+
+class ExportParams(CatalogFilterParams):
+    limit: int | None = Field(None, gt=0)  # no upper bound, None -> every matching item
+    gzip: bool = False
+
+
+class CursorParams(BaseModel):
+    limit: int = Field(100, gt=0, le=100)
+    cursor: str | None = None  # next_cursor from the previous page
+    order_by: Literal["id", "created_at", "updated_at"] = "id"
+
+
 class TestFilter(BaseModel):
     # model_config = {"extra": "forbid"}
     test: int = Field(12, gt=0, le=100)
 
 
 @app.get("/items/")
-async def read_items(filter_query: Annotated[FilterParams, Query()]):
+@shared_cache.cached(ttl=10)
+async def read_items(filter_query: Annotated[CatalogFilterParams, Query()]):
     """
     for using pydantic models as query parameters, we need to install fastapi version 0.115.0 and above
+
+    the filters run on the NumPy columns of the catalog ( see item_columns.py )
+    http://localhost:8000/items/?tags=food&min_price=20&order_by=updated_at
+    http://localhost:8000/items/?category=books&is_available=true&created_from=2023-03-01&limit=5&offset=5
+    """
+    items = catalog.query(
+        order_by=filter_query.order_by,
+        offset=filter_query.offset,
+        limit=filter_query.limit,
+        **filter_query.model_dump(exclude={"order_by", "offset", "limit"}),
+    )
+    return {"filter_query": filter_query, "items": items}
+
+
+# NOTE: cursor pagination with a query parameter model
+@app.get("/items_cursor/")
+async def read_items_cursor(cursor_query: Annotated[CursorParams, Query()]):
+    """
+    offset has to skip `offset` rows first -> deep pages are slow.
+    cursor continues right after the last row of the previous page.
+
+    http://localhost:8000/items_cursor/?limit=10&order_by=updated_at
+    http://localhost:8000/items_cursor/?limit=10&order_by=updated_at&cursor=<next_cursor>
+    """
+    try:
+        items, next_cursor = items_store.keyset_page(
+            cursor_query.order_by, cursor_query.cursor, cursor_query.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# NOTE: streaming export ( NDJSON )
+@app.get("/items_export/")
+async def export_items(export_query: Annotated[ExportParams, Query()]):
+    """
+    the whole ( filtered ) catalog, one JSON item per line.
+    rows are serialized while they are sent -> the full list is never built in memory.
+
+    http://localhost:8000/items_export/
+    http://localhost:8000/items_export/?tags=food&order_by=updated_at
+    http://localhost:8000/items_export/?gzip=true ( Content-Encoding: gzip )
     """
-    return filter_query
+    filters = export_query.model_dump(exclude={"order_by", "offset", "limit", "gzip"})
+    positions = catalog.select(export_query.order_by, **filters)
+    stop = None if export_query.limit is None else export_query.offset + export_query.limit
+    positions = positions[export_query.offset : stop]
+    rows = catalog.iter_rows(positions)  # slice by slice, the selection is never a python list
+    return ndjson_response(rows, compress=export_query.gzip, filename="items.ndjson")
 
 #NOTE: Forbid Extra Query Parameters
 @app.get("/items_forbid/")
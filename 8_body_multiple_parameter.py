@@ -1,9 +1,44 @@
+from contextlib import asynccontextmanager
 from typing import Annotated, Literal
 
-from fastapi import Body, FastAPI, Path
+from fastapi import Body, FastAPI, HTTPException, Path
 from pydantic import BaseModel, Field
 
-app = FastAPI()
+from admission import AdmissionControl, RateLimit, RateLimiter
+from fast_json import json_response
+from item_repository import SQLiteRepository
+from metrics import install_metrics
+from stream_ingest import install_body_limit
+from write_behind import WriteBehind
+
+# NOTE: the multi body PUTs save the item here, $WRITE_BEHIND=1 -> queued + 202 ( see write_behind.py )
+items_repo = SQLiteRepository(collection="multiple_body_items")
+write_behind = WriteBehind(items_repo, max_batch=500, max_delay=0.05, max_pending=10_000)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # shutdown runs backwards -> the queue is drained before the database closes
+    async with items_repo.lifespan(app), write_behind.lifespan(app):
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
+install_body_limit(app)  # NOTE: 413 for bodies over $MAX_BODY_BYTES ( 16 MiB )
+install_metrics(app)  # /metrics
+write_behind.install(app)
+
+# NOTE: overload protection ( see admission.py ): 503 when requests queue too long, 429 per client
+admission = AdmissionControl(max_concurrency=64, max_queue=256, target=0.005)
+admission.install(app)
+# NOTE: $RATE_LIMIT_<name>=<rate>/<burst> or =off changes one limit, $RATE_LIMITS=off all of them
+rate_limiter = RateLimiter(
+    default=RateLimit.from_env("DEFAULT", rate=50, burst=100),
+    routes={  # the writes cost more
+        "PUT /items_multiple/{item_id}": RateLimit.from_env("PUT_ITEMS_MULTIPLE", rate=5, burst=10),
+    },
+)
+rate_limiter.install(app)
 
 """
 Note: passing body -> put, post, delete
@@ -41,7 +76,7 @@ async def update_item(
         results.update({"q": q})
     if item:
         results.update({"item": item})
-    return results
+    return json_response(results)
 
 
 # NOTE: multiple body
@@ -52,10 +87,11 @@ async def update_multiple_item(
     item: Item, #body
     user: User, #body
 ):
+    status_code = await write_behind.save(item_id, item)
     results = {"item_id": item_id, "item": item, "user": user}
     if filter_query:
         results.update({"filter_query": filter_query})
-    return results
+    return json_response(results, status_code=status_code)
 
 
 # NOTE: singular value in body -> pass single value in body
@@ -70,8 +106,9 @@ async def update_singular_body(
     for multiple value body -> use pydantic and Body
     for singular value body -> use Body
     """
+    status_code = await write_behind.save(item_id, item)
     results = {"item_id": item_id, "item": item, "user": user, "importance": importance}
-    return results
+    return json_response(results, status_code=status_code)
 
 
 # NOTE: mutiple body params and query
@@ -84,10 +121,11 @@ async def update_multiple_body_query(
     importance: Annotated[int, Body(gt=50)],
     q: str | None = None,  # query
 ):
+    status_code = await write_behind.save(item_id, item)
     results = {"item_id": item_id, "item": item, "user": user, "importance": importance}
     if q:
         results.update({"q": q})
-    return results
+    return json_response(results, status_code=status_code)
 
 
 # NOTE: embed a single body parameter
@@ -96,11 +134,22 @@ async def update_items_embed(
     item_id: Annotated[int, Path()], item: Annotated[Item, Body(embed=True)]
 ):
     results = {"item_id": item_id, "item": item}
-    return results
+    return json_response(results)
 
 @app.put("/items_no_embed/{item_id}")
 async def update_items_no_embed(
     item_id: Annotated[int, Path()], item: Annotated[Item, Body(embed=False)]
 ):
     results = {"item_id": item_id, "item": item}
-    return results
+    return json_response(results)
+
+
+@app.get("/items/{item_id}")
+async def read_item(item_id: int):
+    """
+    http://localhost:8000/items/42 ( also sees an item that is still in the write-behind queue )
+    """
+    item = await write_behind.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return json_response({"item_id": item_id, "item": item})
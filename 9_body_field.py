@@ -3,7 +3,15 @@ from typing import Annotated
 from fastapi import Body, FastAPI
 from pydantic import BaseModel, Field
 
-app = FastAPI()
+from fast_json import json_response
+from item_repository import SQLiteRepository
+from metrics import install_metrics
+
+# NOTE: PUT /items/{item_id} saves here ( see item_repository.py )
+items_repo = SQLiteRepository(collection="body_field_items")
+
+app = FastAPI(lifespan=items_repo.lifespan)
+install_metrics(app)  # /metrics
 
 """
 we can further validate inside for pydantic model with `Field`
@@ -28,5 +36,6 @@ class Item(BaseModel):
 
 @app.put("/items/{item_id}")
 async def update_item(item_id: int, item: Annotated[Item, Body()]):
+    await items_repo.upsert(item_id, item)
     results = {"item_id": item_id, "item": item}
-    return results
+    return json_response(results)
@@ -0,0 +1,364 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from metrics import Histogram
+
+"""
+overload protection: per client rate limits ( 429 ) and a global concurrency limit ( 503 )
+
+    rate_limiter = RateLimiter(
+        default=RateLimit(rate=50, burst=100),                        # every client, all routes
+        routes={"PUT /items_multiple/{item_id}": RateLimit(rate=5, burst=10)},
+    )
+    admission = AdmissionControl(max_concurrency=64, max_queue=256, target=0.005)
+
+    admission.install(app)      # after install_metrics(app)
+    rate_limiter.install(app)   # installed last -> runs first, a client over its limit costs nothing
+
+    RateLimit.from_env("PUT_ITEMS", rate=10, burst=20)  # $RATE_LIMIT_PUT_ITEMS=100/200 or =off
+
+RateLimiter: one token bucket per client ( and per client + route for the routes listed ).
+    a bucket holds up to `burst` tokens and gets `rate` tokens per second, a request takes one.
+    empty bucket -> 429 + Retry-After = seconds until the next token.
+    buckets live in an OrderedDict ( least recently used first ): every request is O(1), buckets
+    idle long enough to be full again are swept from the front, at most max_keys are kept
+    -> memory stays bounded with millions of distinct clients.
+
+AdmissionControl: at most max_concurrency requests run, the next ones wait in a FIFO queue.
+    CoDel style: the time a request waited is checked when it leaves the queue. when every
+    request of the last `interval` seconds waited more than `target`, the queue is standing
+    ( overload, not a burst ) -> requests that waited too long and new requests that would have
+    to wait get 503 + Retry-After until the wait is under target again. a full queue or a wait
+    over max_wait -> 503 too.
+
+NOTE:
+    /metrics is never limited ( exempt ).
+    $RATE_LIMITS=off turns every limit made with RateLimit.from_env off ( load tests ).
+    the client is the peer address, behind a proxy pass key=<scope -> str> ( e.g. X-Forwarded-For ).
+    the 429 / 503 of these middlewares are counted by their own metrics, not by the http_ ones.
+"""
+
+EXEMPT = frozenset({"/metrics"})
+
+
+def client_host(scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _path(scope) -> str:
+    return scope["path"].removeprefix(scope.get("root_path", ""))
+
+
+class RateLimit:
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+
+    @classmethod
+    def from_env(cls, name: str, rate: float, burst: int) -> "RateLimit | None":
+        """
+        $RATE_LIMIT_<name> = "<rate>/<burst>" replaces the limit, "off" ( or $RATE_LIMITS=off ) -> None
+        """
+        value = os.getenv(f"RATE_LIMIT_{name}", "").strip().lower()
+        if value == "off" or os.getenv("RATE_LIMITS", "").strip().lower() == "off":
+            return None
+        if value:
+            try:
+                rate_value, burst_value = value.split("/")
+                rate, burst = float(rate_value), int(burst_value)
+            except ValueError:
+                raise ValueError(f"$RATE_LIMIT_{name} must be <rate>/<burst> or off, not {value!r}") from None
+        return cls(rate, burst)
+
+
+class TokenBuckets:
+    """
+    key -> [tokens, last update], least recently used first
+    """
+
+    def __init__(self, limit: RateLimit, max_keys: int):
+        self.limit = limit
+        self.max_keys = max_keys
+        self.idle = limit.burst / limit.rate  # after this long a bucket is full = same as a new one
+        self._buckets: OrderedDict[object, list[float]] = OrderedDict()
+        self.evicted = 0
+
+    def take(self, key: object, now: float) -> float:
+        """
+        take one token: 0.0 if there was one, else the seconds until there is one
+        """
+        self._sweep(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            while len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)  # forgotten early: it starts again with a full bucket
+                self.evicted += 1
+            tokens = self.limit.burst
+            bucket = self._buckets[key] = [tokens, now]
+        else:
+            tokens = min(self.limit.burst, bucket[0] + (now - bucket[1]) * self.limit.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / self.limit.rate
+
+    def _sweep(self, now: float) -> None:
+        buckets = self._buckets
+        # the front is the least recently used -> stop at the first bucket still in use
+        while buckets and now - buckets[next(iter(buckets))][1] >= self.idle:
+            buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        default: RateLimit | None = None,
+        routes: dict[str, RateLimit | None] | None = None,
+        key: Callable[[dict], str] = client_host,
+        max_keys: int = 100_000,
+        exempt: Iterable[str] = EXEMPT,
+    ):
+        self.key = key
+        self.exempt = frozenset(exempt)
+        self.default = TokenBuckets(default, max_keys) if default is not None else None
+        # "PUT /items_multiple/{item_id}" -> buckets of that route, None = no limit
+        self.routes = {
+            route: TokenBuckets(limit, max_keys)
+            for route, limit in (routes or {}).items()
+            if limit is not None
+        }
+        self.allowed = 0
+        self.limited: dict[str, int] = {}
+        self.router_app: FastAPI | None = None
+
+    def _route(self, scope) -> str | None:
+        # the same matching the router does next, only needed when routes have their own limit
+        for route in self.router_app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f'{scope["method"]} {route.path}'
+        return None
+
+    def check(self, scope) -> tuple[str, float] | None:
+        """
+        None if the request may run, else ( limited route, seconds to wait )
+        """
+        now = time.monotonic()
+        client = self.key(scope)
+        if self.routes:
+            route = self._route(scope)
+            buckets = self.routes.get(route)
+            if buckets is not None:
+                wait = buckets.take(client, now)
+                if wait:
+                    return route, wait
+        if self.default is not None:
+            wait = self.default.take(client, now)
+            if wait:
+                return "default", wait
+        return None
+
+    def install(self, app: FastAPI) -> None:
+        """
+        429 middleware on app, allowed / limited requests and bucket counts on its /metrics
+        """
+        self.router_app = app
+        app.add_middleware(RateLimitMiddleware, limiter=self)
+        app.state.metrics.collectors.append(self.collect)
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP rate_limit_requests_total Requests allowed or limited ( 429 ) by rule."
+        yield "# TYPE rate_limit_requests_total counter"
+        yield f'rate_limit_requests_total{{result="allowed"}} {self.allowed}'
+        for rule, count in self.limited.items():
+            yield f'rate_limit_requests_total{{result="limited",rule="{rule}"}} {count}'
+        yield "# HELP rate_limit_buckets Token buckets kept in memory by rule."
+        yield "# TYPE rate_limit_buckets gauge"
+        rules = ([("default", self.default)] if self.default is not None else []) + list(self.routes.items())
+        for rule, buckets in rules:
+            yield f'rate_limit_buckets{{rule="{rule}"}} {len(buckets)}'
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _path(scope) in self.limiter.exempt:
+            return await self.app(scope, receive, send)
+        limited = self.limiter.check(scope)
+        if limited is None:
+            self.limiter.allowed += 1
+            return await self.app(scope, receive, send)
+        rule, wait = limited
+        self.limiter.limited[rule] = self.limiter.limited.get(rule, 0) + 1
+        response = JSONResponse(
+            {"detail": "Too many requests, try again later."},
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+        await response(scope, receive, send)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionControl:
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        max_queue: int = 256,
+        target: float = 0.005,
+        interval: float = 0.1,
+        max_wait: float = 1.0,
+        retry_after: int = 1,
+        exempt: Iterable[str] = EXEMPT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.target = target
+        self.interval = interval
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.exempt = frozenset(exempt)
+        self.active = 0
+        self.waiting = 0
+        self._waiters: deque[tuple[asyncio.Future, float]] = deque()
+        self._first_above = 0.0  # when the wait went over target, 0 = it is under
+        self.dropping = False
+        self.admitted = 0
+        self.shed: dict[str, int] = {"queue_full": 0, "standing_queue": 0, "timeout": 0}
+        self.wait = Histogram()
+
+    def _over_target(self, waited: float, now: float) -> bool:
+        """
+        CoDel: True while the wait stayed over target for a whole interval
+        """
+        if waited < self.target:
+            self._first_above = 0.0
+            self.dropping = False
+        elif not self._first_above:
+            self._first_above = now + self.interval
+        elif now >= self._first_above:
+            self.dropping = True
+        return self.dropping
+
+    async def acquire(self) -> None:
+        if self.active < self.max_concurrency and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            self.wait.observe(0.0)
+            return
+        if self.dropping:
+            self.shed["standing_queue"] += 1
+            raise Overloaded
+        if self.waiting >= self.max_queue:
+            self.shed["queue_full"] += 1
+            raise Overloaded
+        loop = asyncio.get_running_loop()
+        enqueued = loop.time()
+        waiter = loop.create_future()
+        self._waiters.append((waiter, enqueued))
+        self.waiting += 1
+        try:
+            admitted = await asyncio.wait_for(waiter, self.max_wait)
+        except TimeoutError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()  # the slot was handed over as the timeout fired -> pass it on
+            self.shed["timeout"] += 1
+            raise Overloaded
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()  # the slot was handed over just before the client went away
+            raise
+        finally:
+            self.waiting -= 1
+        if not admitted:
+            self.shed["standing_queue"] += 1
+            raise Overloaded
+        self.admitted += 1
+        self.wait.observe(loop.time() - enqueued)
+
+    def release(self) -> None:
+        # hand the slot to the oldest waiter, drop the ones that waited too long
+        now = asyncio.get_running_loop().time()
+        while self._waiters:
+            waiter, enqueued = self._waiters.popleft()
+            if waiter.done():
+                continue  # timed out / cancelled
+            if self._over_target(now - enqueued, now):
+                waiter.set_result(False)
+                continue
+            waiter.set_result(True)
+            return
+        self.active -= 1
+        self._first_above = 0.0  # the queue is empty -> no standing queue
+        self.dropping = False
+
+    def install(self, app: FastAPI) -> None:
+        """
+        503 middleware on app, running / queued requests, shed counts and queue waits on its /metrics
+        """
+        app.add_middleware(AdmissionMiddleware, control=self)
+        app.state.metrics.collectors.append(self.collect)
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP admission_active Requests running now."
+        yield "# TYPE admission_active gauge"
+        yield f"admission_active {self.active}"
+        yield "# HELP admission_queued Requests waiting for a slot."
+        yield "# TYPE admission_queued gauge"
+        yield f"admission_queued {self.waiting}"
+        yield "# HELP admission_dropping 1 while a standing queue is being shed."
+        yield "# TYPE admission_dropping gauge"
+        yield f"admission_dropping {int(self.dropping)}"
+        yield "# HELP admission_requests_total Requests admitted or shed ( 503 ) by reason."
+        yield "# TYPE admission_requests_total counter"
+        yield f'admission_requests_total{{result="admitted"}} {self.admitted}'
+        for reason, count in self.shed.items():
+            yield f'admission_requests_total{{result="shed",reason="{reason}"}} {count}'
+        yield "# HELP admission_queue_wait_seconds Time from arrival until the request may run."
+        yield "# TYPE admission_queue_wait_seconds histogram"
+        yield from self.wait.lines("admission_queue_wait_seconds", 'limiter="admission"')
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _path(scope) in self.control.exempt:
+            return await self.app(scope, receive, send)
+        try:
+            await self.control.acquire()
+        except Overloaded:
+            response = JSONResponse(
+                {"detail": "Server is overloaded, try again later."},
+                status_code=503,
+                headers={"Retry-After": str(self.control.retry_after)},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.release()
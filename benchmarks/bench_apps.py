@@ -0,0 +1,326 @@
+"""
+load test + latency benchmark for every tutorial app
+
+run from the repo root ( offline, everything runs on localhost ):
+    python -m benchmarks.bench_apps                              ( every app, in-process )
+    python -m benchmarks.bench_apps --apps main 3_query_parameter
+    python -m benchmarks.bench_apps --uvicorn                    ( real server on 127.0.0.1 )
+    python -m benchmarks.bench_apps --output after.json --compare before.json
+
+in-process -> httpx.AsyncClient + ASGITransport, no sockets, measures the app itself
+--uvicorn  -> start `uvicorn <module>:app` per app, measures app + server + HTTP parsing
+
+for every route: RPS and p50 / p95 / p99 latency with `--concurrency` clients
+sending requests one after another for `--duration` seconds.
+the handler column shows if the endpoint is `async def` or a normal `def`
+( normal def runs in the thread pool, compare e.g. main GET /items/{item_id} with GET /users/{user_id} ).
+
+--output writes JSON, --compare prints the change against an older JSON file and exits 1
+when a route got slower than --threshold ( p50 or RPS ) or when a route answered with
+non 2xx statuses in either run ( timing 429 / 404 / 500 answers is not timing the route ).
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ITEM = {"name": "Foo", "description": "The pretender", "price": 42.0, "tax": 3.2}
+USER = {"username": "dave", "full_name": "Dave Grohl"}
+ITEM_MODEL = {
+    **ITEM,
+    "tags": ["rock", "metal", "bar"],
+    "image": {"url": "http://example.com/baz.jpg", "name": "The Foo live"},
+}
+BULK = [{"item_id": i, **ITEM} for i in range(100)]
+
+# app module -> [(method, url, json body)]
+SCENARIOS = {
+    "main": [
+        ("GET", "/", None),
+        ("GET", "/users/me", None),
+        ("GET", "/users/42", None),
+        ("GET", "/items/42?q=somequery", None),
+        ("PUT", "/items/42", {"name": "Foo", "price": 42.0, "is_offer": True}),
+        ("GET", "/models/alexnet", None),
+        ("GET", "/files/home/johndoe/myfile.txt", None),
+    ],
+    "3_query_parameter": [
+        ("GET", "/items/?skip=10&limit=20", None),
+        ("GET", "/items_cursor/?limit=20", None),
+        ("GET", "/items/20?short=False&q=hahahaha", None),
+        ("GET", "/users/99/items/50?q=query", None),
+        ("GET", "/item_query/55?needy=sooooneedy", None),
+    ],
+    "4_request_body": [
+        ("POST", "/items/", ITEM),
+        ("PUT", "/items/42?q=query", ITEM),
+        ("PUT", "/items_bulk/", BULK),
+    ],
+    "5_query_parameter_string_validation": [
+        ("GET", "/items/?q=abc", None),
+        ("GET", "/items_query_validate/?q=fixquery", None),
+        ("GET", "/items_query_list/?q=a&q=b&q=c", None),
+        ("GET", "/items_alias/?item-query=kan", None),
+        ("GET", "/item_custom_validation/?id=isbn-9781529046137", None),
+        ("GET", "/item_custom_validation/", None),
+    ],
+    "6_path_parameters_numeric_validation": [
+        ("GET", "/items/123?item-query=a", None),
+        ("GET", "/items_validate/50?q=a", None),
+        ("GET", "/items_float_validate/5.5?size=2.5", None),
+    ],
+    "7_query_parameter_models": [
+        ("GET", "/items/?tags=food&limit=20", None),
+        ("GET", "/items/?min_price=20&is_available=true&order_by=updated_at", None),
+        ("GET", "/items_cursor/?limit=20", None),
+        ("GET", "/items_export/?tags=food", None),
+        ("GET", "/items_forbid/?test=13", None),
+    ],
+    "8_body_multiple_parameter": [
+        ("PUT", "/items/50?q=a", ITEM),
+        ("PUT", "/items_multiple/1", {"filter_query": {"limit": 10}, "item": ITEM, "user": USER}),
+        ("PUT", "/items_singular_body/1", {"item": ITEM, "user": USER, "importance": 5}),
+        ("PUT", "/items_multiple_body_query/1?q=a", {"item": ITEM, "user": USER, "importance": 60}),
+        ("PUT", "/items_embed/1", {"item": ITEM}),
+    ],
+    "9_body_field": [
+        ("PUT", "/items/1", {**ITEM, "description": "short"}),
+    ],
+    "10_body_nested_models": [
+        ("PUT", "/items/1", {**ITEM, "tags": ["a", 1]}),
+        ("PUT", "/items_set/1", {**ITEM, "tags": [1, 2, 3, 1]}),
+        ("PUT", "/items_model/1", ITEM_MODEL),
+    ],
+}
+
+
+def make_fixtures(root):
+    """
+    files for main's /files/... and /models/... routes ( $FILES_ROOT / $MODELS_ROOT ),
+    a fresh SQLite file for the PUT handlers ( $ITEMS_DB ) and no rate limits ( $RATE_LIMITS )
+    """
+    os.makedirs(os.path.join(root, "files", "home", "johndoe"))
+    with open(os.path.join(root, "files", "home", "johndoe", "myfile.txt"), "w") as f:
+        f.write("hello\n" * 1000)
+    os.makedirs(os.path.join(root, "models"))
+    for name in ("alexnet", "resnet", "lenet"):
+        with open(os.path.join(root, "models", name + ".bin"), "wb") as f:
+            f.write(os.urandom(1024 * 1024))
+    os.environ.setdefault("FILES_ROOT", os.path.join(root, "files"))
+    os.environ.setdefault("MODELS_ROOT", os.path.join(root, "models"))
+    os.environ.setdefault("ITEMS_DB", os.path.join(root, "items.db"))
+    # a few clients hammering one route = one client over its rate limit -> the run would time 429s
+    os.environ.setdefault("RATE_LIMITS", "off")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def handler_kind(app, method, url):
+    """
+    "async" / "sync" for the route that serves method + url
+    """
+    from starlette.routing import Match
+
+    scope = {"type": "http", "method": method, "path": url.split("?")[0], "root_path": ""}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            endpoint = getattr(route, "endpoint", None)
+            endpoint = inspect.unwrap(endpoint) if endpoint else endpoint
+            return "async" if inspect.iscoroutinefunction(endpoint) else "sync"
+    return "?"
+
+
+async def drive(client, method, url, body, concurrency, duration, warmup):
+    content = None if body is None else json.dumps(body).encode()
+    headers = {"content-type": "application/json"} if content else {}
+
+    async def one():
+        response = await client.request(method, url, content=content, headers=headers)
+        await response.aread()
+        return response.status_code
+
+    for _ in range(warmup):
+        await one()
+
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await one()
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p95_ms": percentile(latencies, 95) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1e3,
+        "status": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_port(port, process, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn did not start")
+
+
+async def bench_module(name, args):
+    module = importlib.import_module(name)
+    app = module.app
+    results = []
+
+    async def run_scenarios(client):
+        for method, url, body in SCENARIOS[name]:
+            result = await drive(
+                client, method, url, body, args.concurrency, args.duration, args.warmup
+            )
+            result.update(
+                {"app": name, "method": method, "url": url, "handler": handler_kind(app, method, url)}
+            )
+            results.append(result)
+            print(
+                f"{name:<38}{method:<5}{url[:44]:<46}{result['handler']:<7}"
+                f"{result['rps']:>9.0f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}  {result['status']}"
+            )
+
+    if args.uvicorn:
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{name}:app", "--app-dir", os.getcwd(),
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        )
+        try:
+            await wait_for_port(port, process)
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+                await run_scenarios(client)
+        finally:
+            process.terminate()
+            process.wait()
+    else:
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                await run_scenarios(client)
+    return results
+
+
+def non_2xx(result):
+    return sum(count for status, count in result["status"].items() if not status.startswith("2"))
+
+
+def compare(results, mode, old_path, threshold):
+    with open(old_path) as f:
+        data = json.load(f)
+    old = {(r["app"], r["method"], r["url"]): r for r in data["results"]}
+    print(f"\ncompared with {old_path} ( regression = slower than {threshold:.0%} )")
+    if data["meta"]["mode"] != mode:
+        print(f"WARNING: {old_path} was measured {data['meta']['mode']}, this run is {mode}")
+    regressions = 0
+    for r in results:
+        before = old.get((r["app"], r["method"], r["url"]))
+        if before is None:
+            continue
+        p50 = r["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        rps = r["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+        flag = ""
+        failed = {"before": non_2xx(before), "after": non_2xx(r)}
+        if any(failed.values()):
+            # the numbers time error answers -> a "speedup" here means nothing
+            flag = "  <-- NON-2XX " + ", ".join(
+                f"{run} {count}/{result['requests']}"
+                for (run, count), result in zip(failed.items(), (before, r))
+                if count
+            )
+            regressions += 1
+        elif p50 > threshold or rps < -threshold:
+            flag = "  <-- REGRESSION"
+            regressions += 1
+        print(f"{r['app']:<38}{r['method']:<5}{r['url'][:44]:<46}p50 {p50:+7.1%}  rps {rps:+7.1%}{flag}")
+    return regressions
+
+
+async def main_async(args):
+    print(
+        f"{'app':<38}{'':<5}{'route':<46}{'def':<7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    )
+    results = []
+    for name in args.apps:
+        results += await bench_module(name, args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per route")
+    parser.add_argument("--warmup", type=int, default=20, help="requests per route before measuring")
+    parser.add_argument("--uvicorn", action="store_true", help="run every app under uvicorn on 127.0.0.1")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an older run")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    mode = "uvicorn" if args.uvicorn else "in-process"
+    with tempfile.TemporaryDirectory() as fixtures:
+        make_fixtures(fixtures)
+        results = asyncio.run(main_async(args))
+    if args.output:
+        meta = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "mode": mode,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+        }
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if args.compare and compare(results, mode, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+benchmark: FastAPI default serialization vs fast_json for the nested ItemModel
+
+run from the repo root:
+    python -m benchmarks.bench_fast_json
+
+    default      -> jsonable_encoder(envelope) + json.dumps   ( what FastAPI does for a returned dict )
+    model_dump   -> model_dump() + json.dumps
+    fast_json    -> pydantic-core to_json(envelope)            ( fast_json.json_response )
+"""
+
+import argparse
+import importlib
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+
+from fast_json import dumps
+
+nested = importlib.import_module("10_body_nested_models")
+
+
+def make_envelope(n_tags):
+    item = nested.ItemModel(
+        name="Foo",
+        description="The pretender",
+        price=42.0,
+        tax=3.2,
+        tags={f"tag-{i}" for i in range(n_tags)},
+        image=nested.Image(url="http://example.com/baz.jpg", name="The Foo live"),
+    )
+    return {"item_id": 5, "item": item}
+
+
+def default_path(envelope):
+    return json.dumps(
+        jsonable_encoder(envelope), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def model_dump_path(envelope):
+    return json.dumps(
+        {"item_id": envelope["item_id"], "item": envelope["item"].model_dump(mode="json")},
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tags", type=int, nargs="+", default=[3, 50])
+    parser.add_argument("--number", type=int, default=20_000)
+    args = parser.parse_args()
+    for n_tags in args.tags:
+        envelope = make_envelope(n_tags)
+        assert json.loads(default_path(envelope)) == json.loads(dumps(envelope))
+        print(f"\nItemModel with {n_tags} tags, {len(dumps(envelope))} bytes")
+        baseline = None
+        for name, fn in [("default", default_path), ("model_dump", model_dump_path), ("fast_json", dumps)]:
+            seconds = min(timeit.repeat(lambda: fn(envelope), number=args.number, repeat=3)) / args.number
+            baseline = baseline or seconds
+            print(f"{name:<12}{seconds * 1e6:8.2f} us / response  ( {baseline / seconds:4.1f}x )")
+
+
+if __name__ == "__main__":
+    main()
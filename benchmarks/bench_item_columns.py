@@ -0,0 +1,93 @@
+"""
+benchmark: per-dict python filter + sort vs ColumnarCatalog ( NumPy masks )
+
+run from the repo root:
+    python -m benchmarks.bench_item_columns
+    python -m benchmarks.bench_item_columns --sizes 100000 1000000
+
+every query is: filter -> sort by created_at -> take one page of 100 rows
+"""
+
+import argparse
+import time
+from datetime import date
+
+from item_columns import ColumnarCatalog
+from item_store import make_fake_items
+
+QUERIES = {
+    "tag": {"tags": ["food"]},
+    "price range + available": {"min_price": 1000, "max_price": 50000, "is_available": True},
+    "category + rating + date": {
+        "category": "books",
+        "min_rating": 4.0,
+        "created_from": date(2023, 3, 1),
+        "created_to": date(2023, 9, 30),
+    },
+}
+
+
+def python_query(rows, tags=(), category=None, is_available=None, min_price=None,
+                 max_price=None, min_rating=None, created_from=None, created_to=None,
+                 offset=0, limit=100):
+    created_from = created_from and created_from.isoformat()
+    created_to = created_to and created_to.isoformat()
+    result = []
+    for item in rows:
+        if tags and any(tag != item["category"] for tag in tags):
+            continue
+        if category is not None and item["category"] != category:
+            continue
+        if is_available is not None and item["is_available"] != is_available:
+            continue
+        if min_price is not None and item["price"] < min_price:
+            continue
+        if max_price is not None and item["price"] > max_price:
+            continue
+        if min_rating is not None and item["rating"] < min_rating:
+            continue
+        if created_from is not None and item["created_at"] < created_from:
+            continue
+        if created_to is not None and item["created_at"] > created_to:
+            continue
+        result.append(item)
+    result.sort(key=lambda item: item["created_at"])
+    return result[offset : offset + limit]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(size, repeat):
+    rows = list(make_fake_items(size))
+    start = time.perf_counter()
+    catalog = ColumnarCatalog.from_items(rows)
+    build = time.perf_counter() - start
+    print(f"\nitems = {size:,}  ( ColumnarCatalog build {build * 1e3:.0f} ms )")
+    print(f"{'query':<28}{'python':>12}{'numpy':>12}{'speedup':>10}")
+    for name, filters in QUERIES.items():
+        expected = [item["id"] for item in python_query(rows, **filters)]
+        got = [item["id"] for item in catalog.query(**filters)]
+        assert expected == got, name
+        slow = best_of(lambda: python_query(rows, **filters), repeat)
+        fast = best_of(lambda: catalog.query(**filters), repeat)
+        print(f"{name:<28}{slow * 1e3:>9.1f} ms{fast * 1e3:>9.2f} ms{slow / fast:>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
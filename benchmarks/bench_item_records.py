@@ -0,0 +1,86 @@
+"""
+benchmark: memory of the item rows, list of dicts vs ItemTable ( item_records.py )
+
+run from the repo root:
+    python -m benchmarks.bench_item_records
+    python -m benchmarks.bench_item_records --n 100000
+
+tracemalloc counts every allocation made while the rows are built
+-> bytes per item of the rows themselves ( indexes of ItemStore not included ).
+also prints the time to read one row back as a dict and as the public pydantic Item.
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from pydantic import BaseModel
+
+from item_records import ItemTable
+from item_store import make_fake_items
+
+
+class Item(BaseModel):
+    # same fields as the public Item of 3_query_parameter.py
+    id: int
+    name: str
+    description: str | None = None
+    price: float
+    is_available: bool
+    category: str
+    rating: float
+    created_at: str
+    updated_at: str | None = None
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = build()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, size, seconds
+
+
+def per_call(fn, budget=0.5):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < budget:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.n
+    positions = [random.randrange(n) for _ in range(1000)]
+
+    print(f"{n:,} items")
+    print(f"{'layout':<16}{'bytes/item':>12}{'total MB':>10}{'build s':>9}{'row->dict us':>14}{'row->Item us':>14}")
+    layouts = (
+        ("list of dicts", lambda: list(make_fake_items(n)), dict),
+        ("ItemTable", lambda: ItemTable.from_items(make_fake_items(n)), lambda row: row.to_dict()),
+    )
+    for name, build, as_dict in layouts:
+        rows, size, seconds = traced(build)
+        to_dict = per_call(lambda: [as_dict(rows[p]) for p in positions]) / len(positions)
+        to_model = per_call(
+            lambda: [Item.model_construct(**as_dict(rows[p])) for p in positions]
+        ) / len(positions)
+        print(
+            f"{name:<16}{size / n:>12.1f}{size / 1e6:>10.1f}{seconds:>9.2f}"
+            f"{to_dict * 1e6:>14.2f}{to_model * 1e6:>14.2f}"
+        )
+        del rows
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+benchmark: linear scan over fake_items_db vs ItemStore indexes
+
+run from the repo root:
+    python -m benchmarks.bench_item_store
+    python -m benchmarks.bench_item_store --sizes 1000 100000
+
+compares the old code of 3_query_parameter.py
+    read_item            -> generator over every row, keep skip <= id < skip + limit
+    read_user_query_item -> list(filter(lambda ...))[0]
+with ItemStore.id_range / ItemStore.get
+"""
+
+import argparse
+import random
+import time
+
+from item_store import ItemStore, make_fake_items
+
+
+def scan_page(db, skip, limit):
+    return list(item for item in db if item["id"] >= skip and item["id"] < skip + limit)
+
+
+def scan_get(db, item_id):
+    return list(filter(lambda item: item["id"] == item_id, db))[0]
+
+
+def per_call(fn, args_list, budget=1.0):
+    """
+    call fn over args_list until budget seconds are spent, return seconds per call
+    """
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < budget:
+        for args in args_list:
+            fn(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def fmt(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.2f} us"
+    return f"{seconds * 1e3:9.2f} ms"
+
+
+def run(size, queries, budget):
+    db = list(make_fake_items(size))
+    start = time.perf_counter()
+    store = ItemStore(db)
+    build = time.perf_counter() - start
+
+    rng = random.Random(size)
+    ids = [(rng.randrange(size),) for _ in range(queries)]
+    pages = [(rng.randrange(size), 10) for _ in range(queries)]
+
+    # the scans are O(n), one pass over a 1e6 list is already tens of ms
+    scan_ids = ids[: max(1, queries // max(1, size // 1000))]
+    scan_pages = pages[: len(scan_ids)]
+
+    rows = [
+        ("get by id", per_call(lambda i: scan_get(db, i), scan_ids, budget),
+         per_call(store.get, ids, budget)),
+        ("page skip/limit", per_call(lambda s, l: scan_page(db, s, l), scan_pages, budget),
+         per_call(lambda s, l: store.id_range(s, s + l), pages, budget)),
+    ]
+    print(f"\nitems = {size:,}  ( ItemStore build {fmt(build)} )")
+    print(f"{'query':<18}{'scan':>14}{'indexed':>14}{'speedup':>12}")
+    for name, scan, indexed in rows:
+        print(f"{name:<18}{fmt(scan):>14}{fmt(indexed):>14}{scan / indexed:>11.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds per measurement")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries, args.budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+benchmark: memory of N workers with a private IdCatalog each vs one SharedSnapshot ( shared_state.py )
+
+run from the repo root:
+    python -m benchmarks.bench_shared_state
+    python -m benchmarks.bench_shared_state --workers 8 --n 2000000
+
+every worker loads the catalog, reads all of it once and reports its memory while every
+worker is still alive ( /proc/self/smaps_rollup ):
+    rss = pages the worker maps, shared pages are counted in every worker
+    pss = shared pages divided between the workers that map them -> the sum is the real total
+linux only.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from id_catalog import IdCatalog
+
+
+def make_pairs(n: int):
+    kinds = ("isbn", "imdb", "asin")
+    return ((f"{kinds[i % 3]}-{i:012d}", f"name {i % 1000}") for i in range(n))
+
+
+def memory() -> dict[str, int]:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0]) * 1024
+    return values
+
+
+def worker(mode: str, n: int, root: str, barrier) -> dict:
+    from shared_state import SharedSnapshot
+
+    start = time.perf_counter()
+    if mode == "private":
+        catalog = IdCatalog(make_pairs(n))
+    else:
+        snapshot = SharedSnapshot(
+            "bench_catalog",
+            build=lambda: IdCatalog(make_pairs(n)).to_bytes(),
+            load=IdCatalog.from_buffer,
+            root=root,
+        )
+        catalog = snapshot.get()
+    seconds = time.perf_counter() - start
+    assert sum(1 for _ in catalog.items()) == n  # touch every page
+    barrier.wait()  # every worker has its catalog now
+    result = {"seconds": seconds, **memory()}
+    barrier.wait()  # keep the mappings alive until everybody measured
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--n", type=int, default=1_000_000)
+    args = parser.parse_args()
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.workers} workers, {args.n:,} ids")
+    print(f"{'mode':<10}{'load s':>9}{'rss MB / worker':>17}{'pss MB total':>14}")
+    for mode in ("private", "shared"):
+        root = tempfile.mkdtemp(dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        try:
+            manager = context.Manager()
+            barrier = manager.Barrier(args.workers)
+            with context.Pool(args.workers) as pool:
+                results = pool.starmap(worker, [(mode, args.n, root, barrier)] * args.workers)
+            manager.shutdown()
+        finally:
+            shutil.rmtree(root)
+        rss = sum(r["rss"] for r in results) / len(results)
+        pss = sum(r["pss"] for r in results)
+        load = max(r["seconds"] for r in results)
+        print(f"{mode:<10}{load:>9.2f}{rss / 1e6:>17.1f}{pss / 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
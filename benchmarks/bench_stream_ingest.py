@@ -0,0 +1,98 @@
+"""
+benchmark: peak memory of a big JSON array body, whole body validation vs streaming ( stream_ingest.py )
+
+run from the repo root:
+    python -m benchmarks.bench_stream_ingest
+    python -m benchmarks.bench_stream_ingest --n 1000000
+
+the body is built before tracemalloc starts -> "peak MB" is what the validation itself holds
+on top of the body. the whole body version also needs the body in memory, the streaming one
+only needs one chunk of it ( --chunk bytes, like request.stream() ).
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from pydantic import BaseModel, TypeAdapter
+
+from stream_ingest import JsonArraySplitter, validate_elements
+
+
+class Image(BaseModel):
+    url: str
+    name: str
+
+
+class ItemModelRow(BaseModel):
+    # same fields as ItemModelRow of 10_body_nested_models.py
+    item_id: int
+    name: str
+    description: str | None = None
+    price: float
+    tax: float | None = None
+    tags: set[str] = set()
+    image: Image | None = None
+
+
+def make_body(n: int) -> bytes:
+    return json.dumps(
+        [
+            {
+                "item_id": i,
+                "name": f"Item {i}",
+                "description": "The pretender",
+                "price": 42.0 + i,
+                "tax": 3.2,
+                "tags": ["rock", "metal", f"tag{i % 50}"],
+                "image": {"url": f"http://example.com/{i % 1000}.jpg", "name": "The Foo live"},
+            }
+            for i in range(n)
+        ]
+    ).encode()
+
+
+def whole(body: bytes, chunk: int) -> int:
+    return len(TypeAdapter(list[ItemModelRow]).validate_json(body))
+
+
+def streamed(body: bytes, chunk: int, batch_size: int = 500) -> int:
+    splitter = JsonArraySplitter()
+    count = 0
+    batch = []
+    view = memoryview(body)
+    for start in range(0, len(body), chunk):
+        elements = splitter.feed(view[start : start + chunk])
+        for _, item, _ in validate_elements(ItemModelRow, elements, count + len(batch)):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                count += len(batch)
+                batch = []  # saved by the sink
+    splitter.close()
+    return count + len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=300_000)
+    parser.add_argument("--chunk", type=int, default=64 * 1024)
+    args = parser.parse_args()
+    body = make_body(args.n)
+    print(f"{args.n:,} items, body {len(body) / 1e6:.1f} MB, chunks of {args.chunk:,} bytes")
+    print(f"{'mode':<10}{'peak MB':>10}{'seconds':>10}{'items/s':>12}")
+    for name, run in (("whole", whole), ("streamed", streamed)):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = run(body, args.chunk)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert count == args.n
+        print(f"{name:<10}{peak / 1e6:>10.1f}{seconds:>10.2f}{count / seconds:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
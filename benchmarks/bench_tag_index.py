@@ -0,0 +1,83 @@
+"""
+benchmark: tag queries, scan of every item vs TagIndex bitmaps ( tag_index.py )
+
+run from the repo root:
+    python -m benchmarks.bench_tag_index
+    python -m benchmarks.bench_tag_index --n 200000
+
+every item gets a few tags out of --tags, common tags are much more frequent than rare ones.
+scan = check the tag set of every item, like a handler without an index would.
+"""
+
+import argparse
+import random
+import time
+
+from tag_index import TagIndex
+
+QUERIES = (
+    ("rock AND metal", {"all_of": ["tag0", "tag1"]}),
+    ("rock AND metal NOT pop", {"all_of": ["tag0", "tag1"], "none_of": ["tag2"]}),
+    ("rare AND common", {"all_of": ["tag40", "tag0"]}),
+    ("rare OR rare", {"any_of": ["tag45", "tag46"]}),
+    ("NOT common", {"none_of": ["tag0"]}),
+)
+
+
+def make_tags(n: int, tag_count: int, per_item: int, seed: int = 0) -> list[set[str]]:
+    rng = random.Random(seed)
+    names = [f"tag{i}" for i in range(tag_count)]
+    weights = [1 / (i + 1) for i in range(tag_count)]  # zipf like: tag0 is the most common
+    return [set(rng.choices(names, weights, k=rng.randint(0, per_item))) for _ in range(n)]
+
+
+def scan(items: list[set[str]], all_of=(), any_of=(), none_of=()) -> list[int]:
+    all_of, any_of, none_of = set(all_of), set(any_of), set(none_of)
+    return [
+        item_id
+        for item_id, tags in enumerate(items)
+        if all_of <= tags and (not any_of or any_of & tags) and not none_of & tags
+    ]
+
+
+def per_call(fn, budget=0.5):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < budget:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2_000_000)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--per-item", type=int, default=4)
+    args = parser.parse_args()
+
+    items = make_tags(args.n, args.tags, args.per_item)
+    index = TagIndex()
+    start = time.perf_counter()
+    for item_id, tags in enumerate(items):
+        index.update(item_id, tags)
+    build = time.perf_counter() - start
+    nbytes = index.nbytes()
+    print(f"{args.n:,} items, {args.tags} tags, index built in {build:.2f} s ({build / args.n * 1e6:.2f} us/update), bitmaps {nbytes / 1e6:.1f} MB")
+
+    print(f"{'query':<26}{'matches':>10}{'scan ms':>10}{'count ms':>10}{'page ms':>10}{'speedup':>9}")
+    for name, query in QUERIES:
+        expected = scan(items, **query)
+        result = index.query(**query)
+        assert len(result) == len(expected) and result.page(0, 100) == expected[:100], name
+        scan_time = per_call(lambda: scan(items, **query), budget=1.0)
+        count_time = per_call(lambda: len(index.query(**query)))
+        page_time = per_call(lambda: index.query(**query).page(0, 100))
+        print(
+            f"{name:<26}{len(expected):>10,}{scan_time * 1e3:>10.1f}{count_time * 1e3:>10.3f}"
+            f"{page_time * 1e3:>10.3f}{scan_time / page_time:>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
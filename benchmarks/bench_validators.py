@@ -0,0 +1,89 @@
+"""
+benchmark: Query() / AfterValidator validation vs CompiledQuery ( validators.py )
+
+run from the repo root:
+    python -m benchmarks.bench_validators
+
+every request goes through the whole app of 5_query_parameter_string_validation.py
+( ASGI call without a server or a client ), so the numbers include routing,
+validation, the handler and serialization.
+"""
+
+import argparse
+import asyncio
+import importlib
+import time
+
+PAIRS = [
+    ("/items_query_validate/", "/items_query_validate_compiled/", "q=fixquery"),
+    ("/items_query_validate/", "/items_query_validate_compiled/", "q=fixquerx"),
+    ("/item_custom_validation/", "/item_custom_validation_compiled/", "id=isbn-9781529046137"),
+    ("/item_custom_validation/", "/item_custom_validation_compiled/", "id=foo"),
+]
+
+
+async def request(app, path, query):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def per_request(app, path, query, number):
+    for _ in range(200):
+        await request(app, path, query)
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(number):
+            await request(app, path, query)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+async def main_async(number):
+    module = importlib.import_module("5_query_parameter_string_validation")
+    app = module.app
+    print(f"{'request':<48}{'status':>8}{'Query()':>12}{'compiled':>12}{'saved':>10}")
+    for path, compiled_path, query in PAIRS:
+        status = await request(app, path, query)
+        assert status == await request(app, compiled_path, query)
+        slow = await per_request(app, path, query, number)
+        fast = await per_request(app, compiled_path, query, number)
+        print(
+            f"{path + '?' + query:<48}{status:>8}{slow * 1e6:>9.1f} us{fast * 1e6:>9.1f} us"
+            f"{(slow - fast) / slow:>9.0%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.number))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import json
+from collections.abc import Sequence
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+"""
+batched validation for bulk endpoints
+
+one PUT per item -> 50k items = 50k HTTP round trips + 50k validations.
+a bulk endpoint takes every item in one body and validates them in one pass
+with TypeAdapter(list[Model]) ( pydantic-core parses and validates the JSON in rust ).
+
+    body = JSON array       [{"item_id": 1, ...}, {"item_id": 2, ...}]
+    body = NDJSON           {"item_id": 1, ...}\\n{"item_id": 2, ...}\\n
+
+NOTE:
+    a bad row doesn't fail the batch:
+    1. validate everything at once ( fast path, nothing is wrong )
+    2. on error -> collect the row numbers from the error locations,
+       validate the other rows again in one pass and report the bad ones
+    NDJSON lines are validated one by one ( a line is one row, whatever JSON it holds ).
+"""
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class BatchError(ValueError):
+    """the body itself can't be read ( not a JSON array, broken NDJSON ... )"""
+
+
+def _row_errors(error: ValidationError, offset: int = 0) -> dict[int, list[dict]]:
+    rows: dict[int, list[dict]] = {}
+    for e in error.errors(include_url=False, include_input=False, include_context=False):
+        row, *loc = e["loc"]
+        rows.setdefault(offset + row, []).append({"loc": loc, "msg": e["msg"]})
+    return rows
+
+
+def _validate_rows(adapter: TypeAdapter, rows: Sequence, index: Sequence[int]):
+    """
+    validate python rows ( already parsed ), index = row number of every row
+    """
+    try:
+        return list(zip(index, adapter.validate_python(rows))), {}
+    except ValidationError as e:
+        bad = {index[i]: errors for i, errors in _row_errors(e).items()}
+    good = [i for i in range(len(rows)) if index[i] not in bad]
+    models = adapter.validate_python([rows[i] for i in good])
+    return [(index[i], model) for i, model in zip(good, models)], bad
+
+
+def validate_json_array(adapter: TypeAdapter, body: bytes):
+    """
+    return ( [(row, model), ...], {row: [errors]} )
+    """
+    try:
+        return list(enumerate(adapter.validate_json(body))), {}
+    except ValidationError as e:
+        if any(not error["loc"] for error in e.errors(include_url=False)):
+            raise BatchError("Body must be a JSON array.") from e
+    rows = json.loads(body)
+    return _validate_rows(adapter, rows, range(len(rows)))
+
+
+def validate_ndjson(adapter: TypeAdapter, body: bytes):
+    """
+    every non empty line is one row, adapter = TypeAdapter(Model) of one row
+
+    each line is validated on its own: joined into one array, a line `{...},{...}` would pass
+    as two rows and shift the row number of every row after it.
+    """
+    valid, bad = [], {}
+    for i, line in enumerate(line for line in body.splitlines() if line.strip()):
+        try:
+            valid.append((i, adapter.validate_json(line)))
+        except ValidationError as e:
+            bad[i] = [
+                {"loc": list(error["loc"]), "msg": error["msg"]}
+                for error in e.errors(include_url=False, include_input=False, include_context=False)
+            ]
+    return valid, bad
+
+
+def validate_batch(model: type[BaseModel], body: bytes, content_type: str = ""):
+    """
+    validate a bulk body of `model` rows, JSON array or NDJSON ( by content type )
+    """
+    if content_type.split(";")[0].strip().lower() in NDJSON_TYPES:
+        return validate_ndjson(_adapter(model), body)
+    return validate_json_array(_adapter(list[model]), body)
+
+
+_adapters: dict[object, TypeAdapter] = {}
+
+
+def _adapter(type_: object) -> TypeAdapter:
+    # building a TypeAdapter compiles a validator -> do it once per type ( Model / list[Model] )
+    adapter = _adapters.get(type_)
+    if adapter is None:
+        adapter = _adapters[type_] = TypeAdapter(type_)
+    return adapter
+
+
+def summary(received: int, created: int, updated: int, errors: dict, max_errors: int = 100) -> dict:
+    return {
+        "received": received,
+        "created": created,
+        "updated": updated,
+        "failed": len(errors),
+        "errors": [
+            {"row": row, "errors": errors[row]} for row in sorted(errors)[:max_errors]
+        ],
+    }
@@ -0,0 +1,144 @@
+import functools
+import time
+from collections.abc import Iterable
+
+import anyio
+import anyio.to_thread
+from fastapi import FastAPI, HTTPException
+
+from metrics import Histogram
+
+"""
+bounded thread pool for normal `def` handlers
+
+FastAPI runs every `def` handler in AnyIO's default thread limiter ( 40 threads for the
+whole process ). when all threads are busy new requests wait in a hidden, unbounded queue
+-> latency grows without limit and nothing shows it.
+
+    thread_pool = ThreadPool(max_workers=16, max_queue=64)
+    thread_pool.install(app)  # queue metrics on /metrics
+
+    @app.get("/items/{item_id}")
+    @thread_pool.offload(max_concurrency=8, max_queue=32)
+    def read_item(item_id: int): ...
+
+    max_workers      -> threads of this app running handlers at the same time
+    max_concurrency  -> threads one route may use ( a slow route can't take the whole pool )
+    max_queue        -> requests allowed to wait, one more -> 503 + Retry-After right away
+
+NOTE:
+    the queue counters are only touched on the event loop thread -> no locks.
+    queue wait = time from the request entering the queue until a thread starts the handler.
+"""
+
+
+class RouteStats:
+    __slots__ = ("limiter", "max_queue", "pending", "running", "rejected", "completed", "wait")
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.limiter = anyio.CapacityLimiter(max_concurrency)
+        self.max_queue = max_queue
+        self.pending = 0  # waiting + running
+        self.running = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait = Histogram()
+
+    @property
+    def queued(self) -> int:
+        return self.pending - self.running
+
+
+class ThreadPool:
+    def __init__(self, max_workers: int = 40, max_queue: int = 100, name: str = "default"):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.limiter = anyio.CapacityLimiter(max_workers)
+        self.pending = 0
+        self.routes: dict[str, RouteStats] = {}
+
+    def offload(
+        self,
+        max_concurrency: int | None = None,
+        max_queue: int | None = None,
+        retry_after: int = 1,
+    ):
+        """
+        run a normal def handler in this pool instead of the default AnyIO limiter
+        """
+
+        def decorator(func):
+            stats = self.routes[func.__name__] = RouteStats(
+                max_concurrency or self.max_workers,
+                self.max_queue if max_queue is None else max_queue,
+            )
+            capacity = stats.limiter.total_tokens
+
+            def run(started: list, args, kwargs):
+                started.append(time.perf_counter())
+                return func(*args, **kwargs)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if (
+                    stats.pending >= capacity + stats.max_queue
+                    or self.pending >= self.max_workers + self.max_queue
+                ):
+                    stats.rejected += 1
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Server is busy, try again later.",
+                        headers={"Retry-After": str(retry_after)},
+                    )
+                stats.pending += 1
+                self.pending += 1
+                enqueued = time.perf_counter()
+                started = []
+                try:
+                    async with stats.limiter:
+                        stats.running += 1
+                        try:
+                            return await anyio.to_thread.run_sync(
+                                run, started, args, kwargs, limiter=self.limiter
+                            )
+                        finally:
+                            stats.running -= 1
+                finally:
+                    stats.pending -= 1
+                    self.pending -= 1
+                    if started:  # the handler ran, returned or raised
+                        stats.wait.observe(started[0] - enqueued)
+                        stats.completed += 1
+
+            return wrapper
+
+        return decorator
+
+    def collect(self) -> Iterable[str]:
+        pool = f'pool="{self.name}"'
+        yield "# HELP thread_pool_size Threads a pool may run at the same time."
+        yield "# TYPE thread_pool_size gauge"
+        yield f"thread_pool_size{{{pool}}} {self.max_workers}"
+        for metric, kind, help_text, value in (
+            ("thread_pool_queued", "gauge", "Requests waiting for a thread.", lambda s: s.queued),
+            ("thread_pool_running", "gauge", "Requests running in a thread.", lambda s: s.running),
+            ("thread_pool_rejected_total", "counter", "Requests rejected with 503.", lambda s: s.rejected),
+            ("thread_pool_completed_total", "counter", "Requests finished.", lambda s: s.completed),
+        ):
+            yield f"# HELP {metric} {help_text}"
+            yield f"# TYPE {metric} {kind}"
+            for route, stats in self.routes.items():
+                yield f'{metric}{{{pool},handler="{route}"}} {value(stats)}'
+        yield "# HELP thread_pool_queue_wait_seconds Time from queueing until a thread starts the handler."
+        yield "# TYPE thread_pool_queue_wait_seconds histogram"
+        for route, stats in self.routes.items():
+            yield from stats.wait.lines(
+                "thread_pool_queue_wait_seconds", f'{pool},handler="{route}"'
+            )
+
+    def install(self, app: FastAPI) -> None:
+        """
+        queue / running / wait metrics of every offloaded route on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)
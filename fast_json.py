@@ -0,0 +1,40 @@
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+"""
+fast JSON responses for pydantic models
+
+when a handler returns a model ( or {"item_id": item_id, "item": item} ) FastAPI does:
+    return value -> jsonable_encoder ( python walk, builds a new dict ) -> json.dumps -> bytes
+
+json_response() serializes straight to bytes with pydantic-core ( rust ):
+    return value -> to_json -> bytes
+
+    @app.put("/items/{item_id}")
+    async def update_item(item_id: int, item: Item):
+        return json_response({"item_id": item_id, "item": item})
+
+NOTE:
+    the handler returns a Response -> FastAPI sends it as it is and skips jsonable_encoder.
+    models inside dicts / lists are serialized by pydantic-core too ( no model_dump() ),
+    anything pydantic-core doesn't know goes through jsonable_encoder as a fallback.
+    NaN / inf become null ( the default JSONResponse raises an error for them ).
+"""
+
+
+def dumps(content: Any) -> bytes:
+    return to_json(content, fallback=jsonable_encoder, inf_nan_mode="null")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(
+    content: Any, status_code: int = 200, headers: dict[str, str] | None = None
+) -> FastJSONResponse:
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
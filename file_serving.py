@@ -0,0 +1,313 @@
+import mimetypes
+import mmap
+import os
+import stat
+import weakref
+from collections import OrderedDict
+from collections.abc import Iterable
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import FastAPI, HTTPException, Request, Response
+
+"""
+static files from a root directory without copying them through python
+
+FileResponse reads the file in 64 KB chunks into bytes objects -> a 2 GB model artifact
+is 2 GB of python buffers ( and CPU to fill them ) per download.
+
+    file_server = FileServer("/srv/files")  # default: $FILES_ROOT or ./files
+    file_server.install(app)  # fd cache metrics on /metrics
+
+    @app.get("/files/{file_path:path}")
+    @app.head("/files/{file_path:path}", include_in_schema=False)
+    async def read_file(file_path: str, request: Request):
+        return file_server.response(request, file_path)
+
+how the bytes leave:
+    server offers "http.response.zerocopy"  -> the open fd is handed to the server ( os.sendfile )
+    server offers "http.response.pathsend"  -> the server sends the file by path ( whole file only )
+    otherwise                               -> memoryview slices of an mmap, no copy on our side
+
+    Range: bytes=0-1023 / bytes=1024- / bytes=-512      -> 206 + Content-Range
+    range outside the file                               -> 416
+    If-None-Match / If-Modified-Since                    -> 304
+    If-Range with an old ETag or date                    -> the whole file ( 200 )
+
+NOTE:
+    open files are kept in a LRU ( max_open fds ), one stat() per request checks that the
+    file did not change ( inode, size, mtime ) -> a replaced file gets a new fd and a new ETag.
+    a file evicted while it is being sent is closed when the last response is done
+    ( or dropped unsent ).
+    paths are resolved with realpath and must stay inside root ( "..", symlinks out of
+    root, absolute paths -> 404 ).
+    several ranges in one header ( bytes=0-1,5-6 ) -> the whole file, no multipart answer.
+"""
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class OpenFile:
+    __slots__ = ("path", "file", "size", "mtime", "ident", "etag", "_map", "refs", "evicted")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb", buffering=0)
+        st = os.fstat(self.file.fileno())
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.ident = (st.st_ino, st.st_size, st.st_mtime_ns)
+        self.etag = f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self._map: mmap.mmap | None = None
+        self.refs = 0
+        self.evicted = False
+
+    def view(self) -> memoryview:
+        if self.size == 0:
+            return memoryview(b"")  # mmap can't map an empty file ( ValueError )
+        if self._map is None:
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def close(self) -> None:
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a slice still sits in a transport buffer -> unmapped when it is freed
+            self._map = None
+        self.file.close()
+
+
+class FileSendResponse(Response):
+    def __init__(
+        self,
+        entry: OpenFile,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: dict[str, str],
+        release,
+        head: bool = False,
+    ):
+        super().__init__(status_code=status_code, headers=headers)
+        self.entry = entry
+        self.start = start
+        self.end = end  # exclusive
+        # runs once: after the body is sent, or when the response is dropped without being sent
+        # ( a middleware replaced it, an error before send ) -> the entry is never pinned forever
+        self.release = weakref.finalize(self, release, entry)
+        self.head = head
+
+    async def __call__(self, scope, receive, send):
+        entry = self.entry
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            count = self.end - self.start
+            extensions = scope.get("extensions") or {}
+            if self.head or count == 0:
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopy" in extensions:
+                await send(
+                    {
+                        "type": "http.response.zerocopy",
+                        "file": entry.file,
+                        "offset": self.start,
+                        "count": count,
+                    }
+                )
+            elif "http.response.pathsend" in extensions and count == entry.size:
+                await send({"type": "http.response.pathsend", "path": entry.path})
+            else:
+                view = entry.view()
+                for offset in range(self.start, self.end, CHUNK_SIZE):
+                    stop = min(offset + CHUNK_SIZE, self.end)
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": view[offset:stop],
+                            "more_body": stop < self.end,
+                        }
+                    )
+        finally:
+            self.release()
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    one "bytes=" range -> (start, end exclusive), None -> send the whole file
+    raises ValueError when the range can't be satisfied ( -> 416 )
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        start = int(first) if first else None
+        stop = int(last) if last else None  # last byte, inclusive
+    except ValueError:
+        return None  # not a number -> ignore the header
+    if start is None:
+        # bytes=-512 -> the last 512 bytes
+        if stop is None:
+            return None
+        if stop == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - stop), size
+    if stop is not None and stop < start:
+        return None
+    if start >= size:
+        raise ValueError("range starts after the end of the file")
+    return start, size if stop is None else min(stop + 1, size)
+
+
+class FileServer:
+    def __init__(self, root: str | None = None, max_open: int = 64):
+        self.root = os.path.realpath(root or os.getenv("FILES_ROOT", "files"))
+        self.max_open = max_open
+        self._open: OrderedDict[str, OpenFile] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def resolve(self, file_path: str) -> str:
+        """
+        real path of file_path inside root, 404 for anything else
+        """
+        try:
+            path = os.path.realpath(os.path.join(self.root, file_path.lstrip("/")))
+            inside = os.path.commonpath([self.root, path]) == self.root
+        except ValueError:  # NUL byte, ...
+            inside = False
+        if not inside or path == self.root:
+            raise HTTPException(status_code=404, detail="File not found")
+        return path
+
+    def acquire(self, file_path: str) -> OpenFile:
+        path = self.resolve(file_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            raise HTTPException(status_code=404, detail="File not found")
+        entry = self._open.get(path)
+        if entry is not None and entry.ident != (st.st_ino, st.st_size, st.st_mtime_ns):
+            self._drop(path)  # the file changed since it was opened
+            entry = None
+        if entry is None:
+            self.misses += 1
+            try:
+                entry = OpenFile(path)
+            except OSError:
+                raise HTTPException(status_code=404, detail="File not found")
+            self._open[path] = entry
+            while len(self._open) > self.max_open:
+                self._drop(next(iter(self._open)))
+                self.evictions += 1
+        else:
+            self.hits += 1
+            self._open.move_to_end(path)
+        entry.refs += 1
+        return entry
+
+    def release(self, entry: OpenFile) -> None:
+        entry.refs -= 1
+        if entry.evicted and entry.refs == 0:
+            entry.close()
+
+    def _drop(self, path: str) -> None:
+        entry = self._open.pop(path)
+        entry.evicted = True
+        if entry.refs == 0:
+            entry.close()
+
+    def response(self, request: Request, file_path: str) -> Response:
+        entry = self.acquire(file_path)
+        try:
+            return self._response(request, entry)
+        except BaseException:
+            self.release(entry)
+            raise
+
+    def _response(self, request: Request, entry: OpenFile) -> Response:
+        last_modified = formatdate(entry.mtime, usegmt=True)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": entry.etag,
+            "last-modified": last_modified,
+        }
+        if self._not_modified(request, entry):
+            self.release(entry)
+            return Response(status_code=304, headers=headers)
+
+        start, end, status_code = 0, entry.size, 200
+        range_header = request.headers.get("range")
+        if range_header and request.method == "GET" and self._if_range(request, entry, last_modified):
+            try:
+                byte_range = _parse_range(range_header, entry.size)
+            except ValueError:
+                self.release(entry)
+                return Response(
+                    status_code=416, headers={"content-range": f"bytes */{entry.size}"}
+                )
+            if byte_range is not None:
+                start, end = byte_range
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end - 1}/{entry.size}"
+
+        media_type, encoding = mimetypes.guess_type(entry.path)
+        headers["content-type"] = media_type or "application/octet-stream"
+        if encoding:
+            headers["content-encoding"] = encoding
+        headers["content-length"] = str(end - start)
+        return FileSendResponse(
+            entry, start, end, status_code, headers, self.release, request.method == "HEAD"
+        )
+
+    @staticmethod
+    def _not_modified(request: Request, entry: OpenFile) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or entry.etag in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.mtime) <= since
+        return False
+
+    @staticmethod
+    def _if_range(request: Request, entry: OpenFile, last_modified: str) -> bool:
+        # If-Range: send the range only if the client has this exact version
+        if_range = request.headers.get("if-range")
+        if if_range is None:
+            return True
+        if if_range.startswith('"'):
+            return if_range == entry.etag
+        return if_range == last_modified
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP file_server_open_files File descriptors kept open by the file cache."
+        yield "# TYPE file_server_open_files gauge"
+        yield f"file_server_open_files {len(self._open)}"
+        yield "# HELP file_server_fd_cache_total File cache lookups by result."
+        yield "# TYPE file_server_fd_cache_total counter"
+        for event in ("hits", "misses", "evictions"):
+            yield f'file_server_fd_cache_total{{event="{event}"}} {getattr(self, event)}'
+
+    def install(self, app: FastAPI) -> None:
+        """
+        open fds and fd cache hits / misses / evictions on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)
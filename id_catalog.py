@@ -0,0 +1,188 @@
+import json
+import random
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+
+"""
+id catalog ( isbn-... / imdb-... ids -> name )
+
+a dict of str -> str costs ~150+ bytes per entry ( two str objects + hash table slot ),
+and `random.choice(list(data.items()))` copies the whole dict on every request.
+
+IdCatalog keeps the ids sorted in one array-backed structure:
+    blob      -> every id ( utf-8 ) glued together in one bytes object
+    offsets   -> array of n + 1 positions, id i = blob[offsets[i]:offsets[i + 1]]
+    names     -> every distinct name once ( interned ), name_index[i] -> names
+-> ~ len(id) + 12 bytes per id, tens of millions of ids fit in a few hundred MB.
+
+    get("isbn-9781529046137")   -> binary search, O(log n)
+    prefix("isbn-978")          -> binary search + walk while the prefix matches
+    by_type("imdb")             -> ids of one type are next to each other ( sorted ) -> one slice
+    sample()                    -> random index, O(1), no copy
+
+NOTE:
+    the catalog is read only, build a new one to change it ( build time is O(n log n) ).
+    the type of an id is the part before the first "-" ( isbn, imdb, ... ).
+    to_bytes() / from_buffer() -> the same catalog read in place from a buffer ( e.g. a mmap
+    shared by every worker, see shared_state.py ), only the names are copied.
+"""
+
+# magic, ids, blob bytes, names bytes ( offsets, name_index, blob and names follow in that order )
+_HEADER = struct.Struct("<4sQQQ")
+_MAGIC = b"IDC1"
+
+
+class _Keys:
+    # sequence view for bisect: keys[i] -> id i as bytes
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob: bytes, offsets: array):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        # bytes() -> a slice of a shared buffer compares like the bytes blob ( bisect needs < )
+        return bytes(self.blob[self.offsets[i] : self.offsets[i + 1]])
+
+
+class IdCatalog:
+    def __init__(self, pairs: Iterable[tuple[str, str]] = ()):
+        # dict -> the last name wins for a duplicated id
+        entries = sorted({id.encode(): name for id, name in pairs}.items())
+        names: dict[str, int] = {}
+        self._offsets = array("Q", [0])
+        self._name_index = array("I")
+        chunks = []
+        position = 0
+        for key, name in entries:
+            chunks.append(key)
+            position += len(key)
+            self._offsets.append(position)
+            code = names.get(name)
+            if code is None:
+                code = names[sys.intern(name)] = len(names)
+            self._name_index.append(code)
+        self._blob = b"".join(chunks)
+        self._names = list(names)
+        self._index()
+
+    def _index(self) -> None:
+        self._keys = _Keys(self._blob, self._offsets)
+        self._types = self._type_ranges()
+
+    @classmethod
+    def from_mapping(cls, mapping: dict[str, str]) -> "IdCatalog":
+        return cls(mapping.items())
+
+    def to_bytes(self) -> bytes:
+        names = json.dumps(self._names).encode()
+        return b"".join(
+            (
+                _HEADER.pack(_MAGIC, len(self), len(self._blob), len(names)),
+                self._offsets.tobytes(),
+                self._name_index.tobytes(),
+                self._blob,
+                names,
+            )
+        )
+
+    @classmethod
+    def from_buffer(cls, buffer) -> "IdCatalog":
+        """
+        catalog over the bytes of to_bytes(), the ids stay in the buffer ( no copy )
+        """
+        view = memoryview(buffer)
+        magic, n, blob_size, names_size = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError("not an IdCatalog buffer")
+        position = _HEADER.size
+        catalog = cls.__new__(cls)
+        catalog._offsets = view[position : position + 8 * (n + 1)].cast("Q")
+        position += 8 * (n + 1)
+        catalog._name_index = view[position : position + 4 * n].cast("I")
+        position += 4 * n
+        catalog._blob = view[position : position + blob_size]
+        position += blob_size
+        catalog._names = [sys.intern(name) for name in json.loads(bytes(view[position : position + names_size]))]
+        catalog._index()
+        return catalog
+
+    def _type_ranges(self) -> dict[str, tuple[int, int]]:
+        ranges = {}
+        lo = 0
+        while lo < len(self):
+            key = self._keys[lo]
+            kind = key.split(b"-", 1)[0]
+            # every id of this type starts with "<type>-" -> ends where the next type begins
+            hi = bisect_left(self._keys, kind + b".", lo) if b"-" in key else lo + 1
+            ranges.setdefault(kind.decode(), (lo, hi))
+            lo = hi
+        return ranges
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __contains__(self, id: str) -> bool:
+        return self._find(id) is not None
+
+    def _entry(self, i: int) -> tuple[str, str]:
+        return self._keys[i].decode(), self._names[self._name_index[i]]
+
+    def items(self) -> Iterable[tuple[str, str]]:
+        return (self._entry(i) for i in range(len(self)))
+
+    def _find(self, id: str) -> int | None:
+        key = id.encode()
+        i = bisect_left(self._keys, key)
+        if i < len(self) and self._keys[i] == key:
+            return i
+        return None
+
+    def get(self, id: str, default: str | None = None) -> str | None:
+        i = self._find(id)
+        return default if i is None else self._names[self._name_index[i]]
+
+    def prefix(self, prefix: str, offset: int = 0, limit: int = 10) -> list[tuple[str, str]]:
+        """
+        ids that start with prefix, in id order
+        """
+        key = prefix.encode()
+        i = bisect_left(self._keys, key) + offset
+        result = []
+        while i < len(self) and len(result) < limit and self._keys[i].startswith(key):
+            result.append(self._entry(i))
+            i += 1
+        return result
+
+    def types(self) -> dict[str, int]:
+        return {kind: hi - lo for kind, (lo, hi) in self._types.items()}
+
+    def by_type(self, kind: str, offset: int = 0, limit: int = 10) -> list[tuple[str, str]]:
+        lo, hi = self._types.get(kind, (0, 0))
+        start = min(lo + offset, hi)
+        return [self._entry(i) for i in range(start, min(start + limit, hi))]
+
+    def sample(self) -> tuple[str, str]:
+        """
+        one random (id, name), O(1)
+        """
+        if not len(self):
+            raise IndexError("sample from an empty catalog")
+        return self._entry(random.randrange(len(self)))
+
+    def nbytes(self) -> int:
+        """
+        memory of the index itself ( names are counted once )
+        """
+        return (
+            len(self._blob)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._name_index.itemsize * len(self._name_index)
+            + sum(sys.getsizeof(name) for name in self._names)
+        )
@@ -0,0 +1,492 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+import anyio.to_thread
+import httpx
+from fastapi import FastAPI
+
+from metrics import Histogram
+
+"""
+image metadata of item image urls ( size, type, content hash ), fetched in the background
+
+many items point at the same image, often with a slightly different url ( HTTP://Example.com:80/a.jpg#x ).
+the url is normalized and hashed -> one key per image, fetched once:
+
+    image_metadata = ImageMetadata()            # lifespan: image_metadata.lifespan
+    image_metadata.install(app)                 # fetch / cache metrics on /metrics
+
+    image_metadata.lookup(item.image.url)
+    # -> {"url", "sha256", "type", "width", "height", "bytes", "fetched_at"} when it is known
+    # -> None the first time, the url is queued and fetched by the worker pool
+
+    - lookup() never waits: a dict lookup, a miss only puts the url in a bounded queue
+    - `workers` tasks fetch the queue with httpx, at most `per_host` requests per host at a time
+    - the image bytes are stored by their sha256 ( content addressed ): two urls of the
+      same image share one file. width / height are read from the PNG / GIF / JPEG / WebP header.
+    - the disk cache keeps at most max_bytes of images, least recently fetched first out,
+      urls of an evicted image are forgotten and fetched again on their next lookup
+    - a failed url is not tried again for retry_after seconds
+    - only hosts of allowed_hosts ( $IMAGE_HOSTS ) are fetched, none by default, and never
+      a host that resolves to a loopback / private / link-local address ( SSRF )
+
+    .image_cache/blobs/<sha256[:2]>/<sha256>       image ( or thumbnail(image) when given )
+    .image_cache/urls/<key[:2]>/<key>.json         metadata of one normalized url
+
+NOTE:
+    cache dir / size default to $IMAGE_CACHE_DIR ( ./.image_cache ) and $IMAGE_CACHE_BYTES ( 256 MiB ).
+    the server fetches urls its clients sent -> $IMAGE_HOSTS ( comma separated hosts ) lists
+    the image hosts, unset = nothing is fetched. redirects are checked the same way.
+    the address check resolves the host before the request, httpx resolves it again to
+    connect -> a DNS server that answers differently the second time isn't stopped by it.
+    no image library here: pass thumbnail=<bytes -> bytes> ( e.g. with Pillow ) to store
+    thumbnails instead of the original images.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# characters left as they are in a normalized path ( RFC 3986 unreserved + sub-delims + / : @ )
+PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+
+def normalize_url(url: str) -> str:
+    """
+    HTTP://Example.COM:80/a/./b/../c.jpg?b=2&a=1#top -> http://example.com/a/c.jpg?a=1&b=2
+
+    ValueError for a url urlsplit can't read ( http://[bad/, a port that isn't 0-65535 ... )
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    netloc = f"[{host}]" if ":" in host else host  # ipv6
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{parts.port}"
+    segments: list[str] = []
+    for segment in parts.path.split("/"):
+        if segment == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    path = quote(unquote("/".join(segments)), safe=PATH_SAFE) or "/"
+    if not path.startswith("/"):
+        path = "/" + path
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def image_size(data: bytes) -> tuple[str, int, int] | None:
+    """
+    (type, width, height) from the header of a PNG / GIF / JPEG / WebP image, else None
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return "image/png", width, height
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        width, height = struct.unpack("<HH", data[6:10])
+        return "image/gif", width, height
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return "image/webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return "image/webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(data[24:27], "little") + 1
+            height = int.from_bytes(data[27:30], "little") + 1
+            return "image/webp", width, height
+        return None
+    if data[:2] == b"\xff\xd8":
+        # walk the JPEG segments up to the first SOF ( start of frame ) marker
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                return None
+            marker = data[i + 1]
+            if marker == 0xFF:  # fill byte
+                i += 1
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+                return "image/jpeg", width, height
+            i += 2 + struct.unpack(">H", data[i + 2 : i + 4])[0]
+    return None
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)  # a reader / other worker never sees half a file
+
+
+class ImageCache:
+    """
+    size bounded disk cache: url key -> metadata, sha256 -> image bytes
+
+    every method does disk I/O -> call it in a thread, except get()
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        max_bytes: int | None = None,
+        thumbnail: Callable[[bytes], bytes] | None = None,
+    ):
+        self.root = root or os.getenv("IMAGE_CACHE_DIR", ".image_cache")
+        self.max_bytes = max_bytes or int(os.getenv("IMAGE_CACHE_BYTES", 256 * 1024**2))
+        self.thumbnail = thumbnail
+        self._meta: dict[str, dict] = {}  # url key -> metadata
+        self._blobs: OrderedDict[str, int] = OrderedDict()  # sha256 -> size, oldest first
+        self._urls: dict[str, set[str]] = {}  # sha256 -> url keys of that image
+        self.bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()  # put() runs in several threads at once
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, "urls", key[:2], key + ".json")
+
+    def load(self) -> None:
+        """
+        read the index of what an earlier run ( or another worker ) left on disk
+        """
+        blobs = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "blobs")):
+            for name in filenames:
+                if not name.endswith(".tmp"):
+                    stat = os.stat(os.path.join(dirpath, name))
+                    blobs.append((stat.st_mtime, name, stat.st_size))
+        for _, sha256, size in sorted(blobs):
+            self._blobs[sha256] = size
+            self.bytes += size
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "urls")):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, name), "rb") as f:
+                        meta = json.loads(f.read())
+                except (OSError, ValueError):
+                    continue
+                if meta.get("sha256") in self._blobs:
+                    self._add_meta(name.removesuffix(".json"), meta)
+        self._evict()
+
+    def _add_meta(self, key: str, meta: dict) -> None:
+        self._meta[key] = meta
+        self._urls.setdefault(meta["sha256"], set()).add(key)
+
+    def get(self, key: str) -> dict | None:
+        return self._meta.get(key)
+
+    def _touch(self, sha256: str) -> bool:
+        """
+        mark a cached image as just used, False -> not cached ( or its file is gone )
+        """
+        if sha256 not in self._blobs:
+            return False
+        try:
+            os.utime(self._blob_path(sha256))
+        except FileNotFoundError:
+            # another worker evicted it -> a miss, put() writes it again
+            self.bytes -= self._blobs.pop(sha256)
+            return False
+        self._blobs.move_to_end(sha256)
+        return True
+
+    def put(self, key: str, url: str, data: bytes) -> dict:
+        sha256 = hashlib.sha256(data).hexdigest()
+        kind, width, height = image_size(data) or (None, None, None)
+        meta = {
+            "url": url,
+            "sha256": sha256,
+            "type": kind,
+            "width": width,
+            "height": height,
+            "bytes": len(data),
+            "fetched_at": time.time(),
+        }
+        # check, write and evict in one step -> another put() can't evict the image in between
+        with self._lock:
+            if not self._touch(sha256):  # else: same image under another url -> no second copy
+                blob = self.thumbnail(data) if self.thumbnail is not None else data
+                _write_atomic(self._blob_path(sha256), blob)
+                self._blobs[sha256] = len(blob)
+                self.bytes += len(blob)
+            _write_atomic(self._meta_path(key), json.dumps(meta).encode())
+            self._add_meta(key, meta)
+            self._evict()
+        return meta
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes and len(self._blobs) > 1:
+            sha256, size = self._blobs.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            for key in self._urls.pop(sha256, ()):
+                del self._meta[key]
+                try:
+                    os.unlink(self._meta_path(key))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.unlink(self._blob_path(sha256))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+
+class ImageMetadata:
+    def __init__(
+        self,
+        cache: ImageCache | None = None,
+        workers: int = 8,
+        per_host: int = 2,
+        max_queue: int = 10_000,
+        timeout: float = 10.0,
+        max_image_bytes: int = 20 * 1024**2,
+        retry_after: float = 300.0,
+        allowed_hosts: Iterable[str] | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.cache = cache if cache is not None else ImageCache()  # an empty cache is falsy
+        self.workers = workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.retry_after = retry_after
+        if allowed_hosts is None:
+            allowed_hosts = os.getenv("IMAGE_HOSTS", "").split(",")
+        self.allowed_hosts = {host.strip().lower() for host in allowed_hosts} - {""}
+        self.transport = transport
+        self._queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(max_queue)
+        self._queued: set[str] = set()  # url keys in the queue or being fetched
+        self._failed: OrderedDict[str, float] = OrderedDict()  # url key -> retry time
+        self._hosts: dict[str, list] = {}  # host -> [semaphore, users]
+        self._tasks: list[asyncio.Task] = []
+        self._client: httpx.AsyncClient | None = None
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self.refused = 0
+        self.fetched = 0
+        self.failures = 0
+        self.fetch_time = Histogram()
+
+    def lookup(self, url: str) -> dict | None:
+        """
+        metadata of the image if it is cached, else None and the url is queued
+        ( never raises: a url that can't be parsed is refused )
+        """
+        try:
+            key = url_key(url)
+        except ValueError:
+            self.refused += 1
+            return None
+        meta = self.cache.get(key)
+        if meta is not None:
+            self.hits += 1
+            return meta
+        self.misses += 1
+        self._schedule(key, url)
+        return None
+
+    def _schedule(self, key: str, url: str) -> None:
+        if key in self._queued or not self._tasks:
+            return
+        if not self._allowed(urlsplit(url).hostname or ""):
+            self.refused += 1
+            return
+        retry = self._failed.get(key)
+        if retry is not None:
+            if time.monotonic() < retry:
+                return
+            del self._failed[key]
+        try:
+            self._queue.put_nowait((key, normalize_url(url)))
+        except asyncio.QueueFull:
+            self.dropped += 1  # a later lookup queues it again
+            return
+        self._queued.add(key)
+
+    def _allowed(self, host: str) -> bool:
+        return host.lower().rstrip(".") in self.allowed_hosts
+
+    @staticmethod
+    async def _addresses(host: str, port: int) -> list[ipaddress.IPv4Address | ipaddress.IPv6Address]:
+        try:
+            return [ipaddress.ip_address(host)]
+        except ValueError:
+            pass
+        # getaddrinfo runs in the default executor, not on the event loop
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return [ipaddress.ip_address(info[4][0]) for info in infos]
+
+    async def _check_request(self, request: httpx.Request) -> None:
+        # runs for the first request and every redirect
+        url = request.url
+        if url.scheme not in ("http", "https") or not self._allowed(url.host):
+            raise ValueError(f"image host not allowed: {url.host}")
+        # an allowed name can still point inside the network ( 127.0.0.1, 10.x, 169.254.169.254 ... )
+        for address in await self._addresses(url.host, url.port or DEFAULT_PORTS[url.scheme]):
+            if not address.is_global:
+                raise ValueError(f"image host {url.host} is not a public address: {address}")
+
+    @asynccontextmanager
+    async def _host_slot(self, host: str):
+        # one semaphore per host while it has fetches, removed after -> no entry per host forever
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = self._hosts[host] = [asyncio.Semaphore(self.per_host), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._hosts[host]
+
+    async def _download(self, url: str) -> bytes:
+        async with self._client.stream("GET", url) as response:
+            response.raise_for_status()
+            length = response.headers.get("content-length")
+            if length is not None and int(length) > self.max_image_bytes:
+                raise ValueError(f"image too big: {length} bytes")
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > self.max_image_bytes:
+                    raise ValueError(f"image too big: more than {self.max_image_bytes} bytes")
+        return bytes(data)
+
+    async def _fetch(self, key: str, url: str) -> None:
+        start = time.perf_counter()
+        try:
+            async with self._host_slot(urlsplit(url).netloc):
+                data = await self._download(url)
+            # hashing, header parsing and file writes off the event loop
+            await anyio.to_thread.run_sync(self.cache.put, key, url, data)
+        except Exception as e:
+            self.failures += 1
+            self._failed[key] = time.monotonic() + self.retry_after
+            while len(self._failed) > self._queue.maxsize:
+                self._failed.popitem(last=False)
+            logger.warning("image fetch of %s failed: %r", url, e)
+            return
+        self.fetched += 1
+        self.fetch_time.observe(time.perf_counter() - start)
+
+    async def _worker(self) -> None:
+        while True:
+            key, url = await self._queue.get()
+            try:
+                await self._fetch(key, url)
+            finally:
+                self._queued.discard(key)
+                self._queue.task_done()
+
+    async def join(self) -> None:
+        """
+        wait until every queued url is fetched ( benchmarks / warm up )
+        """
+        await self._queue.join()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await anyio.to_thread.run_sync(self.cache.load)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+            event_hooks={"request": [self._check_request]},
+            transport=self.transport,
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """
+        stop the workers, what is still queued is fetched on a later lookup
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+        self._queued.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        await self.start()
+        try:
+            yield
+        finally:
+            await self.close()
+
+    def stats(self) -> dict:
+        return {
+            "cached_urls": len(self.cache),
+            "cached_bytes": self.cache.bytes,
+            "max_bytes": self.cache.max_bytes,
+            "queued": self._queue.qsize(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "dropped": self.dropped,
+            "refused": self.refused,
+            "fetched": self.fetched,
+            "failures": self.failures,
+            "evictions": self.cache.evictions,
+        }
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP image_cache_bytes Bytes of images in the disk cache."
+        yield "# TYPE image_cache_bytes gauge"
+        yield f"image_cache_bytes {self.cache.bytes}"
+        yield "# HELP image_fetch_queued Image urls waiting to be fetched."
+        yield "# TYPE image_fetch_queued gauge"
+        yield f"image_fetch_queued {self._queue.qsize()}"
+        yield "# HELP image_metadata_events_total Image lookups and fetches by result."
+        yield "# TYPE image_metadata_events_total counter"
+        for event in ("hits", "misses", "dropped", "refused", "fetched", "failures"):
+            yield f'image_metadata_events_total{{event="{event}"}} {getattr(self, event)}'
+        yield f'image_metadata_events_total{{event="evictions"}} {self.cache.evictions}'
+        yield "# HELP image_fetch_seconds Time to fetch and store one image."
+        yield "# TYPE image_fetch_seconds histogram"
+        yield from self.fetch_time.lines("image_fetch_seconds", 'cache="images"')
+
+    def install(self, app: FastAPI) -> None:
+        """
+        cache size, fetch queue, lookup / fetch counters and fetch times on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)
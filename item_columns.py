@@ -0,0 +1,156 @@
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import date
+
+import numpy as np
+
+"""
+columnar ( NumPy ) item catalog
+
+a list of dicts has to be filtered row by row in python:
+    [item for item in fake_items_db if item["price"] >= 20 and item["category"] == "food"]
+-> hundreds of ms for 1M items.
+
+ColumnarCatalog stores every field as one NumPy array ( a column ) and a filter
+becomes a boolean mask over the whole column at once:
+    mask = (price >= 20) & (category == code_of("food"))
+-> the loop runs in C, a few ms for 1M items.
+
+    price, rating           -> float64 columns
+    is_available            -> bool column
+    created_at, updated_at  -> datetime64[D] columns
+    category                -> dictionary encoded: int16 code + list of category names
+    tags                    -> one bool column per tag ( dictionary of tag -> column )
+
+NOTE:
+    the fake catalog has no `tags` field, its only label is the category
+    -> the category of an item counts as one of its tags.
+    the original rows are kept, a query returns row positions and only the
+    rows of the requested page are turned back into dicts.
+"""
+
+ORDER_BY = ("created_at", "updated_at")
+
+
+class ColumnarCatalog:
+    def __init__(self, rows: Sequence, columns: dict, categories: list[str], tags: dict):
+        self.rows = rows
+        self.columns = columns
+        self.categories = categories
+        self._category_code = {name: code for code, name in enumerate(categories)}
+        self.tags = tags
+        # sort once, every query reuses the permutation instead of sorting again
+        self._order = {
+            field: np.argsort(columns[field], kind="stable") for field in ORDER_BY
+        }
+
+    @classmethod
+    def from_items(cls, items: Iterable) -> "ColumnarCatalog":
+        rows = items if isinstance(items, Sequence) else list(items)
+        n = len(rows)
+        category_names, category_codes = np.unique(
+            np.array([item["category"] for item in rows], dtype=str),
+            return_inverse=True,
+        )
+        created_at = np.array([item["created_at"] for item in rows], dtype="datetime64[D]")
+        updated_at = np.array(
+            [item.get("updated_at") or item["created_at"] for item in rows],
+            dtype="datetime64[D]",
+        )
+        columns = {
+            "id": np.fromiter((item["id"] for item in rows), dtype=np.int64, count=n),
+            "price": np.fromiter((item["price"] for item in rows), dtype=np.float64, count=n),
+            "rating": np.fromiter((item["rating"] for item in rows), dtype=np.float64, count=n),
+            "is_available": np.fromiter(
+                (item["is_available"] for item in rows), dtype=bool, count=n
+            ),
+            "category": category_codes.astype(np.int16).reshape(n),
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+        categories = [str(name) for name in category_names]
+        tags = {
+            name: columns["category"] == code for code, name in enumerate(categories)
+        }
+        for i, item in enumerate(rows):
+            for tag in item.get("tags") or ():
+                if tag not in tags:
+                    tags[tag] = np.zeros(n, dtype=bool)
+                tags[tag][i] = True
+        return cls(rows, columns, categories, tags)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def mask(
+        self,
+        tags: Iterable[str] = (),
+        category: str | None = None,
+        is_available: bool | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        min_rating: float | None = None,
+        max_rating: float | None = None,
+        created_from: date | str | None = None,
+        created_to: date | str | None = None,
+    ) -> np.ndarray:
+        """
+        boolean mask of the rows that match every filter ( None = no filter )
+        tags -> the row must have all of them
+        created_from <= created_at <= created_to
+        """
+        cols = self.columns
+        mask = np.ones(len(self), dtype=bool)
+        for tag in tags:
+            column = self.tags.get(tag)
+            if column is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= column
+        if category is not None:
+            code = self._category_code.get(category)
+            if code is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= cols["category"] == code
+        if is_available is not None:
+            mask &= cols["is_available"] == is_available
+        if min_price is not None:
+            mask &= cols["price"] >= min_price
+        if max_price is not None:
+            mask &= cols["price"] <= max_price
+        if min_rating is not None:
+            mask &= cols["rating"] >= min_rating
+        if max_rating is not None:
+            mask &= cols["rating"] <= max_rating
+        if created_from is not None:
+            mask &= cols["created_at"] >= np.datetime64(created_from, "D")
+        if created_to is not None:
+            mask &= cols["created_at"] <= np.datetime64(created_to, "D")
+        return mask
+
+    def select(self, order_by: str = "created_at", **filters) -> np.ndarray:
+        """
+        row positions that match the filters, sorted by order_by ( ties keep row order )
+        """
+        if order_by not in ORDER_BY:
+            raise ValueError(f"order_by must be one of {ORDER_BY}")
+        order = self._order[order_by]
+        return order[self.mask(**filters)[order]]
+
+    def query(
+        self, order_by: str = "created_at", offset: int = 0, limit: int = 100, **filters
+    ) -> list:
+        """
+        one page of rows that match the filters
+        """
+        positions = self.select(order_by, **filters)[offset : offset + limit]
+        rows = self.rows
+        return [rows[i] for i in positions.tolist()]
+
+    def iter_rows(self, positions: np.ndarray, chunk_size: int = 4096) -> Iterator:
+        """
+        the rows at `positions`, one NumPy slice at a time
+        -> only chunk_size python ints exist at once, not one per selected row
+        """
+        rows = self.rows
+        for start in range(0, len(positions), chunk_size):
+            for i in positions[start : start + chunk_size].tolist():
+                yield rows[i]
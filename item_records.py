@@ -0,0 +1,270 @@
+import functools
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+from datetime import date
+
+"""
+compact item rows ( struct of arrays )
+
+one item as a dict = a hash table with 8 slots + a str / float / int object per value
+-> ~550 bytes per item, and "category" / "created_at" are the same few strings again and again.
+
+ItemTable keeps every field in its own column instead:
+    id                   -> array("q")     8 bytes
+    price, rating        -> array("d")     8 bytes each
+    is_available         -> bytearray      1 byte
+    category             -> array("H")     2 bytes, code into a list of interned names
+    created_at           -> array("i")     4 bytes, days since 0001-01-01 ( date.toordinal )
+    updated_at           -> array("i")     4 bytes, 0 = never updated
+    name, description    -> StringColumn   utf-8 bytes in one bytearray + start / length
+-> ~100 bytes per item ( python -m benchmarks.bench_item_records ).
+
+    table = ItemTable.from_items(make_fake_items(1_000_000))
+    record = table[12]             # ItemRecord: a tiny view ( table, position ), nothing is copied
+    record["price"], record.get("updated_at")
+    Item.model_construct(**record.to_dict())  # the dict / pydantic model only at the response
+
+NOTE:
+    a table has a fixed set of fields ( FIELDS ), a missing updated_at / description is None.
+    the table is a mutable sequence of rows -> ItemStore(rows=table) indexes it in place.
+    replacing a row leaves its old strings in the StringColumn until compact() runs
+    ( automatically when more than half of the bytes are garbage ).
+"""
+
+FIELDS = (
+    "id",
+    "name",
+    "description",
+    "price",
+    "is_available",
+    "category",
+    "rating",
+    "created_at",
+    "updated_at",
+)
+OPTIONAL = ("description", "updated_at")
+
+
+class StringColumn:
+    __slots__ = ("data", "starts", "lengths", "garbage")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.starts = array("Q")
+        self.lengths = array("i")  # -1 -> None
+        self.garbage = 0
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _write(self, value: str | None) -> tuple[int, int]:
+        if value is None:
+            return 0, -1
+        raw = value.encode()
+        start = len(self.data)
+        self.data += raw
+        return start, len(raw)
+
+    def append(self, value: str | None) -> None:
+        start, length = self._write(value)
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def __setitem__(self, pos: int, value: str | None) -> None:
+        self.garbage += max(self.lengths[pos], 0)
+        self.starts[pos], self.lengths[pos] = self._write(value)
+        if self.garbage > len(self.data) // 2:
+            self.compact()
+
+    def __getitem__(self, pos: int) -> str | None:
+        length = self.lengths[pos]
+        if length < 0:
+            return None
+        start = self.starts[pos]
+        return self.data[start : start + length].decode()
+
+    def compact(self) -> None:
+        """
+        copy the live strings into a new buffer, drop the replaced ones
+        """
+        data = bytearray()
+        for pos, length in enumerate(self.lengths):
+            if length > 0:
+                start = self.starts[pos]
+                self.starts[pos] = len(data)
+                data += self.data[start : start + length]
+        self.data = data
+        self.garbage = 0
+
+    def nbytes(self) -> int:
+        return (
+            sys.getsizeof(self.data)
+            + self.starts.itemsize * len(self.starts)
+            + self.lengths.itemsize * len(self.lengths)
+        )
+
+
+def _pack_date(value: str | None) -> int:
+    return 0 if value is None else date.fromisoformat(value).toordinal()
+
+
+@functools.lru_cache(maxsize=4096)  # a catalog spans few distinct days
+def _unpack_date(value: int) -> str | None:
+    return None if value == 0 else date.fromordinal(value).isoformat()
+
+
+class ItemRecord(Mapping):
+    """
+    read only view of one row of an ItemTable, works where a dict row is read
+    """
+
+    __slots__ = ("_table", "_pos")
+
+    def __init__(self, table: "ItemTable", pos: int):
+        self._table = table
+        self._pos = pos
+
+    def __getitem__(self, key: str):
+        getter = _GETTERS.get(key)
+        if getter is None:
+            raise KeyError(key)
+        return getter(self._table, self._pos)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __contains__(self, key) -> bool:
+        return key in self.keys()
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self):
+        # the same keys a dict row would have: optional fields only when they are set
+        table, pos = self._table, self._pos
+        return [
+            field
+            for field in FIELDS
+            if field not in OPTIONAL or _GETTERS[field](table, pos) is not None
+        ]
+
+    def to_dict(self) -> dict:
+        t, p = self._table, self._pos
+        row = {
+            "id": t.ids[p],
+            "name": t.names[p],
+            "description": t.descriptions[p],
+            "price": t.prices[p],
+            "is_available": bool(t.available[p]),
+            "category": t.categories[t.category_codes[p]],
+            "rating": t.ratings[p],
+            "created_at": _unpack_date(t.created[p]),
+        }
+        if row["description"] is None:
+            del row["description"]
+        if t.updated[p]:
+            row["updated_at"] = _unpack_date(t.updated[p])
+        return row
+
+    def __repr__(self) -> str:
+        return f"ItemRecord({self.to_dict()!r})"
+
+
+class ItemTable:
+    def __init__(self):
+        self.ids = array("q")
+        self.names = StringColumn()
+        self.descriptions = StringColumn()
+        self.prices = array("d")
+        self.available = bytearray()
+        self.category_codes = array("H")
+        self.ratings = array("d")
+        self.created = array("i")
+        self.updated = array("i")
+        self.categories: list[str] = []
+        self._category_code: dict[str, int] = {}
+
+    @classmethod
+    def from_items(cls, items: Iterable[Mapping]) -> "ItemTable":
+        table = cls()
+        for item in items:
+            table.append(item)
+        return table
+
+    def _code(self, category: str) -> int:
+        code = self._category_code.get(category)
+        if code is None:
+            code = self._category_code[sys.intern(category)] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, pos: int) -> ItemRecord:
+        if not -len(self.ids) <= pos < len(self.ids):
+            raise IndexError("item position out of range")
+        return ItemRecord(self, pos % len(self.ids))
+
+    def __iter__(self) -> Iterator[ItemRecord]:
+        return (ItemRecord(self, pos) for pos in range(len(self.ids)))
+
+    def _values(self, item: Mapping) -> tuple:
+        # read + pack every field first -> a bad row doesn't leave the columns half written
+        return (
+            item["id"],
+            item["name"],
+            item.get("description"),
+            float(item["price"]),
+            bool(item["is_available"]),
+            self._code(item["category"]),
+            float(item["rating"]),
+            _pack_date(item["created_at"]),
+            _pack_date(item.get("updated_at")),
+        )
+
+    def _columns(self) -> tuple:
+        return (
+            self.ids,
+            self.names,
+            self.descriptions,
+            self.prices,
+            self.available,
+            self.category_codes,
+            self.ratings,
+            self.created,
+            self.updated,
+        )
+
+    def append(self, item: Mapping) -> None:
+        for column, value in zip(self._columns(), self._values(item)):
+            column.append(value)
+
+    def __setitem__(self, pos: int, item: Mapping) -> None:
+        # _values reads the whole row before writing -> item may be a view of this position
+        for column, value in zip(self._columns(), self._values(item)):
+            column[pos] = value
+
+    def nbytes(self) -> int:
+        columns = (self.ids, self.prices, self.category_codes, self.ratings, self.created, self.updated)
+        return (
+            sum(column.itemsize * len(column) for column in columns)
+            + sys.getsizeof(self.available)
+            + self.names.nbytes()
+            + self.descriptions.nbytes()
+            + sum(sys.getsizeof(category) for category in self.categories)
+        )
+
+
+_GETTERS = {
+    "id": lambda t, p: t.ids[p],
+    "name": lambda t, p: t.names[p],
+    "description": lambda t, p: t.descriptions[p],
+    "price": lambda t, p: t.prices[p],
+    "is_available": lambda t, p: bool(t.available[p]),
+    "category": lambda t, p: t.categories[t.category_codes[p]],
+    "rating": lambda t, p: t.ratings[p],
+    "created_at": lambda t, p: _unpack_date(t.created[p]),
+    "updated_at": lambda t, p: _unpack_date(t.updated[p]),
+}
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from typing import Any
+
+import aiosqlite
+
+from fast_json import dumps
+
+"""
+async item repository ( item_id -> item ), the PUT endpoints save through it
+
+    items_repo = SQLiteRepository("items.db", collection="items")
+    app = FastAPI(lifespan=items_repo.lifespan)  # open the pool on startup, close it on shutdown
+
+    @app.put("/items/{item_id}")
+    async def update_item(item_id: int, item: Item):
+        await items_repo.upsert(item_id, item)  # committed when this returns
+
+every backend has the same async methods ( ItemRepository ):
+    get(item_id) / get_many(ids) -> dict   upsert(item_id, item) -> created?
+    upsert_many(rows) -> created count      delete(item_id) / count()
+    scan() -> every ( item_id, item ) in id order, e.g. to rebuild an index on startup
+-> InMemoryRepository for quick tests, SQLiteRepository locally, a real database later.
+
+SQLiteRepository:
+    - WAL mode -> readers don't wait for the writer and the writer doesn't wait for readers
+    - 1 writer connection ( SQLite allows one writer at a time ) + a bounded pool of readers
+    - aiosqlite runs every connection in its own thread -> the event loop never waits for the disk
+    - the SQL strings are constants -> sqlite3 keeps them prepared ( cached_statements )
+    - upsert_many = one executemany in one transaction -> one commit ( one fsync ) per batch
+
+NOTE:
+    items are stored as JSON ( one table, several apps -> one collection each ).
+    synchronous=FULL -> a commit survives a power loss, NORMAL is faster and survives an app crash.
+    the database file defaults to $ITEMS_DB or ./items.db.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    collection TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (collection, item_id)
+) WITHOUT ROWID
+"""
+SELECT_ONE = "SELECT data FROM items WHERE collection = ? AND item_id = ?"
+SELECT_COUNT = "SELECT COUNT(*) FROM items WHERE collection = ?"
+SELECT_PAGE = """
+SELECT item_id, data FROM items WHERE collection = ? AND item_id > ? ORDER BY item_id LIMIT ?
+"""
+UPSERT = """
+INSERT INTO items (collection, item_id, data, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (collection, item_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+"""
+DELETE = "DELETE FROM items WHERE collection = ? AND item_id = ?"
+CHUNK = 500  # ids per IN (...) query, below the SQLite parameter limit
+
+
+def _encode(item: Any) -> bytes:
+    # pydantic model, dict, ... -> JSON bytes ( already encoded bytes are kept )
+    return item if isinstance(item, bytes) else dumps(item)
+
+
+class ItemRepository(ABC):
+    """
+    interface of an item backend ( a backend without every abstract method can't be created )
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        await self.start()
+        try:
+            yield
+        finally:
+            await self.close()
+
+    async def get(self, item_id: int) -> dict | None:
+        return (await self.get_many([item_id])).get(item_id)
+
+    @abstractmethod
+    async def get_many(self, item_ids: Iterable[int]) -> dict[int, dict]:
+        raise NotImplementedError
+
+    async def upsert(self, item_id: int, item: Any) -> bool:
+        """
+        save one item, True -> it was new
+        """
+        return await self.upsert_many([(item_id, item)]) == 1
+
+    @abstractmethod
+    async def upsert_many(self, rows: Iterable[tuple[int, Any]]) -> int:
+        """
+        save many items at once ( all or nothing ), returns how many were new
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, item_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def scan(self, batch_size: int = CHUNK) -> AsyncIterator[tuple[int, dict]]:
+        """
+        every item in id order, read batch_size items at a time
+        """
+        raise NotImplementedError
+
+
+class InMemoryRepository(ItemRepository):
+    """
+    dict backend, nothing survives a restart
+    """
+
+    def __init__(self):
+        self._items: dict[int, bytes] = {}
+
+    async def get_many(self, item_ids: Iterable[int]) -> dict[int, dict]:
+        return {i: json.loads(self._items[i]) for i in item_ids if i in self._items}
+
+    async def upsert_many(self, rows: Iterable[tuple[int, Any]]) -> int:
+        encoded = {item_id: _encode(item) for item_id, item in rows}
+        created = sum(item_id not in self._items for item_id in encoded)
+        self._items.update(encoded)
+        return created
+
+    async def delete(self, item_id: int) -> bool:
+        return self._items.pop(item_id, None) is not None
+
+    async def count(self) -> int:
+        return len(self._items)
+
+    async def scan(self, batch_size: int = CHUNK) -> AsyncIterator[tuple[int, dict]]:
+        for item_id in sorted(self._items):
+            data = self._items.get(item_id)
+            if data is not None:  # deleted while the caller was busy
+                yield item_id, json.loads(data)
+
+
+class SQLiteRepository(ItemRepository):
+    def __init__(
+        self,
+        path: str | None = None,
+        collection: str = "items",
+        readers: int = 4,
+        synchronous: str = "FULL",
+    ):
+        self.path = path or os.getenv("ITEMS_DB", "items.db")
+        self.collection = collection
+        self.readers = readers
+        self.synchronous = synchronous
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+        self._pool: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+
+    async def _connect(self, query_only: bool) -> aiosqlite.Connection:
+        # isolation_level=None -> no implicit transactions, BEGIN / COMMIT are explicit
+        db = await aiosqlite.connect(self.path, isolation_level=None, cached_statements=256)
+        await db.execute("PRAGMA busy_timeout = 5000")
+        await db.execute(f"PRAGMA synchronous = {self.synchronous}")
+        if query_only:
+            await db.execute("PRAGMA query_only = ON")
+        self._connections.append(db)
+        return db
+
+    async def start(self) -> None:
+        # the first read and the first write can both start the pool -> only one opens it
+        async with self._start_lock:
+            if self._writer is not None:
+                return
+            writer = await self._connect(query_only=False)
+            await writer.execute("PRAGMA journal_mode = WAL")  # stored in the file
+            await writer.execute(SCHEMA)
+            for _ in range(self.readers):
+                self._pool.put_nowait(await self._connect(query_only=True))
+            self._writer = writer  # set last: _writer is not None -> the pool is ready
+
+    async def close(self) -> None:
+        async with self._write_lock:
+            for db in self._connections:
+                await db.close()
+            self._connections.clear()
+            self._pool = asyncio.Queue()
+            self._writer = None
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._writer is None:
+            await self.start()
+        db = await self._pool.get()  # all readers busy -> wait for one
+        try:
+            yield db
+        finally:
+            self._pool.put_nowait(db)
+
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self._write_lock:
+            if self._writer is None:
+                await self.start()
+            db = self._writer
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                await db.execute("ROLLBACK")
+                raise
+            await db.execute("COMMIT")
+
+    @staticmethod
+    def _chunks(item_ids: list[int]) -> Iterable[tuple[str, list[int]]]:
+        for start in range(0, len(item_ids), CHUNK):
+            chunk = item_ids[start : start + CHUNK]
+            yield ",".join("?" * len(chunk)), chunk
+
+    async def get(self, item_id: int) -> dict | None:
+        async with self._reader() as db:
+            async with db.execute(SELECT_ONE, (self.collection, item_id)) as cursor:
+                row = await cursor.fetchone()
+        return None if row is None else json.loads(row[0])
+
+    async def get_many(self, item_ids: Iterable[int]) -> dict[int, dict]:
+        found = {}
+        async with self._reader() as db:
+            for marks, chunk in self._chunks(list(dict.fromkeys(item_ids))):
+                sql = f"SELECT item_id, data FROM items WHERE collection = ? AND item_id IN ({marks})"
+                async with db.execute(sql, (self.collection, *chunk)) as cursor:
+                    for item_id, data in await cursor.fetchall():
+                        found[item_id] = json.loads(data)
+        return found
+
+    async def upsert_many(self, rows: Iterable[tuple[int, Any]]) -> int:
+        # encode before taking the writer -> the lock is held only for SQL
+        encoded = {item_id: _encode(item) for item_id, item in rows}
+        if not encoded:
+            return 0
+        now = time.time()
+        params = [(self.collection, item_id, data, now) for item_id, data in encoded.items()]
+        async with self._transaction() as db:
+            existing = 0
+            for marks, chunk in self._chunks(list(encoded)):
+                sql = f"SELECT COUNT(*) FROM items WHERE collection = ? AND item_id IN ({marks})"
+                async with db.execute(sql, (self.collection, *chunk)) as cursor:
+                    existing += (await cursor.fetchone())[0]
+            await db.executemany(UPSERT, params)
+        return len(encoded) - existing
+
+    async def delete(self, item_id: int) -> bool:
+        async with self._transaction() as db:
+            async with db.execute(DELETE, (self.collection, item_id)) as cursor:
+                return cursor.rowcount > 0
+
+    async def count(self) -> int:
+        async with self._reader() as db:
+            async with db.execute(SELECT_COUNT, (self.collection,)) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def scan(self, batch_size: int = CHUNK) -> AsyncIterator[tuple[int, dict]]:
+        # keyset pages -> a reader is held for one page, not while the caller works on it
+        after = float("-inf")
+        while True:
+            async with self._reader() as db:
+                async with db.execute(SELECT_PAGE, (self.collection, after, batch_size)) as cursor:
+                    rows = await cursor.fetchall()
+            for item_id, data in rows:
+                yield item_id, json.loads(data)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
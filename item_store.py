@@ -0,0 +1,251 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterable, Iterator, MutableSequence
+
+"""
+in-memory item store with indexes
+
+fake_items_db is a plain list of dicts -> every lookup walks the whole list ( O(n) ).
+ItemStore keeps the same rows but builds indexes next to them:
+    id            -> hash index ( dict ), get by id is O(1)
+    id (sorted)   -> sorted list, paging by id range is O(log n + limit)
+    category      -> hash index to a sorted list of ids
+    is_available  -> hash index to a sorted list of ids
+    created_at    -> sorted list of (created_at, id), range query is O(log n + k)
+    updated_at    -> sorted list of (updated_at, id), rows that were never updated use created_at
+
+NOTE:
+    rows are stored once, indexes only keep ids / positions.
+    the rows can be any sequence of mappings ( dict, record with __getitem__, ... )
+    rows= gives the store its row container, e.g. a compact ItemTable ( see item_records.py ),
+    the rows already in it are indexed too.
+"""
+
+CATEGORIES = ["electronics", "clothing", "food", "books", "toys"]
+
+ORDER_BY = ("id", "created_at", "updated_at")
+
+
+def make_fake_item(i: int) -> dict:
+    return {
+        "id": i,
+        "name": f"Item {i}",
+        "description": f"Description for item {i}",
+        "price": round(10 + i * 0.5, 2),
+        "is_available": i % 3 != 0,
+        "category": CATEGORIES[i % 5],
+        "rating": round(3 + (i % 5) * 0.5, 1),
+        "created_at": f"2023-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+    }
+
+
+def make_fake_items(n: int) -> Iterator[dict]:
+    return (make_fake_item(i) for i in range(n))
+
+
+def _add_sorted(ids: list, value) -> None:
+    # ids are usually inserted in increasing order -> append is the fast path
+    if not ids or ids[-1] < value:
+        ids.append(value)
+    else:
+        insort(ids, value)
+
+
+def _remove_sorted(ids: list, value) -> None:
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+
+
+class ItemStore:
+    def __init__(self, items: Iterable = (), rows: MutableSequence | None = None):
+        self._rows = [] if rows is None else rows
+        self._pos: dict[int, int] = {}  # id -> position in self._rows
+        self._ids: list[int] = []  # sorted ids
+        self._by_category: dict[str, list[int]] = {}
+        self._by_available: dict[bool, list[int]] = {True: [], False: []}
+        self._by_date: dict[str, list[tuple[str, int]]] = {
+            "created_at": [],
+            "updated_at": [],
+        }
+        self._bulk_load(items)
+
+    def _bulk_load(self, items: Iterable) -> None:
+        # insort per row is O(n) -> O(n^2) for the whole catalog, sort once instead
+        for pos, item in enumerate(self._rows):
+            self._pos[item["id"]] = pos
+        for item in items:
+            item_id = item["id"]
+            if item_id in self._pos:
+                self._rows[self._pos[item_id]] = item
+                continue
+            self._pos[item_id] = len(self._rows)
+            self._rows.append(item)
+        for item in self._rows:
+            item_id = item["id"]
+            self._by_category.setdefault(item["category"], []).append(item_id)
+            self._by_available[bool(item["is_available"])].append(item_id)
+            for field, keys in self._by_date.items():
+                keys.append((_date(item, field), item_id))
+        self._ids = sorted(self._pos)
+        for ids in (
+            *self._by_category.values(),
+            *self._by_available.values(),
+            *self._by_date.values(),
+        ):
+            ids.sort()
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._pos
+
+    def __iter__(self):
+        return (self._rows[self._pos[item_id]] for item_id in self._ids)
+
+    def _index(self, item) -> None:
+        item_id = item["id"]
+        _add_sorted(self._by_category.setdefault(item["category"], []), item_id)
+        _add_sorted(self._by_available[bool(item["is_available"])], item_id)
+        for field, keys in self._by_date.items():
+            _add_sorted(keys, (_date(item, field), item_id))
+
+    def _unindex(self, item) -> None:
+        item_id = item["id"]
+        _remove_sorted(self._by_category.get(item["category"], []), item_id)
+        _remove_sorted(self._by_available[bool(item["is_available"])], item_id)
+        for field, keys in self._by_date.items():
+            _remove_sorted(keys, (_date(item, field), item_id))
+
+    def upsert(self, item) -> bool:
+        """
+        insert or replace the row with the same id
+        return True if the row is new
+        """
+        item_id = item["id"]
+        pos = self._pos.get(item_id)
+        if pos is not None:
+            self._unindex(self._rows[pos])
+            self._rows[pos] = item
+            self._index(item)
+            return False
+        self._pos[item_id] = len(self._rows)
+        self._rows.append(item)
+        _add_sorted(self._ids, item_id)
+        self._index(item)
+        return True
+
+    def get(self, item_id: int):
+        pos = self._pos.get(item_id)
+        return None if pos is None else self._rows[pos]
+
+    def _rows_for(self, ids: Iterable[int]) -> list:
+        rows, pos = self._rows, self._pos
+        return [rows[pos[item_id]] for item_id in ids]
+
+    def id_range(self, start: int, stop: int) -> list:
+        """
+        rows with start <= id < stop ( same result as the old generator in read_item )
+        """
+        lo = bisect_left(self._ids, start)
+        hi = bisect_left(self._ids, stop, lo)
+        return self._rows_for(self._ids[lo:hi])
+
+    def page(self, skip: int = 0, limit: int = 10) -> list:
+        """
+        offset paging ordered by id
+        """
+        return self._rows_for(self._ids[skip : skip + limit])
+
+    def by_category(self, category: str, skip: int = 0, limit: int = 10) -> list:
+        ids = self._by_category.get(category, [])
+        return self._rows_for(ids[skip : skip + limit])
+
+    def by_availability(self, is_available: bool, skip: int = 0, limit: int = 10) -> list:
+        ids = self._by_available[is_available]
+        return self._rows_for(ids[skip : skip + limit])
+
+    def created_between(
+        self, start: str, end: str, skip: int = 0, limit: int = 10
+    ) -> list:
+        """
+        rows with start <= created_at < end, ordered by (created_at, id)
+        created_at is an ISO date string -> string order == date order
+        """
+        by_created = self._by_date["created_at"]
+        lo = bisect_left(by_created, (start,))
+        hi = bisect_left(by_created, (end,), lo)
+        lo = min(lo + skip, hi)
+        return self._rows_for(
+            item_id for _, item_id in by_created[lo : min(lo + limit, hi)]
+        )
+
+    def keyset_page(
+        self, order_by: str = "id", cursor: str | None = None, limit: int = 10
+    ) -> tuple[list, str | None]:
+        """
+        cursor ( keyset ) paging -> return (rows, next_cursor)
+
+        the cursor remembers the sort key of the last row that was sent,
+        the next page starts right after it with one bisect -> every page costs
+        O(log n + limit) no matter how deep it is, and rows inserted / removed
+        before the cursor don't shift the following pages.
+
+        next_cursor is None on the last page
+        """
+        if order_by not in ORDER_BY:
+            raise ValueError(f"order_by must be one of {ORDER_BY}")
+        if order_by == "id":
+            keys = self._ids
+            after = None if cursor is None else decode_cursor(cursor, order_by)[1]
+        else:
+            keys = self._by_date[order_by]
+            after = None if cursor is None else decode_cursor(cursor, order_by)
+        lo = 0 if after is None else bisect_right(keys, after)
+        hi = min(lo + limit, len(keys))
+        if order_by == "id":
+            ids = keys[lo:hi]
+        else:
+            ids = [item_id for _, item_id in keys[lo:hi]]
+        rows = self._rows_for(ids)
+        next_cursor = None
+        if rows and hi < len(keys):
+            next_cursor = encode_cursor(order_by, rows[-1])
+        return rows, next_cursor
+
+
+def _date(item, field: str) -> str:
+    if field == "updated_at":
+        return item.get("updated_at") or item["created_at"]
+    return item[field]
+
+
+def encode_cursor(order_by: str, item) -> str:
+    """
+    opaque cursor = urlsafe base64 of [order_by, sort key, id]
+    """
+    key = item["id"] if order_by == "id" else _date(item, order_by)
+    raw = json.dumps([order_by, key, item["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str) -> tuple:
+    """
+    return (sort key, id), raise ValueError for a broken cursor
+    or a cursor that was made for another order_by
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order_by, key, item_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+    key_type = int if order_by == "id" else str
+    if (
+        cursor_order_by != order_by
+        or not isinstance(item_id, int)
+        or not isinstance(key, key_type)
+    ):
+        raise ValueError("Invalid cursor.")
+    return key, item_id
@@ -0,0 +1,307 @@
+import argparse
+import ast
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
+import fastapi
+import pydantic
+from fastapi import FastAPI
+from fastapi.openapi.docs import get_swagger_ui_html
+from fastapi.responses import Response
+
+"""
+one server for every tutorial app, each app is imported on its first request
+
+    fastapi run launcher.py            ( or: uvicorn launcher:app )
+
+    http://127.0.0.1:8000/                          -> the apps and if they are loaded yet
+    http://127.0.0.1:8000/3_query_parameter/items/  -> imports 3_query_parameter.py now, then serves it
+    http://127.0.0.1:8000/3_query_parameter/docs    -> docs from the OpenAPI cache, no import
+    http://127.0.0.1:8000/_launcher/report          -> import / lifespan / OpenAPI time per app
+
+importing every app at startup pays for all of them ( pydantic models, numpy, the fake
+catalogs ... ) even if a worker only serves one. here startup imports only fastapi,
+an app is imported ( in a thread, once ) when a request for it arrives, and its lifespan
+( process pool, database ... ) starts right after and stops with the launcher.
+
+OpenAPI: building the schema of big nested models ( ItemModel, FilterParams ) is slow, so
+the JSON is kept in .openapi_cache/<app>-<hash>.json. the hash covers the source of the app,
+every local module it imports and the fastapi / pydantic versions -> a change to any of
+them builds a new schema, nothing else does. fill the cache at deploy time:
+
+    python launcher.py --precompute    ( import every app, write every schema, print the times )
+    python launcher.py --importtime    ( cold import of every app in a fresh python, slowest imports )
+
+NOTE:
+    $OPENAPI_CACHE_DIR moves the cache, it is safe to delete.
+    the apps keep their own /metrics, e.g. /3_query_parameter/metrics.
+"""
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("OPENAPI_CACHE_DIR", os.path.join(ROOT, ".openapi_cache"))
+
+# mount path -> module
+APPS = {
+    "/main": "main",
+    "/3_query_parameter": "3_query_parameter",
+    "/4_request_body": "4_request_body",
+    "/5_query_parameter_string_validation": "5_query_parameter_string_validation",
+    "/6_path_parameters_numeric_validation": "6_path_parameters_numeric_validation",
+    "/7_query_parameter_models": "7_query_parameter_models",
+    "/8_body_multiple_parameter": "8_body_multiple_parameter",
+    "/9_body_field": "9_body_field",
+    "/10_body_nested_models": "10_body_nested_models",
+}
+
+
+def _local_imports(source: bytes) -> set[str]:
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return {name for name in names if os.path.exists(os.path.join(ROOT, name + ".py"))}
+
+
+def source_hash(module_name: str) -> str:
+    """
+    hash of the module, the local modules it imports ( all the way down ) and the versions
+    """
+    sources = {}
+    todo = [module_name]
+    while todo:
+        name = todo.pop()
+        if name in sources:
+            continue
+        with open(os.path.join(ROOT, name + ".py"), "rb") as f:
+            sources[name] = f.read()
+        todo.extend(_local_imports(sources[name]))
+    digest = hashlib.sha256(f"{fastapi.__version__}|{pydantic.__version__}".encode())
+    for name in sorted(sources):
+        digest.update(b"\0" + name.encode() + b"\0" + sources[name])
+    return digest.hexdigest()[:16]
+
+
+class LazyApp:
+    """
+    ASGI app that imports `module_name` and forwards to its `app` on the first request
+    """
+
+    def __init__(self, module_name: str, launcher: "Launcher"):
+        self.module_name = module_name
+        self.launcher = launcher
+        self.app: FastAPI | None = None
+        self.import_seconds: float | None = None
+        self.lifespan_seconds: float | None = None
+        self.openapi_seconds: float | None = None
+        self.openapi_source: str | None = None  # "disk" / "generated"
+        self._lock = asyncio.Lock()
+        self._schema: dict | None = None
+        self._rendered: dict[str, bytes] = {}  # root_path -> openapi.json
+
+    async def load(self) -> FastAPI:
+        if self.app is None:
+            async with self._lock:  # 50 requests for a cold app -> one import
+                if self.app is None:
+                    start = time.perf_counter()
+                    module = await anyio.to_thread.run_sync(
+                        importlib.import_module, self.module_name
+                    )
+                    self.import_seconds = time.perf_counter() - start
+                    start = time.perf_counter()
+                    await self.launcher.start_lifespan(module.app)
+                    self.lifespan_seconds = time.perf_counter() - start
+                    self.app = module.app
+        return self.app
+
+    @property
+    def cache_path(self) -> str:
+        return os.path.join(CACHE_DIR, f"{self.module_name}-{source_hash(self.module_name)}.json")
+
+    async def schema(self) -> dict:
+        if self._schema is not None:
+            return self._schema
+        path = self.cache_path
+        start = time.perf_counter()
+        try:
+            with open(path, "rb") as f:
+                self._schema = json.loads(f.read())
+            self.openapi_source = "disk"
+        except FileNotFoundError:
+            app = await self.load()
+            self._schema = app.openapi()
+            self.openapi_source = "generated"
+            write_schema(path, self._schema)
+        self.openapi_seconds = time.perf_counter() - start
+        return self._schema
+
+    async def openapi_json(self, root_path: str) -> bytes:
+        rendered = self._rendered.get(root_path)
+        if rendered is None:
+            schema = await self.schema()
+            if root_path:
+                # like FastAPI: "try it out" in the docs must call /<app>/..., not /...
+                schema = {**schema, "servers": [{"url": root_path}]}
+            rendered = self._rendered[root_path] = json.dumps(schema).encode()
+        return rendered
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            root_path = scope.get("root_path", "")
+            path = scope["path"].removeprefix(root_path)
+            response = None
+            if path == "/openapi.json":
+                response = Response(await self.openapi_json(root_path), media_type="application/json")
+            elif path == "/docs":
+                title = (await self.schema())["info"]["title"]
+                response = get_swagger_ui_html(
+                    openapi_url=root_path + "/openapi.json", title=f"{title} - Swagger UI"
+                )
+            if response is not None:
+                return await response(scope, receive, send)
+        app = await self.load()
+        await app(scope, receive, send)
+
+
+def write_schema(path: str, schema: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(schema, f)
+    os.replace(tmp, path)  # other workers never see half a file
+
+
+class Launcher:
+    def __init__(self, apps: dict[str, str]):
+        self.apps = {prefix: LazyApp(module, self) for prefix, module in apps.items()}
+        self._stop = asyncio.Event()
+        self._lifespans: list[asyncio.Task] = []
+
+    async def start_lifespan(self, app: FastAPI) -> None:
+        """
+        run the startup of a lazily imported app now, its shutdown with the launcher
+        """
+        started = asyncio.Event()
+
+        async def run():
+            # one task holds the lifespan open -> startup and shutdown run in the same task
+            try:
+                async with app.router.lifespan_context(app):
+                    started.set()
+                    await self._stop.wait()
+            finally:
+                started.set()
+
+        task = asyncio.create_task(run())
+        await started.wait()
+        if task.done():
+            task.result()  # startup failed -> raise it for this request
+        self._lifespans.append(task)
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        try:
+            yield
+        finally:
+            self._stop.set()
+            await asyncio.gather(*self._lifespans, return_exceptions=True)
+
+    def mount(self, app: FastAPI) -> None:
+        for prefix, lazy in self.apps.items():
+            app.mount(prefix, lazy)
+
+    def report(self) -> dict:
+        return {
+            prefix: {
+                "module": lazy.module_name,
+                "loaded": lazy.app is not None,
+                "import_seconds": lazy.import_seconds,
+                "lifespan_seconds": lazy.lifespan_seconds,
+                "openapi": lazy.openapi_source,
+                "openapi_seconds": lazy.openapi_seconds,
+            }
+            for prefix, lazy in self.apps.items()
+        }
+
+
+launcher = Launcher(APPS)
+
+app = FastAPI(lifespan=launcher.lifespan)
+
+
+@app.get("/")
+async def read_apps():
+    return {
+        prefix: {"module": lazy.module_name, "loaded": lazy.app is not None}
+        for prefix, lazy in launcher.apps.items()
+    }
+
+
+@app.get("/_launcher/report")
+async def read_report():
+    return launcher.report()
+
+
+launcher.mount(app)
+
+
+def precompute() -> None:
+    print(f"{'app':<40}{'import s':>10}{'openapi s':>11}  cache")
+    for lazy in launcher.apps.values():
+        start = time.perf_counter()
+        module = importlib.import_module(lazy.module_name)
+        imported = time.perf_counter() - start
+        start = time.perf_counter()
+        schema = module.app.openapi()
+        generated = time.perf_counter() - start
+        write_schema(lazy.cache_path, schema)
+        print(f"{lazy.module_name:<40}{imported:>10.3f}{generated:>11.3f}  {os.path.relpath(lazy.cache_path, ROOT)}")
+    print("( import s of the first apps includes fastapi / pydantic, the next ones reuse them )")
+
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def importtime(top: int = 5) -> None:
+    """
+    import every app in a fresh interpreter with -X importtime
+    """
+    for lazy in launcher.apps.values():
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"__import__({lazy.module_name!r})"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        rows = [
+            (int(own), int(cumulative), name)
+            for own, cumulative, _, name in _IMPORTTIME.findall(result.stderr)
+        ]
+        total = next((c for _, c, name in rows if name == lazy.module_name), 0)
+        print(f"\n{lazy.module_name}: {total / 1e6:.3f} s cold import")
+        for own, _, name in sorted(rows, reverse=True)[:top]:
+            print(f"    {own / 1e6:8.3f} s  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="tutorial apps launcher")
+    parser.add_argument("--precompute", action="store_true", help="write the OpenAPI cache of every app")
+    parser.add_argument("--importtime", action="store_true", help="cold import time report")
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+    if args.precompute:
+        precompute()
+    if args.importtime:
+        importtime()
+    if not (args.precompute or args.importtime):
+        parser.print_help()
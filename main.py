@@ -1,10 +1,52 @@
 from enum import Enum
 from typing import Union
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel  # standard python types
 
-app = FastAPI()
+from admission import AdmissionControl, RateLimit, RateLimiter
+from executor import ThreadPool
+from file_serving import FileServer
+from metrics import install_metrics
+from model_registry import ModelRegistry
+from shared_state import SharedResponseCache
+from single_flight import SingleFlight
+
+# NOTE: cached responses live in shared memory -> a hit for every worker ( see shared_state.py )
+shared_cache = SharedResponseCache("main", slots=256, slot_bytes=4 * 1024)
+
+app = FastAPI(lifespan=shared_cache.lifespan)  # startup empties the cache of the last run
+install_metrics(app)  # /metrics
+shared_cache.install(app)
+
+# NOTE: normal def handlers of this app run here instead of the hidden default pool
+thread_pool = ThreadPool(max_workers=16, max_queue=64, name="main")
+thread_pool.install(app)
+
+# NOTE: /files/... is served from $FILES_ROOT ( default ./files ), at most 64 fds stay open
+file_server = FileServer(max_open=64)
+file_server.install(app)
+
+# NOTE: models are loaded on their first request from $MODELS_ROOT/<name>.bin, not at startup
+model_registry = ModelRegistry()
+model_registry.install(app)
+
+# NOTE: concurrent identical reads share one run of the handler
+single_flight = SingleFlight()
+single_flight.install(app)
+
+# NOTE: overload protection ( see admission.py ), installed last -> runs before everything else
+admission = AdmissionControl(max_concurrency=64, max_queue=256, target=0.005)  # 503 when overloaded
+admission.install(app)
+# per client, 429 over it. $RATE_LIMIT_<name>=<rate>/<burst> or =off changes one, $RATE_LIMITS=off all
+rate_limiter = RateLimiter(
+    default=RateLimit.from_env("DEFAULT", rate=100, burst=200),
+    routes={
+        "PUT /items/{item_id}": RateLimit.from_env("PUT_ITEMS", rate=10, burst=20),
+        "GET /models/{model_name}": RateLimit.from_env("GET_MODELS", rate=5, burst=10),
+    },
+)
+rate_limiter.install(app)
 
 
 class Item(BaseModel):
@@ -32,6 +74,7 @@ async def read_user(user_id: int):
 
 
 @app.get("/items/{item_id}")
+@thread_pool.offload(max_concurrency=8, max_queue=32)  # full queue -> 503
 def read_item(
     item_id: int, q: Union[str, None] = None
 ):  # item_id and q is a parameter pass with url
@@ -40,6 +83,7 @@ def read_item(
 
 
 @app.put("/items/{item_id}")
+@thread_pool.offload(max_concurrency=8, max_queue=32)
 def update_item(
     item_id: int, item: Item
 ):  # item_id = parameter pass with url , item is a request body pass with json body
@@ -58,26 +102,48 @@ class ModelName(Enum):
 
 
 @app.get("/models/{model_name}")
+@shared_cache.cached(ttl=300)  # the answer only depends on model_name ( and its artifact )
+@single_flight.coalesce(key=lambda request: request.path_params["model_name"])
 async def get_model(model_name: ModelName):
+    # first request for a model -> maps its artifact, the next ones reuse it
+    # no artifact in $MODELS_ROOT ( a fresh checkout ) -> the plain answer without size_bytes
+    # load times change on every reload -> /models_stats/, not here ( the answer is cached )
+    info = {}
+    try:
+        model = await model_registry.get(model_name.value)
+        info = {"size_bytes": model.size}
+    except HTTPException as e:
+        if e.status_code != 404:
+            raise
+
     if model_name == ModelName.alexnet:
         return {
             "model_name": model_name,
             "message": "this is alexnet ...",
+            **info,
         }
 
     if model_name.value == "lenet":
-        return {"model_name": model_name, "message": "LeCNN all the images"}
+        return {"model_name": model_name, "message": "LeCNN all the images", **info}
+
+    return {"model_name": model_name, "message": "Deep Learning FTW!", **info}
+
 
-    return {"model_name": model_name, "message": "Deep Learning FTW!"}
+@app.get("/models_stats/")
+async def read_model_stats():
+    # http://127.0.0.1:8000/models_stats/
+    return model_registry.stats()
 
 
 @app.get("/files/{file_path:path}")
-async def read_file(file_path: str):
+@app.head("/files/{file_path:path}", include_in_schema=False)
+async def read_file(file_path: str, request: Request):
     """
     /files/{file_path:path}
     In this case, the name of the parameter is file_path, and the last part, :path, tells it that the parameter should match any path.
+    http://127.0.0.1:8000/files/models/resnet.bin  ( Range, If-None-Match, If-Modified-Since work too )
     """
-    return {"file": file_path}
+    return file_server.response(request, file_path)
 
 #NOTE: query parameter
 
@@ -0,0 +1,236 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+"""
+per route latency histograms + /metrics ( prometheus text format )
+
+    app = FastAPI()
+    install_metrics(app)
+
+every request is recorded under its route template ( /items/{item_id}, not /items/42 ),
+method and status code, and split into phases:
+
+    validation     -> request arrives .. handler starts  ( body read + parsing + pydantic validation )
+    handler        -> handler starts .. handler returns
+    serialization  -> handler returns .. response starts  ( jsonable_encoder + json.dumps )
+
+NOTE:
+    histograms have fixed buckets -> recording is one bisect + a few increments.
+    everything is recorded by the middleware on the event loop thread -> no locks.
+    for a normal `def` handler the validation phase also contains the wait for a free thread.
+    caches, pools, limiters ... add their own lines with their install(app): it appends a
+    collector to app.state.metrics.collectors -> install_metrics(app) has to run before them.
+"""
+
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+UNMATCHED = "<unmatched>"
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Timings:
+    __slots__ = ("start", "handler_start", "handler_end")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.handler_start = None
+        self.handler_end = None
+
+
+_timings: ContextVar[Timings | None] = ContextVar("metrics_timings", default=None)
+
+
+def _timed(call):
+    """
+    wrap the endpoint to mark when the handler starts and ends
+    ( a normal def stays a normal def -> FastAPI still runs it in the thread pool )
+    """
+    if inspect.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            if timings is None:
+                return await call(*args, **kwargs)
+            timings.handler_start = time.perf_counter()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                timings.handler_end = time.perf_counter()
+
+    else:
+
+        @functools.wraps(call)
+        def wrapper(*args, **kwargs):
+            # the thread pool runs a copy of the context -> same Timings object
+            timings = _timings.get()
+            if timings is None:
+                return call(*args, **kwargs)
+            timings.handler_start = time.perf_counter()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                timings.handler_end = time.perf_counter()
+
+    wrapper._metrics_timed = True
+    return wrapper
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        self.requests: dict[tuple[str, str, int], Histogram] = {}
+        self.phases: dict[tuple[str, str, str], Histogram] = {}
+        self.in_flight = 0
+        self.collectors: list[Callable[[], Iterable[str]]] = []
+
+    def observe(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        total: float,
+        timings: Timings,
+        response_start: float | None,
+    ) -> None:
+        key = (method, route, status)
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram()
+        histogram.observe(total)
+        if timings.handler_start is None or timings.handler_end is None:
+            return  # rejected before the handler ( 404, 422, ... )
+        phases = {
+            "validation": timings.handler_start - timings.start,
+            "handler": timings.handler_end - timings.handler_start,
+        }
+        if response_start is not None:
+            phases["serialization"] = max(0.0, response_start - timings.handler_end)
+        for phase, value in phases.items():
+            key = (method, route, phase)
+            histogram = self.phases.get(key)
+            if histogram is None:
+                histogram = self.phases[key] = Histogram()
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests being served right now.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_request_duration_seconds Request latency by route template and status.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self.requests.items()):
+            labels = f'method="{method}",route="{_label(route)}",status="{status}"'
+            lines.extend(histogram.lines("http_request_duration_seconds", labels))
+        lines += [
+            "# HELP http_request_phase_seconds Time spent in validation, handler and serialization.",
+            "# TYPE http_request_phase_seconds histogram",
+        ]
+        for (method, route, phase), histogram in sorted(self.phases.items()):
+            labels = f'method="{method}",route="{_label(route)}",phase="{phase}"'
+            lines.extend(histogram.lines("http_request_phase_seconds", labels))
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics, router_app: FastAPI):
+        self.app = app
+        self.metrics = metrics
+        self.router_app = router_app
+        self._instrumented = 0
+
+    def _instrument_routes(self) -> None:
+        routes = self.router_app.routes
+        if self._instrumented == len(routes):
+            return
+        for route in routes:
+            if not isinstance(route, APIRoute):
+                continue
+            if not getattr(route.dependant.call, "_metrics_timed", False):
+                route.dependant.call = _timed(route.dependant.call)
+        self._instrumented = len(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self._instrument_routes()
+        start = time.perf_counter()
+        timings = Timings(start)
+        token = _timings.set(timings)
+        status = 500
+        response_start = None
+
+        async def send_wrapper(message):
+            nonlocal status, response_start
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_start = time.perf_counter()
+            await send(message)
+
+        self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.in_flight -= 1
+            _timings.reset(token)
+            route = scope.get("route")
+            self.metrics.observe(
+                scope["method"],
+                getattr(route, "path", UNMATCHED),
+                status,
+                time.perf_counter() - start,
+                timings,
+                response_start,
+            )
+
+
+def install_metrics(app: FastAPI, path: str = "/metrics") -> Metrics:
+    """
+    add the middleware and the /metrics endpoint to an app
+    """
+    metrics = Metrics()
+    app.state.metrics = metrics
+    app.add_middleware(MetricsMiddleware, metrics=metrics, router_app=app)
+
+    async def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route(path, read_metrics, include_in_schema=False)
+    return metrics
@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import mmap
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import anyio.to_thread
+from fastapi import FastAPI, HTTPException
+
+from metrics import Histogram
+
+"""
+lazy model registry ( model name -> memory mapped artifact )
+
+loading every model when the app starts makes `fastapi run` slow and keeps models in memory
+that nobody asks for. the registry loads a model on its first request instead:
+
+    registry = ModelRegistry("/srv/models", budget_bytes=2 * 1024**3)  # <root>/<name>.bin
+    registry.install(app)  # load / cache metrics on /metrics
+
+    model = await registry.get("resnet")   # first call maps the file, next calls are a dict lookup
+    model.weights                          # loader(mmap), default: a memoryview of the file
+
+    - the artifact is mmap'ed read only -> the pages live in the OS page cache and are shared
+      by every uvicorn worker that maps the same file ( no private copy per process )
+    - models are kept in a LRU, the mapped bytes must stay under budget_bytes
+    - 100 requests for a cold model at the same time -> one load, 99 wait for it
+    - a failed load is not cached, the next request tries again
+
+NOTE:
+    root / budget default to $MODELS_ROOT ( ./models ) and $MODELS_MEMORY_BUDGET ( 1 GiB ).
+    a model bigger than the whole budget is still loaded, everything else is evicted.
+    an evicted model is unmapped when the last reference to its weights goes away.
+"""
+
+
+def _memoryview(data: mmap.mmap) -> Any:
+    return memoryview(data)
+
+
+class LoadedModel:
+    __slots__ = ("name", "path", "size", "weights", "load_seconds", "loaded_at", "hits", "_map")
+
+    def __init__(self, name: str, path: str, loader: Callable[[mmap.mmap], Any]):
+        start = time.perf_counter()
+        self.name = name
+        self.path = path
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # the mapping keeps its own reference to the file, the fd can be closed
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._map, "madvise"):
+            self._map.madvise(mmap.MADV_WILLNEED)  # start reading the pages in the background
+        self.weights = loader(self._map)
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = time.time()
+        self.hits = 0
+
+    def close(self) -> None:
+        self.weights = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a handler still holds a view -> unmapped when it is freed
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        root: str | None = None,
+        budget_bytes: int | None = None,
+        suffix: str = ".bin",
+        loader: Callable[[mmap.mmap], Any] = _memoryview,
+    ):
+        self.root = root or os.getenv("MODELS_ROOT", "models")
+        self.budget_bytes = budget_bytes or int(os.getenv("MODELS_MEMORY_BUDGET", 1024**3))
+        self.suffix = suffix
+        self.loader = loader
+        self._models: OrderedDict[str, LoadedModel] = OrderedDict()
+        self._loading: dict[str, asyncio.Future] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.failures = 0
+        self.load_time = Histogram()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name + self.suffix)
+
+    async def get(self, name: str) -> LoadedModel:
+        model = self._models.get(name)
+        if model is not None:
+            self.hits += 1
+            model.hits += 1
+            self._models.move_to_end(name)
+            return model
+        loading = self._loading.get(name)
+        if loading is None:
+            self.misses += 1
+            loading = self._loading[name] = asyncio.ensure_future(self._load(name))
+            loading.add_done_callback(functools.partial(self._loaded, name))
+        else:
+            # someone is loading it right now -> wait for that load
+            self.coalesced += 1
+        # shield -> a client that goes away does not cancel the load for everybody else
+        return await asyncio.shield(loading)
+
+    async def _load(self, name: str) -> LoadedModel:
+        if os.path.basename(name) != name or name.startswith("."):
+            raise HTTPException(status_code=404, detail="Model artifact not found")
+        try:
+            model = await anyio.to_thread.run_sync(LoadedModel, name, self.path(name), self.loader)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Model artifact not found")
+        self._add(model)
+        return model
+
+    def _loaded(self, name: str, loading: asyncio.Future) -> None:
+        del self._loading[name]
+        if loading.cancelled() or loading.exception() is not None:
+            self.failures += 1  # not cached, the next request tries again
+
+    def _add(self, model: LoadedModel) -> None:
+        while self._models and self.bytes + model.size > self.budget_bytes:
+            self._evict(next(iter(self._models)))
+        self._models[model.name] = model
+        self.bytes += model.size
+        self.load_time.observe(model.load_seconds)
+
+    def _evict(self, name: str) -> None:
+        model = self._models.pop(name)
+        self.bytes -= model.size
+        self.evictions += 1
+        model.close()
+
+    def unload(self, name: str) -> bool:
+        if name not in self._models:
+            return False
+        self._evict(name)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "loaded_bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "failures": self.failures,
+            "loading": sorted(self._loading),
+            "models": [
+                {
+                    "model_name": model.name,
+                    "size_bytes": model.size,
+                    "load_seconds": model.load_seconds,
+                    "hits": model.hits,
+                }
+                for model in reversed(self._models.values())  # most recently used first
+            ],
+        }
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP model_registry_loaded_bytes Bytes of model artifacts mapped right now."
+        yield "# TYPE model_registry_loaded_bytes gauge"
+        yield f"model_registry_loaded_bytes {self.bytes}"
+        yield "# HELP model_registry_events_total Model lookups and loads by result."
+        yield "# TYPE model_registry_events_total counter"
+        for event in ("hits", "misses", "coalesced", "evictions", "failures"):
+            yield f'model_registry_events_total{{event="{event}"}} {getattr(self, event)}'
+        yield "# HELP model_registry_load_seconds Time to map and load one model."
+        yield "# TYPE model_registry_load_seconds histogram"
+        yield from self.load_time.lines("model_registry_load_seconds", 'registry="models"')
+
+    def install(self, app: FastAPI) -> None:
+        """
+        mapped bytes, lookup counters and load times on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)
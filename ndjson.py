@@ -0,0 +1,60 @@
+import zlib
+from collections.abc import AsyncIterator, Iterable
+
+from fastapi.responses import StreamingResponse
+
+from fast_json import dumps
+
+"""
+streaming NDJSON ( newline delimited JSON ) responses
+
+a normal response builds the whole list in memory before sending the first byte.
+ndjson_response() sends one JSON document per line while it walks the rows:
+
+    {"id": 0, "name": "Item 0", ...}
+    {"id": 1, "name": "Item 1", ...}
+
+NOTE:
+    rows are serialized in batches of `batch_size` lines -> memory stays O(batch), not O(rows).
+    StreamingResponse awaits every send(), the server only accepts the next chunk when the
+    client has read the previous ones -> a slow client slows the generator down ( backpressure ).
+    compress=True -> gzip the stream on the fly, Content-Encoding: gzip.
+"""
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson_chunks(
+    rows: Iterable, batch_size: int = 500, compress: bool = False
+) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip header
+    batch = []
+    for row in rows:
+        batch.append(dumps(row))
+        if len(batch) < batch_size:
+            continue
+        chunk = b"\n".join(batch) + b"\n"
+        batch.clear()
+        if compressor:
+            chunk = compressor.compress(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    chunk = b"\n".join(batch) + b"\n" if batch else b""
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def ndjson_response(
+    rows: Iterable, batch_size: int = 500, compress: bool = False, filename: str | None = None
+) -> StreamingResponse:
+    headers = {}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        ndjson_chunks(rows, batch_size, compress), media_type=MEDIA_TYPE, headers=headers
+    )
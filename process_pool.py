@@ -0,0 +1,200 @@
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from multiprocessing.shared_memory import SharedMemory
+
+"""
+process pool for CPU heavy work
+
+the event loop and the thread pool share one GIL -> CPU bound python code
+( validating a huge nested body, filtering a big catalog ) uses one core.
+ProcessPool sends the work to other processes -> one uvicorn worker can use every core.
+
+    process_pool = ProcessPool(max_workers=4)
+    app = FastAPI(lifespan=process_pool.lifespan)  # start + warm up the workers, stop them on shutdown
+
+    @process_pool.offload
+    def summarize(body: bytes) -> dict:  # module level, pure function
+        ...
+
+    @app.put("/items_model_batch/")
+    async def update_items(request: Request):
+        return await summarize(await request.body())  # runs in a worker process
+
+NOTE:
+    arguments and results are pickled once with the highest protocol.
+    big payloads ( >= shm_threshold bytes ) go through shared memory instead of the pipe.
+    the parent unlinks every segment ( arguments and results ) when the call ends, however
+    it ends -> nothing is left in /dev/shm, workers only attach to a segment and close it.
+    a cancelled call ends when its worker is done with it, not when the request goes away.
+    light handlers ( read_root, ... ) stay on the event loop, only offloaded functions move.
+    restart() replaces the workers, running calls finish on the old ones.
+"""
+
+HIGHEST = pickle.HIGHEST_PROTOCOL
+
+
+def _pack(obj, shm_threshold: int):
+    data = pickle.dumps(obj, protocol=HIGHEST)
+    if len(data) < shm_threshold:
+        return data
+    shm = SharedMemory(create=True, size=len(data))
+    shm.buf[: len(data)] = data
+    name = shm.name
+    shm.close()
+    return (name, len(data))
+
+
+def _unpack(packed):
+    # attach + close only, the parent unlinks every segment ( _release )
+    if isinstance(packed, bytes):
+        return pickle.loads(packed)
+    name, size = packed
+    shm = SharedMemory(name=name)
+    try:
+        return pickle.loads(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+def _release(packed) -> None:
+    """
+    unlink the shared memory segment of a packed payload ( no-op for bytes )
+    """
+    if isinstance(packed, bytes):
+        return
+    try:
+        shm = SharedMemory(name=packed[0])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _discard(packed, future) -> None:
+    # a call nobody waits for anymore has ended: free its arguments and its result if it sent one
+    _release(packed)
+    if not future.cancelled() and future.exception() is None:
+        _release(future.result())
+
+
+def _call(module_name: str, qualname: str, packed, shm_threshold: int):
+    # runs in the worker: find the offloaded function by name, call the original
+    target = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    args, kwargs = _unpack(packed)
+    return _pack(target.__wrapped__(*args, **kwargs), shm_threshold)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+class ProcessPool:
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        shm_threshold: int = 1024 * 1024,
+        start_method: str = "spawn",
+    ):
+        self.max_workers = max_workers or int(
+            os.getenv("PROCESS_POOL_WORKERS", os.cpu_count() or 1)
+        )
+        self.shm_threshold = shm_threshold
+        self.start_method = start_method  # spawn -> safe with the threads of the server
+        self._executor: ProcessPoolExecutor | None = None
+        self.calls = 0
+        self.restarts = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+        )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self._new_executor()
+        return self._executor
+
+    async def start(self) -> None:
+        """
+        start every worker now ( importing modules in a new process takes a while )
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _ready) for _ in range(self.max_workers))
+        )
+
+    def restart(self) -> None:
+        """
+        new workers for the next calls, the old ones finish what they are running
+        """
+        old, self._executor = self._executor, self._new_executor()
+        self.restarts += 1
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        await self.start()
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self.shutdown)
+
+    async def _submit(self, func, args, kwargs):
+        for attempt in range(2):
+            packed = _pack((args, kwargs), self.shm_threshold)
+            handed_over = False
+            try:
+                future = self.executor.submit(
+                    _call, func.__module__, func.__qualname__, packed, self.shm_threshold
+                )
+                try:
+                    result = await asyncio.wrap_future(future)
+                except asyncio.CancelledError:
+                    # the worker may not have attached to the arguments yet -> freed once it is done
+                    future.add_done_callback(functools.partial(_discard, packed))
+                    handed_over = True
+                    raise
+                try:
+                    return _unpack(result)
+                finally:
+                    _release(result)
+            except BrokenProcessPool:
+                # a worker died ( killed, out of memory ... ) -> fresh workers, try once more
+                if attempt:
+                    raise
+                self.restart()
+            finally:
+                # the worker is done with the arguments ( or never got them ): the call returned,
+                # the worker died or the pool shut down -> the segment can't leak
+                if not handed_over:
+                    _release(packed)
+
+    def offload(self, func):
+        """
+        decorator: calling the function returns an awaitable that runs it in the pool
+        the function must be defined at module level ( workers import it by name )
+        """
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            self.calls += 1
+            return await self._submit(wrapper, args, kwargs)
+
+        return wrapper
@@ -0,0 +1,218 @@
+import functools
+import hashlib
+import inspect
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from urllib.parse import urlencode
+
+from fastapi import Depends, FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+
+"""
+response cache for GET endpoints
+
+some endpoints are pure functions of their path + query parameters
+( same url -> same response ), but every request still runs the handler,
+jsonable_encoder and json.dumps again.
+
+    @app.get("/items/{item_id}")
+    @cached(ttl=60)
+    async def read_items(item_id: int, q: str | None = None): ...
+
+    first request  -> run the handler, keep the JSON bytes + ETag, X-Cache: MISS
+    next requests  -> send the stored bytes, handler and serializer are skipped, X-Cache: HIT
+    If-None-Match  -> the client already has this ETag -> 304 without a body
+
+NOTE:
+    key = method + path + sorted query parameters, so ?a=1&b=2 and ?b=2&a=1 share one entry.
+    memory is bounded by max_entries and max_bytes, the least recently used entry goes first.
+    only the response of the handler is cached, FastAPI still validates the parameters.
+"""
+
+
+def request_key(request: Request) -> str:
+    """
+    normalized key of a request: METHOD /path?sorted=query
+    """
+    query = urlencode(sorted(request.query_params.multi_items()))
+    path = request.url.path
+    return f"{request.method} {path}?{query}" if query else f"{request.method} {path}"
+
+
+def _current_request(request: Request) -> Request:
+    return request
+
+
+def add_request_param(func, wrapper, name: str):
+    """
+    give wrapper the signature of func plus a `name: Request` keyword parameter
+    -> FastAPI passes the Request to the wrapper, the wrapper pops it before calling func
+    """
+    signature = inspect.signature(func)
+    params = list(signature.parameters.values())
+    request_param = inspect.Parameter(
+        name, inspect.Parameter.KEYWORD_ONLY, annotation=Request
+    )
+    if any(
+        param.annotation is Request and param.default is inspect.Parameter.empty
+        for param in params
+    ):
+        # FastAPI passes the Request to one parameter only -> stacked decorators
+        # ( @cached over @single_flight.coalesce() ) get theirs through a dependency
+        request_param = request_param.replace(
+            annotation=inspect.Parameter.empty, default=Depends(_current_request)
+        )
+    if params and params[-1].kind is inspect.Parameter.VAR_KEYWORD:
+        params.insert(len(params) - 1, request_param)
+    else:
+        params.append(request_param)
+    wrapper.__signature__ = signature.replace(parameters=params)
+    return wrapper
+
+
+async def call_handler(func, *args, **kwargs):
+    """
+    call an async or a normal def handler the way FastAPI does
+    """
+    if inspect.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+def render_json(content) -> bytes:
+    # the same output as fastapi JSONResponse
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag.removeprefix("W/") for tag in tags)
+
+
+class ResponseCache:
+    def __init__(
+        self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, name: str = "responses"
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, str, bytes]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> tuple[str, bytes] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, etag, body = entry
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return etag, body
+
+    def set(self, key: str, body: bytes, ttl: float) -> str:
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if len(body) > self.max_bytes:
+            return etag
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, etag, body)
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+        return etag
+
+    def _pop(self, key: str) -> None:
+        _, _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+        }
+
+    def collect(self) -> Iterable[str]:
+        stats = self.stats()
+        cache = f'cache="{self.name}"'
+        yield "# HELP response_cache_events_total Response cache lookups by result."
+        yield "# TYPE response_cache_events_total counter"
+        for event in ("hits", "misses", "not_modified", "evictions"):
+            yield f'response_cache_events_total{{{cache},event="{event}"}} {stats[event]}'
+        yield "# HELP response_cache_bytes Bytes of JSON kept by the response cache."
+        yield "# TYPE response_cache_bytes gauge"
+        yield f"response_cache_bytes{{{cache}}} {stats['bytes']}"
+
+    def install(self, app: FastAPI) -> None:
+        """
+        export the stats of this cache on the /metrics of app ( the app whose handlers use it )
+        """
+        app.state.metrics.collectors.append(self.collect)
+
+    def cached(self, ttl: float = 60):
+        """
+        decorator for a GET handler, the response is kept for `ttl` seconds
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, _cache_request: Request, **kwargs):
+                key = request_key(_cache_request)
+                hit = self.get(key)
+                if hit is None:
+                    self.misses += 1
+                    content = await call_handler(func, *args, **kwargs)
+                    if isinstance(content, Response):
+                        return content  # the handler built its own response -> don't cache
+                    body = render_json(content)
+                    etag = self.set(key, body, ttl)
+                    status = "MISS"
+                else:
+                    self.hits += 1
+                    etag, body = hit
+                    status = "HIT"
+                headers = {
+                    "ETag": etag,
+                    "Cache-Control": f"max-age={int(ttl)}",
+                    "X-Cache": status,
+                }
+                if_none_match = _cache_request.headers.get("if-none-match")
+                if if_none_match and _etag_matches(if_none_match, etag):
+                    self.not_modified += 1
+                    return Response(status_code=304, headers=headers)
+                return Response(body, media_type="application/json", headers=headers)
+
+            return add_request_param(func, wrapper, "_cache_request")
+
+        return decorator
+
+
+response_cache = ResponseCache()
+cached = response_cache.cached
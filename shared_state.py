@@ -0,0 +1,376 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextlib import asynccontextmanager
+from typing import Generic, TypeVar
+
+import anyio.to_thread
+from fastapi import FastAPI
+
+from response_cache import ResponseCache
+
+"""
+state shared by every worker of `fastapi run --workers N` ( one host )
+
+every worker is its own process: a catalog or a cache built at import is built N times,
+kept N times, and a response cached by one worker is a miss in the others.
+here the data lives in files under $SHARED_DIR ( default /dev/shm/fastapi-tutorial-<uid>, tmpfs =
+memory ) mapped by every worker -> one copy in the page cache, whatever N is.
+
+SharedSnapshot: a read mostly blob ( e.g. IdCatalog.to_bytes() ), read in place through the mapping
+
+    snapshot = SharedSnapshot("id_catalog", build=..., load=IdCatalog.from_buffer, version=data_hash)
+    app = FastAPI(lifespan=snapshot.lifespan)   # startup: build ( or map ) it in a thread
+    catalog = snapshot.get()        # per request: one 8 byte read of the generation counter
+    snapshot.update(change)         # publish change(catalog) -> every worker sees it on its next get()
+
+    <name>.gen      8 byte generation counter, mapped by every worker
+    <name>.<gen>    the snapshot of that generation, never changed after it is written
+    publish = write <name>.<gen + 1>, bump the counter, delete the old file ( workers that still
+    use it keep their mapping, the file is freed with the last one ) -> an atomic swap,
+    a reader sees the old snapshot or the new one, never half of each.
+
+SharedResponseCache: ResponseCache ( same @cached decorator ) in one shared mapped file
+
+    shared_cache = SharedResponseCache("3_query_parameter", slots=4096, slot_bytes=16 * 1024)
+    app = FastAPI(lifespan=shared_cache.lifespan)   # startup: forget the responses of the last run
+    @shared_cache.cached(ttl=60)
+
+    - a fixed table of slots, a key goes to slot hash(key) % slots ( a new key replaces the old one )
+    - reads take no lock ( seqlock ): the writer makes the slot counter odd, writes, makes it
+      even again. a reader copies the slot and checks the counter did not change meanwhile,
+      else it is a miss. writers lock the slot ( fcntl byte range lock, across processes, and a
+      thread lock in the process ). the lock is only tried: a busy slot -> the response is not
+      cached this time, set() never waits on the event loop.
+    - clear() bumps the generation in the file header -> every entry of every worker is stale.
+
+NOTE:
+    same host only ( the files are the shared memory ), one $SHARED_DIR per deployment.
+    the workers trust what is in $SHARED_DIR -> it must belong to the user of the app and be
+    closed to everyone else ( 0o700 ), else the first access raises PermissionError.
+    a response bigger than slot_bytes - 64 is not cached.
+    hits / misses are counted per worker, /metrics of one worker shows that worker.
+"""
+
+SHARED_DIR = os.getenv(
+    "SHARED_DIR",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        f"fastapi-tutorial-{os.getuid()}",  # /dev/shm is world writable -> one directory per user
+    ),
+)
+
+T = TypeVar("T")
+
+_COUNTER = struct.Struct("<Q")
+_CHECKED_DIRS: set[str] = set()
+
+
+def private_dir(path: str) -> str:
+    """
+    create path ( 0o700 ) if needed, refuse a directory that another user owns or can open:
+    a file planted there would be mapped and served as our own data
+    """
+    if path not in _CHECKED_DIRS:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)  # lstat -> a symlink to somewhere else is refused too
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(
+                f"{path} must be a directory of uid {os.getuid()} with mode 0o700 ( see $SHARED_DIR )"
+            )
+        _CHECKED_DIRS.add(path)
+    return path
+
+
+class SharedSnapshot(Generic[T]):
+    def __init__(
+        self,
+        name: str,
+        build: Callable[[], bytes],
+        load: Callable[[memoryview], T],
+        version: str = "",
+        root: str | None = None,
+    ):
+        # the files outlive the app -> a new version ( hash of the source data, deploy id ... )
+        # starts a new snapshot instead of mapping the one of the last run
+        self.name = f"{name}-{version}" if version else name
+        self.build = build
+        self.load = load
+        self.root = root or SHARED_DIR
+        self.generation = 0  # generation of self._value
+        self._value: T | None = None
+        self._counter: mmap.mmap | None = None
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.root, f"{self.name}.{suffix}")
+
+    def _open_counter(self) -> mmap.mmap:
+        if self._counter is None:
+            private_dir(self.root)
+            fd = os.open(self._path("gen"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < _COUNTER.size:
+                    os.ftruncate(fd, _COUNTER.size)  # a new file reads as generation 0
+                self._counter = mmap.mmap(fd, _COUNTER.size)
+            finally:
+                os.close(fd)
+        return self._counter
+
+    def current(self) -> int:
+        """
+        generation published by any worker ( 0 = nothing yet )
+        """
+        return _COUNTER.unpack_from(self._open_counter())[0]
+
+    def get(self) -> T:
+        generation = self.current()
+        if generation != self.generation or self._value is None:
+            self._refresh(generation)
+        return self._value
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        # the first get() takes a file lock and may build the snapshot -> not on the event loop
+        await anyio.to_thread.run_sync(self.get)
+        yield
+
+    def _refresh(self, generation: int) -> None:
+        while True:
+            if generation == 0:
+                with self._lock():
+                    generation = self.current()
+                    if generation == 0:
+                        # the first worker builds it, the others wait for the lock and map it
+                        generation = self._publish(self.build())
+            try:
+                with open(self._path(str(generation)), "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                generation = self.current()  # replaced meanwhile -> map the newer one
+                continue
+            # the old mapping is unmapped when no request uses the old value anymore
+            self._value = self.load(memoryview(mapping))
+            self.generation = generation
+            return
+
+    def _lock(self):
+        return _FileLock(self._path("lock"))
+
+    def publish(self, data: bytes) -> int:
+        """
+        swap in a new snapshot for every worker, returns its generation
+        """
+        with self._lock():
+            return self._publish(data)
+
+    def update(self, change: Callable[[T], bytes]) -> int:
+        """
+        publish change(newest snapshot), no other worker can publish in between ( no lost update )
+        """
+        self.get()  # built before the lock is taken ( building takes it too )
+        with self._lock():
+            return self._publish(change(self.get()))
+
+    def _publish(self, data: bytes) -> int:
+        old = self.current()
+        generation = old + 1
+        path = self._path(str(generation))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        _COUNTER.pack_into(self._open_counter(), 0, generation)  # the swap
+        if old:
+            try:
+                os.unlink(self._path(str(old)))
+            except FileNotFoundError:
+                pass
+        return generation
+
+
+class _FileLock:
+    """
+    exclusive lock between processes ( and between threads: one fd per `with` )
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = -1
+
+    def __enter__(self):
+        private_dir(os.path.dirname(self.path))
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+# file header: magic, slots, slot bytes, generation ( at byte 16 )
+_FILE_HEADER = struct.Struct("<4sII4xQ")
+_FILE_HEADER_BYTES = 64
+_MAGIC = b"SRC1"
+# slot header: seq, generation, expires at ( time.time ), key hash, etag digest, body length
+_SLOT_HEADER = struct.Struct("<QQd16s16sI")
+_SLOT_HEADER_BYTES = 64
+_SEQ_READS = 3
+
+
+class SharedResponseCache(ResponseCache):
+    def __init__(
+        self,
+        name: str = "responses",
+        slots: int = 4096,
+        slot_bytes: int = 16 * 1024,
+        root: str | None = None,
+    ):
+        super().__init__(max_entries=slots, max_bytes=slots * (slot_bytes - _SLOT_HEADER_BYTES))
+        self.name = name
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.max_body = slot_bytes - _SLOT_HEADER_BYTES
+        self.root = root or SHARED_DIR
+        self.path = os.path.join(self.root, f"{name}.cache")
+        self.collisions = 0  # a set() replaced another live key
+        self.torn_reads = 0  # a read overlapped a write
+        self.busy = 0  # a set() skipped, another writer had the slot
+        self._fd = -1
+        self._write_lock = threading.Lock()  # fcntl locks don't exclude threads of one process
+        self._map: mmap.mmap | None = None
+
+    def _open(self) -> mmap.mmap:
+        if self._map is not None:
+            return self._map
+        size = _FILE_HEADER_BYTES + self.slots * self.slot_bytes
+        with _FileLock(self.path + ".lock"):
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            header = os.pread(fd, _FILE_HEADER.size, 0)
+            if len(header) < _FILE_HEADER.size or _FILE_HEADER.unpack(header)[:3] != (
+                _MAGIC,
+                self.slots,
+                self.slot_bytes,
+            ):
+                # new file or another layout -> start empty ( ftruncate to 0 zeroes it )
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, _FILE_HEADER.pack(_MAGIC, self.slots, self.slot_bytes, 1), 0)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+        return self._map
+
+    def _generation(self, data: mmap.mmap) -> int:
+        return _COUNTER.unpack_from(data, 16)[0]
+
+    def _slot(self, key: str) -> tuple[int, bytes]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        slot = int.from_bytes(digest[:8], "little") % self.slots
+        return _FILE_HEADER_BYTES + slot * self.slot_bytes, digest
+
+    def get(self, key: str) -> tuple[str, bytes] | None:
+        data = self._open()
+        base, digest = self._slot(key)
+        generation = self._generation(data)
+        for _ in range(_SEQ_READS):
+            seq, entry_generation, expires_at, key_hash, etag, length = _SLOT_HEADER.unpack_from(data, base)
+            if seq & 1:
+                self.torn_reads += 1  # a writer is in this slot right now
+                continue
+            if key_hash != digest or entry_generation != generation or expires_at < time.time():
+                return None
+            body = data[base + _SLOT_HEADER_BYTES : base + _SLOT_HEADER_BYTES + min(length, self.max_body)]
+            if _COUNTER.unpack_from(data, base)[0] == seq:
+                return '"' + etag.hex() + '"', body
+            self.torn_reads += 1
+        return None
+
+    def set(self, key: str, body: bytes, ttl: float) -> str:
+        etag = hashlib.blake2b(body, digest_size=16).digest()
+        if len(body) > self.max_body:
+            return '"' + etag.hex() + '"'
+        data = self._open()
+        base, digest = self._slot(key)
+        # try, don't wait: set() runs on the event loop, a cache write can be skipped
+        if not self._write_lock.acquire(blocking=False):
+            self.busy += 1
+            return '"' + etag.hex() + '"'
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self.slot_bytes, base)
+        except OSError:  # EAGAIN / EACCES: another worker writes this slot
+            self._write_lock.release()
+            self.busy += 1
+            return '"' + etag.hex() + '"'
+        try:
+            seq, entry_generation, expires_at, key_hash, _, _ = _SLOT_HEADER.unpack_from(data, base)
+            generation = self._generation(data)
+            if key_hash not in (digest, bytes(16)) and entry_generation == generation and expires_at >= time.time():
+                self.collisions += 1
+            odd = seq + 1 if seq % 2 == 0 else seq + 2  # odd even after a writer died halfway
+            _COUNTER.pack_into(data, base, odd)
+            _SLOT_HEADER.pack_into(data, base, odd, generation, time.time() + ttl, digest, etag, len(body))
+            data[base + _SLOT_HEADER_BYTES : base + _SLOT_HEADER_BYTES + len(body)] = body
+            _COUNTER.pack_into(data, base, odd + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_bytes, base)
+            self._write_lock.release()
+        return '"' + etag.hex() + '"'
+
+    def clear(self) -> None:
+        data = self._open()
+        with _FileLock(self.path + ".lock"):
+            _COUNTER.pack_into(data, 16, self._generation(data) + 1)
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        # the file outlives the app -> a restart ( new code, new data ) must not serve old responses.
+        # every worker clears on its startup, a worker restarted alone empties the cache once.
+        self.clear()
+        yield
+
+    def __len__(self) -> int:
+        data = self._open()
+        generation = self._generation(data)
+        now = time.time()
+        count = 0
+        for slot in range(self.slots):
+            _, entry_generation, expires_at, key_hash, _, _ = _SLOT_HEADER.unpack_from(
+                data, _FILE_HEADER_BYTES + slot * self.slot_bytes
+            )
+            count += key_hash != bytes(16) and entry_generation == generation and expires_at >= now
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "slots": self.slots,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "collisions": self.collisions,
+            "torn_reads": self.torn_reads,
+            "busy": self.busy,
+        }
+
+    def collect(self) -> Iterable[str]:
+        cache = f'cache="{self.name}"'
+        yield "# HELP shared_cache_entries Live entries of the shared response cache ( every worker )."
+        yield "# TYPE shared_cache_entries gauge"
+        yield f"shared_cache_entries{{{cache}}} {len(self)}"
+        yield "# HELP shared_cache_events_total Shared cache lookups of this worker by result."
+        yield "# TYPE shared_cache_events_total counter"
+        for event in ("hits", "misses", "not_modified", "collisions", "torn_reads", "busy"):
+            yield f'shared_cache_events_total{{{cache},event="{event}"}} {getattr(self, event)}'
+
+    def install(self, app: FastAPI) -> None:
+        """
+        entries of the shared file and the lookups of this worker on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)
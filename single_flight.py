@@ -0,0 +1,107 @@
+import asyncio
+import functools
+from collections.abc import Callable, Hashable, Iterable
+
+from fastapi import FastAPI, Request
+
+from response_cache import add_request_param, call_handler, request_key
+
+"""
+single flight ( request coalescing ) for read handlers
+
+100 clients ask for the same hot item at the same moment -> the handler runs 100 times
+with the same arguments. with single flight the first request ( the leader ) runs the
+handler, the other 99 ( followers ) wait for it and get the same result.
+
+    single_flight = SingleFlight()
+    single_flight.install(app)  # leader / follower counters on /metrics
+
+    @app.get("/items/{item_id}")
+    @single_flight.coalesce()
+    async def read_item(item_id: int, q: str | None = None): ...
+
+    key=None      -> request_key(): METHOD /path?sorted=query ( the same key as @cached )
+    key=callable  -> key(request), e.g. lambda request: request.path_params["item_id"]
+
+unlike @cached nothing is kept: the result is shared only while the handler is running,
+the next request after that runs the handler again -> no stale data.
+with both, put @cached above -> hits never wait, concurrent misses run the handler once.
+
+NOTE:
+    the handler runs in its own task -> a leader that disconnects does not cancel it for the followers.
+    errors ( HTTPException, ... ) are shared too: every waiting request gets the same error.
+    followers get the same object -> the handler must not return something that can only
+    be sent once ( StreamingResponse ) or that a caller changes afterwards.
+"""
+
+
+class FlightStats:
+    __slots__ = ("leaders", "followers")
+
+    def __init__(self):
+        self.leaders = 0  # requests that ran the handler
+        self.followers = 0  # requests that got the result of another one
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: dict[tuple[str, Hashable], asyncio.Future] = {}
+        self.routes: dict[str, FlightStats] = {}
+
+    def coalesce(self, key: Callable[[Request], Hashable] | None = None):
+        """
+        decorator: concurrent calls with the same key share one run of the handler
+        """
+        make_key = key or request_key
+
+        def decorator(func):
+            name = func.__name__
+            stats = self.routes[name] = FlightStats()
+
+            @functools.wraps(func)
+            async def wrapper(*args, _flight_request: Request, **kwargs):
+                flight_key = (name, make_key(_flight_request))
+                flight = self._flights.get(flight_key)
+                if flight is None:
+                    stats.leaders += 1
+                    flight = asyncio.ensure_future(call_handler(func, *args, **kwargs))
+                    self._flights[flight_key] = flight
+                    flight.add_done_callback(functools.partial(self._landed, flight_key))
+                else:
+                    stats.followers += 1
+                return await asyncio.shield(flight)
+
+            return add_request_param(func, wrapper, "_flight_request")
+
+        return decorator
+
+    def _landed(self, flight_key, flight: asyncio.Future) -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+        if not flight.cancelled():
+            flight.exception()  # every waiter may be gone -> mark the error as seen
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "routes": {
+                name: {"leaders": s.leaders, "followers": s.followers}
+                for name, s in self.routes.items()
+            },
+        }
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP single_flight_in_flight Handler runs other requests can join right now."
+        yield "# TYPE single_flight_in_flight gauge"
+        yield f"single_flight_in_flight {len(self._flights)}"
+        yield "# HELP single_flight_requests_total Requests that ran the handler ( leader ) or shared a running one ( follower )."
+        yield "# TYPE single_flight_requests_total counter"
+        for name, s in self.routes.items():
+            yield f'single_flight_requests_total{{handler="{name}",role="leader"}} {s.leaders}'
+            yield f'single_flight_requests_total{{handler="{name}",role="follower"}} {s.followers}'
+
+    def install(self, app: FastAPI) -> None:
+        """
+        leader / follower counts per handler on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)
@@ -0,0 +1,304 @@
+import asyncio
+import functools
+import os
+import re
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+
+from bulk import BatchError
+
+"""
+streaming ingestion of huge JSON array bodies
+
+`await request.body()` + validate = the whole body in memory, then the whole list of models
+-> a 500 MB upload needs a few GB in the worker. here the body is read chunk by chunk:
+
+    request.stream()  ->  JsonArraySplitter  ->  validate the elements  ->  queue of batches  ->  sink
+       ( chunks )          ( element bytes )      of one chunk             ( max_batches )    ( database )
+
+    rows = json_array_items(request, ItemRow)   # async iterator of (row, model, errors)
+    await pipeline(rows, save_batch, batch_size=500)        # save_batch(list of rows) in another task
+
+    - the splitter finds the top level elements of the array without parsing them
+      ( one regex match per element ), pydantic-core parses + validates the elements of a chunk
+    - a full queue stops the reading of the body -> the client is slowed down by TCP,
+      memory stays O(batch_size * max_batches) items whatever the size of the body
+    - install_body_limit(app) answers 413 to bodies bigger than $MAX_BODY_BYTES ( 16 MiB ),
+      routes that stream get their own, bigger limit
+
+NOTE:
+    the batches saved before an error ( broken JSON, body too big, client gone ) stay saved.
+    a bad element doesn't stop the stream, it is reported by row number like in bulk.py.
+"""
+
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", 16 * 1024**2))
+STREAM_MAX_BODY_BYTES = int(os.getenv("STREAM_MAX_BODY_BYTES", 1024**3))
+
+_STRUCTURE = re.compile(rb'["\[\]{},]')  # outside of a string
+_STRING = re.compile(rb'["\\]')  # inside of a string
+_SPACE = b" \t\r\n"
+
+
+def _element_pattern(max_depth: int) -> re.Pattern:
+    # one top level element + the "," or "]" after it, in a single regex match ( C speed ).
+    # re has no recursion -> nesting is unrolled max_depth times, possessive -> no backtracking.
+    string = rb'"(?:[^"\\]++|\\.)*+"'
+    inner = rb'(?:[^"{}\[\]]++|' + string + rb")*+"
+    for _ in range(max_depth - 1):
+        inner = rb'(?:[^"{}\[\]]++|' + string + rb"|\{" + inner + rb"\}|\[" + inner + rb"\])*+"
+    element = rb'(?:[^"{}\[\],]++|' + string + rb"|\{" + inner + rb"\}|\[" + inner + rb"\])*+"
+    return re.compile(rb"(" + element + rb")([,\]])")
+
+
+_ELEMENT = _element_pattern(max_depth=6)
+
+
+class JsonArraySplitter:
+    """
+    feed() chunks of a JSON array, get back the bytes of every complete top level element
+    """
+
+    def __init__(self, max_item_bytes: int = 1024**2):
+        self.max_item_bytes = max_item_bytes
+        self._buffer = bytearray()
+        self._pos = 0  # next byte to scan
+        self._start = 0  # first byte of the current element
+        self._depth = 0  # 1 = inside the array
+        self._in_string = False
+        self._done = False
+        self._count = 0
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        if self._done:
+            if chunk.strip(_SPACE):
+                raise BatchError("Unexpected data after the end of the JSON array.")
+            return []
+        self._buffer += chunk
+        elements: list[bytes] = []
+        buffer = self._buffer
+        while True:
+            if self._depth == 1 and self._pos == self._start and not self._in_string:
+                # fast path: the whole element at once. no match = not complete yet ( or nested
+                # deeper than _ELEMENT goes ) -> the scan below walks it char by char
+                match = _ELEMENT.match(buffer, self._pos)
+                if match is not None:
+                    last = match.group(2) == b"]"
+                    self._element(elements, match.end(1), last)
+                    self._start = self._pos = match.end()
+                    if last:
+                        self._end_array(buffer)
+                        break
+                    continue
+            if self._in_string:
+                match = _STRING.search(buffer, self._pos)
+                if match is None:
+                    self._pos = len(buffer)
+                    break
+                if match.group() == b"\\":
+                    if match.end() == len(buffer):
+                        self._pos = match.start()  # the escaped char is in the next chunk
+                        break
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                continue
+            match = _STRUCTURE.search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                break
+            char = match.group()
+            if self._depth == 0:
+                if char != b"[" or buffer[: match.start()].strip(_SPACE):
+                    raise BatchError("Body must be a JSON array.")
+                self._depth = 1
+                self._start = match.end()
+            elif char == b'"':
+                self._in_string = True
+            elif char in b"[{":
+                self._depth += 1
+            elif char in b"]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._element(elements, match.start(), last=True)
+                    self._start = self._pos = match.end()
+                    self._end_array(buffer)
+                    break
+            elif self._depth == 1:  # a comma between two elements
+                self._element(elements, match.start(), last=False)
+                self._start = match.end()
+            self._pos = match.end()
+        if self._depth > 0 and len(buffer) - self._start > self.max_item_bytes:
+            raise HTTPException(
+                status_code=413, detail=f"An array element is bigger than {self.max_item_bytes} bytes."
+            )
+        if self._start > 0:
+            # forget what was already returned -> the buffer holds at most one element
+            del buffer[: self._start]
+            self._pos -= self._start
+            self._start = 0
+        return elements
+
+    def _end_array(self, buffer: bytearray) -> None:
+        self._depth = 0
+        self._done = True
+        if buffer[self._pos :].strip(_SPACE):
+            raise BatchError("Unexpected data after the end of the JSON array.")
+
+    def _element(self, elements: list[bytes], end: int, last: bool) -> None:
+        element = bytes(self._buffer[self._start : end]).strip(_SPACE)
+        if element:
+            elements.append(element)
+            self._count += 1
+        elif self._count or not last:  # [1,] or [,1], [] is fine
+            raise BatchError("Empty element in the JSON array.")
+
+    def close(self) -> None:
+        if self._depth == 0 and not self._done:
+            raise BatchError("Body must be a JSON array.")
+        if not self._done:
+            raise BatchError("The JSON array is not complete.")
+
+
+@functools.lru_cache(maxsize=None)
+def _adapters(model: type) -> tuple[TypeAdapter, TypeAdapter]:
+    # building a TypeAdapter compiles a validator -> once per model
+    return TypeAdapter(list[model]), TypeAdapter(model)
+
+
+def _row_errors(error: ValidationError) -> list[dict]:
+    return [
+        {"loc": list(e["loc"]), "msg": e["msg"]}
+        for e in error.errors(include_url=False, include_input=False, include_context=False)
+    ]
+
+
+def validate_elements(model: type, elements: list[bytes], first_row: int = 0) -> list[tuple]:
+    """
+    [(row, model, None) or (row, None, errors), ...] for the elements of one chunk
+    """
+    many, one = _adapters(model)
+    try:
+        # one pydantic-core call for the whole chunk
+        models = many.validate_json(b"[" + b",".join(elements) + b"]")
+        return [(first_row + i, item, None) for i, item in enumerate(models)]
+    except ValidationError:
+        pass
+    # a bad element in the chunk -> one by one to tell which
+    results = []
+    for i, element in enumerate(elements):
+        try:
+            results.append((first_row + i, one.validate_json(element), None))
+        except ValidationError as e:
+            results.append((first_row + i, None, _row_errors(e)))
+    return results
+
+
+async def json_array_items(
+    request: Request, model: type, max_item_bytes: int = 1024**2
+) -> AsyncIterator[tuple[int, Any, list[dict] | None]]:
+    """
+    (row, model, None) for a valid element, (row, None, errors) for a bad one
+    """
+    splitter = JsonArraySplitter(max_item_bytes)
+    row = 0
+    async for chunk in request.stream():
+        elements = splitter.feed(chunk)
+        if elements:
+            for result in validate_elements(model, elements, row):
+                yield result
+            row += len(elements)
+    splitter.close()
+
+
+async def pipeline(
+    rows: AsyncIterable,
+    sink: Callable[[list], Awaitable[None]],
+    batch_size: int = 500,
+    max_batches: int = 2,
+) -> None:
+    """
+    collect rows into batches, `sink` saves them in another task while the next batch is read.
+    at most max_batches wait for the sink -> the reader waits ( backpressure )
+    """
+    queue: asyncio.Queue[list | None] = asyncio.Queue(max_batches)
+
+    async def consume():
+        while (batch := await queue.get()) is not None:
+            await sink(batch)
+
+    consumer = asyncio.create_task(consume())
+
+    async def put(batch: list | None) -> None:
+        putter = asyncio.ensure_future(queue.put(batch))
+        await asyncio.wait((putter, consumer), return_when=asyncio.FIRST_COMPLETED)
+        if not putter.done():
+            putter.cancel()  # the sink failed, nobody takes from the queue anymore
+        if consumer.done():
+            consumer.result()  # raise the error of the sink
+
+    try:
+        batch = []
+        async for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await put(batch)
+                batch = []
+        if batch:
+            await put(batch)
+        await put(None)
+        await consumer
+    finally:
+        if not consumer.done():
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+
+
+class BodySizeLimit:
+    """
+    413 for a body bigger than the limit of its route ( Content-Length or counted while it is read )
+    """
+
+    def __init__(self, app, max_bytes: int, routes: dict[str, int]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"].removeprefix(scope.get("root_path", ""))
+        limit = self.routes.get(path, self.max_bytes)
+        detail = f"Request body is bigger than {limit} bytes."
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                response = JSONResponse({"detail": detail}, status_code=413)
+                return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # chunked body -> only known while reading, the handler gets the 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def install_body_limit(
+    app: FastAPI, max_bytes: int | None = None, routes: dict[str, int] | None = None
+) -> None:
+    """
+    routes = path -> limit of a streaming route, e.g. {"/items_model_stream/": STREAM_MAX_BODY_BYTES}
+    """
+    app.add_middleware(
+        BodySizeLimit, max_bytes=max_bytes or MAX_BODY_BYTES, routes=routes or {}
+    )
@@ -0,0 +1,202 @@
+from collections.abc import AsyncIterable, Iterable, Iterator, Mapping
+
+import numpy as np
+
+"""
+tag -> item ids index with compressed bitmaps
+
+"items tagged rock AND metal but NOT pop" as a scan = look at the tags of every item.
+TagIndex keeps one bitmap of item ids per tag, the query is a few bitwise operations:
+
+    tag_index = TagIndex()
+    tag_index.update(1, {"rock", "metal"})   # on every PUT, replaces the old tags of item 1
+    await tag_index.load(items_repo.scan())  # on startup, the index itself is only in memory
+    tag_index.query(all_of=["rock", "metal"], none_of=["pop"]).page(0, 100)
+
+Bitmap ( roaring style, without the array / run containers ):
+    item id = high 16 bits ( chunk ) + low 16 bits ( bit in the chunk )
+    chunks  = dict of chunk -> python int used as a bit set ( up to 65536 bits = 8 KB )
+    AND / OR / NOT work chunk by chunk on whole ints ( C speed ), empty chunks are dropped
+    -> a tag costs memory only where its items are, len() is int.bit_count() per chunk.
+
+NOTE:
+    a python int only grows up to its highest bit -> a chunk whose items all have high low-bits
+    costs the full 8 KB even for a single item ( a real roaring bitmap would use an array there ).
+    tags are compared as strings: ItemSet's int tags 1, 2 are indexed as "1", "2".
+    negative ids work too: >> is an arithmetic shift, their chunks are negative and sort first.
+"""
+
+CHUNK_BITS = 16
+LOW_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+
+
+class Bitmap:
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks: dict[int, int] | None = None):
+        self.chunks = chunks if chunks is not None else {}
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> "Bitmap":
+        bitmap = cls()
+        for item_id in ids:
+            bitmap.add(item_id)
+        return bitmap
+
+    def add(self, item_id: int) -> None:
+        high = item_id >> CHUNK_BITS
+        self.chunks[high] = self.chunks.get(high, 0) | (1 << (item_id & LOW_MASK))
+
+    def discard(self, item_id: int) -> None:
+        high = item_id >> CHUNK_BITS
+        bits = self.chunks.get(high, 0) & ~(1 << (item_id & LOW_MASK))
+        if bits:
+            self.chunks[high] = bits
+        else:
+            self.chunks.pop(high, None)
+
+    def __contains__(self, item_id: int) -> bool:
+        return bool(self.chunks.get(item_id >> CHUNK_BITS, 0) >> (item_id & LOW_MASK) & 1)
+
+    def __len__(self) -> int:
+        return sum(bits.bit_count() for bits in self.chunks.values())
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        small, big = sorted((self.chunks, other.chunks), key=len)
+        chunks = {}
+        for high, bits in small.items():
+            bits &= big.get(high, 0)
+            if bits:
+                chunks[high] = bits
+        return Bitmap(chunks)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self.chunks)
+        for high, bits in other.chunks.items():
+            chunks[high] = chunks.get(high, 0) | bits
+        return Bitmap(chunks)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        # AND NOT
+        chunks = {}
+        for high, bits in self.chunks.items():
+            bits &= ~other.chunks.get(high, 0)
+            if bits:
+                chunks[high] = bits
+        return Bitmap(chunks)
+
+    @staticmethod
+    def _chunk_ids(high: int, bits: int) -> np.ndarray:
+        # int -> bytes -> bits with numpy -> positions of the set bits
+        raw = np.frombuffer(bits.to_bytes(CHUNK_BYTES, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little")) + (high << CHUNK_BITS)
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self.chunks):
+            yield from self._chunk_ids(high, self.chunks[high]).tolist()
+
+    def page(self, offset: int = 0, limit: int = 100) -> list[int]:
+        """
+        ids in increasing order, whole chunks before offset are skipped with bit_count()
+        """
+        ids: list[int] = []
+        for high in sorted(self.chunks):
+            if len(ids) >= limit:
+                break
+            bits = self.chunks[high]
+            count = bits.bit_count()
+            if offset >= count:
+                offset -= count
+                continue
+            chunk = self._chunk_ids(high, bits)[offset : offset + limit - len(ids)]
+            ids.extend(chunk.tolist())
+            offset = 0
+        return ids
+
+    def nbytes(self) -> int:
+        return sum((bits.bit_length() + 7) // 8 for bits in self.chunks.values())
+
+
+class TagIndex:
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self._bitmaps: dict[str, Bitmap] = {}
+        self._tags: dict[int, tuple[str, ...]] = {}  # item id -> its tags, to undo them on update
+        self._all = Bitmap()  # every indexed item, the universe for NOT
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def update(self, item_id: int, tags: Iterable) -> None:
+        """
+        set the tags of an item ( replaces the tags it had before )
+        """
+        new = tuple(sorted({str(tag) for tag in tags}))
+        old = self._tags.get(item_id, ())
+        for tag in set(old).difference(new):
+            bitmap = self._bitmaps[tag]
+            bitmap.discard(item_id)
+            if not bitmap:
+                del self._bitmaps[tag]
+        for tag in set(new).difference(old):
+            bitmap = self._bitmaps.get(tag)
+            if bitmap is None:
+                bitmap = self._bitmaps[tag] = Bitmap()
+            bitmap.add(item_id)
+        self._tags[item_id] = new
+        self._all.add(item_id)
+
+    def remove(self, item_id: int) -> None:
+        self.update(item_id, ())
+        del self._tags[item_id]
+        self._all.discard(item_id)
+
+    async def load(self, items: AsyncIterable[tuple[int, Mapping]]) -> None:
+        """
+        replace the index with the tags of items, e.g. items_repo.scan() on startup
+        """
+        self.clear()
+        async for item_id, item in items:
+            self.update(item_id, item.get("tags") or ())
+
+    def tags(self, item_id: int) -> tuple[str, ...]:
+        return self._tags.get(item_id, ())
+
+    def query(
+        self,
+        all_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+    ) -> Bitmap:
+        """
+        items with every tag of all_of, at least one tag of any_of and no tag of none_of
+        ( an empty group doesn't filter )
+        """
+        empty = Bitmap()
+        result = None
+        # smallest bitmap first -> every next AND works on fewer chunks
+        for bitmap in sorted((self._bitmaps.get(tag, empty) for tag in all_of), key=lambda b: len(b.chunks)):
+            result = bitmap if result is None else result & bitmap
+        any_of = list(any_of)
+        if any_of:
+            union = Bitmap()
+            for tag in any_of:
+                union = union | self._bitmaps.get(tag, empty)
+            result = union if result is None else result & union
+        if result is None:
+            result = self._all
+        for tag in none_of:
+            result = result - self._bitmaps.get(tag, empty)
+        return result
+
+    def counts(self) -> dict[str, int]:
+        return {tag: len(bitmap) for tag, bitmap in sorted(self._bitmaps.items())}
+
+    def nbytes(self) -> int:
+        return sum(bitmap.nbytes() for bitmap in self._bitmaps.values())
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+"""
+the tutorial modules live in the repo root and their names start with a digit
+-> tests import them with importlib.import_module("3_query_parameter")
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# NOTE: the apps must not write into the checkout
+os.environ.setdefault("ITEMS_DB", os.path.join(tempfile.mkdtemp(prefix="tests-"), "items.db"))
+os.environ.setdefault("IMAGE_CACHE_DIR", os.path.join(tempfile.mkdtemp(prefix="tests-"), "images"))
+os.environ.setdefault("SHARED_DIR", tempfile.mkdtemp(prefix="tests-shared-"))
@@ -0,0 +1,127 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from admission import AdmissionControl, Overloaded, RateLimit, RateLimiter
+from metrics import install_metrics
+
+
+def test_rate_limit_from_env(monkeypatch):
+    monkeypatch.delenv("RATE_LIMITS", raising=False)
+    limit = RateLimit.from_env("PUT_X", rate=10, burst=20)
+    assert (limit.rate, limit.burst) == (10, 20)
+    monkeypatch.setenv("RATE_LIMIT_PUT_X", "2.5/7")
+    limit = RateLimit.from_env("PUT_X", rate=10, burst=20)
+    assert (limit.rate, limit.burst) == (2.5, 7)
+    monkeypatch.setenv("RATE_LIMIT_PUT_X", "off")
+    assert RateLimit.from_env("PUT_X", rate=10, burst=20) is None
+    monkeypatch.setenv("RATE_LIMIT_PUT_X", "fast")
+    with pytest.raises(ValueError, match="RATE_LIMIT_PUT_X"):
+        RateLimit.from_env("PUT_X", rate=10, burst=20)
+    monkeypatch.setenv("RATE_LIMITS", "off")
+    assert RateLimit.from_env("OTHER", rate=10, burst=20) is None
+
+
+def make_app(rate_limiter=None, admission=None):
+    app = FastAPI()
+    install_metrics(app)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int, sleep: float = 0):
+        await asyncio.sleep(sleep)
+        return {"item_id": item_id}
+
+    @app.put("/items/{item_id}")
+    async def update_item(item_id: int):
+        return {"item_id": item_id}
+
+    if admission is not None:
+        admission.install(app)
+    if rate_limiter is not None:
+        rate_limiter.install(app)
+    return app
+
+
+def test_429_after_the_burst():
+    limiter = RateLimiter(
+        default=RateLimit(rate=0.5, burst=3),
+        routes={"PUT /items/{item_id}": RateLimit(rate=0.5, burst=1), "GET /off/": None},
+    )
+    client = TestClient(make_app(rate_limiter=limiter))
+    assert client.put("/items/1").status_code == 200
+    response = client.put("/items/2")  # the route bucket is empty
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert [client.get("/items/1").status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get("/metrics").status_code == 200  # exempt
+    assert limiter.limited == {"PUT /items/{item_id}": 1, "default": 1}
+    assert list(limiter.routes) == ["PUT /items/{item_id}"]
+
+
+def test_limits_are_per_client():
+    def client_id(scope) -> str:
+        return dict(scope["headers"])[b"x-client"].decode()
+
+    limiter = RateLimiter(default=RateLimit(rate=1, burst=1), key=client_id)
+    client = TestClient(make_app(rate_limiter=limiter))
+    assert client.get("/items/1", headers={"X-Client": "a"}).status_code == 200
+    assert client.get("/items/1", headers={"X-Client": "b"}).status_code == 200
+    assert client.get("/items/1", headers={"X-Client": "a"}).status_code == 429
+
+
+def get_many(app, urls):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get(url) for url in urls))
+
+    return asyncio.run(run())
+
+
+def test_503_when_the_queue_is_full():
+    admission = AdmissionControl(max_concurrency=1, max_queue=1, max_wait=5)
+    responses = get_many(make_app(admission=admission), ["/items/1?sleep=0.05"] * 3)
+    assert sorted(response.status_code for response in responses) == [200, 200, 503]
+    shed = next(response for response in responses if response.status_code == 503)
+    assert shed.headers["Retry-After"] == "1"
+    assert admission.shed["queue_full"] == 1
+    assert (admission.active, admission.waiting) == (0, 0)
+
+
+def test_503_after_max_wait():
+    admission = AdmissionControl(max_concurrency=1, max_queue=10, max_wait=0.02)
+    responses = get_many(make_app(admission=admission), ["/items/1?sleep=0.2"] * 3)
+    assert sorted(response.status_code for response in responses) == [200, 503, 503]
+    assert admission.shed["timeout"] == 2
+
+
+def test_slot_granted_as_the_timeout_fires_is_passed_on(monkeypatch):
+    admission = AdmissionControl(max_concurrency=1, max_wait=0.01)
+    wait_for = asyncio.wait_for
+
+    async def granted_then_timed_out(waiter, timeout):
+        admission.release()  # the holder leaves in the same loop iteration as the timeout
+        raise TimeoutError
+
+    async def run():
+        await admission.acquire()
+        monkeypatch.setattr(asyncio, "wait_for", granted_then_timed_out)
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        monkeypatch.setattr(asyncio, "wait_for", wait_for)
+        await admission.acquire()  # the slot was not lost
+        admission.release()
+
+    asyncio.run(run())
+    assert (admission.active, admission.waiting, admission.shed["timeout"]) == (0, 0, 1)
+
+
+def test_standing_queue_is_shed():
+    admission = AdmissionControl(target=0.01, interval=0.05)
+    assert admission._over_target(0.02, now=1.0) is False  # a burst
+    assert admission._over_target(0.02, now=1.03) is False
+    assert admission._over_target(0.02, now=1.06) is True  # over target for a whole interval
+    assert admission._over_target(0.001, now=1.07) is False
@@ -0,0 +1,55 @@
+import json
+import os
+
+from benchmarks.bench_apps import compare, make_fixtures, percentile
+
+
+def result(url, rps, p50_ms, status):
+    return {
+        "app": "main",
+        "method": "GET",
+        "url": url,
+        "requests": sum(status.values()),
+        "rps": rps,
+        "p50_ms": p50_ms,
+        "status": status,
+    }
+
+
+def write_run(path, results):
+    with open(path, "w") as f:
+        json.dump({"meta": {"mode": "in-process"}, "results": results}, f)
+
+
+def test_percentile():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert percentile(values, 50) == 5
+    assert percentile(values, 99) == 10
+    assert percentile([], 50) == 0.0
+
+
+def test_compare_flags_slower_routes(tmp_path, capsys):
+    old = tmp_path / "before.json"
+    write_run(old, [result("/a", 1000, 1.0, {"200": 100}), result("/b", 1000, 1.0, {"200": 100})])
+    after = [result("/a", 1000, 1.02, {"200": 100}), result("/b", 500, 2.0, {"200": 50})]
+    assert compare(after, "in-process", old, 0.10) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_compare_flags_non_2xx_runs_even_when_faster(tmp_path, capsys):
+    old = tmp_path / "before.json"
+    write_run(old, [result("/models/alexnet", 1000, 1.0, {"200": 100})])
+    after = [result("/models/alexnet", 5000, 0.1, {"200": 7, "429": 1434})]
+    assert compare(after, "in-process", old, 0.10) == 1
+    out = capsys.readouterr().out
+    assert "NON-2XX after 1434/1441" in out
+    assert "REGRESSION" not in out
+
+
+def test_fixtures_turn_the_rate_limits_off(tmp_path, monkeypatch):
+    for name in ("FILES_ROOT", "MODELS_ROOT", "ITEMS_DB", "RATE_LIMITS"):
+        monkeypatch.setenv(name, "")  # -> restored ( or removed ) after the test
+        monkeypatch.delenv(name)
+    make_fixtures(str(tmp_path / "fixtures"))
+    assert os.environ["RATE_LIMITS"] == "off"
+    assert os.path.getsize(tmp_path / "fixtures" / "models" / "resnet.bin") == 1024 * 1024
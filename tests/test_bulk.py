@@ -0,0 +1,76 @@
+import importlib
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from bulk import BatchError, validate_batch
+
+
+class Row(BaseModel):
+    item_id: int
+    price: float
+
+
+def test_all_rows_valid():
+    valid, errors = validate_batch(Row, b'[{"item_id": 1, "price": 2}, {"item_id": 2, "price": 3.5}]')
+    assert [(row, model.item_id) for row, model in valid] == [(0, 1), (1, 2)]
+    assert errors == {}
+
+
+def test_bad_rows_are_reported_and_the_others_kept():
+    body = json.dumps(
+        [{"item_id": 1, "price": 1}, {"item_id": "x", "price": 1}, {"item_id": 3}, {"item_id": 4, "price": 4}]
+    ).encode()
+    valid, errors = validate_batch(Row, body)
+    assert [row for row, _ in valid] == [0, 3]
+    assert sorted(errors) == [1, 2]
+    assert errors[2][0]["loc"] == ["price"]
+
+
+def test_ndjson_with_a_broken_line():
+    body = b'{"item_id": 1, "price": 1}\n{broken\n\n{"item_id": 3, "price": "x"}\n{"item_id": 4, "price": 4}\n'
+    valid, errors = validate_batch(Row, body, "application/x-ndjson; charset=utf-8")
+    assert [row for row, _ in valid] == [0, 3]
+    assert errors[1][0]["msg"].startswith("Invalid JSON")
+    assert errors[2][0]["loc"] == ["price"]
+
+
+def test_ndjson_line_with_two_objects_is_one_bad_row():
+    body = b'{"item_id": 1, "price": 1}\n{"item_id": 2, "price": 2},{"item_id": 3, "price": 3}\n{"item_id": 4, "price": 4}\n'
+    valid, errors = validate_batch(Row, body, "application/x-ndjson")
+    assert [(row, model.item_id) for row, model in valid] == [(0, 1), (2, 4)]
+    assert list(errors) == [1]
+
+
+def test_ndjson_good_and_bad_rows_keep_their_numbers():
+    lines = [
+        b'{"item_id": 1, "price": 1}',
+        b'{"item_id": 2, "price": 2},{"item_id": 9, "price": 9}',
+        b'{"item_id": "x", "price": 3}',
+        b"[1, 2]",
+        b'{"item_id": 5, "price": 5}',
+    ]
+    valid, errors = validate_batch(Row, b"\n".join(lines), "application/x-ndjson")
+    assert [(row, model.item_id) for row, model in valid] == [(0, 1), (4, 5)]
+    assert sorted(errors) == [1, 2, 3]
+    assert errors[2][0]["loc"] == ["item_id"]
+
+
+def test_body_that_is_not_an_array():
+    with pytest.raises(BatchError):
+        validate_batch(Row, b'{"item_id": 1, "price": 1}')
+
+
+def test_bulk_endpoint():
+    module = importlib.import_module("4_request_body")
+    with TestClient(module.app) as client:
+        body = [{"item_id": 7001, "name": "a", "price": 1}, {"item_id": 7002, "name": "b"}]
+        response = client.put("/items_bulk/", json=body)
+        assert response.status_code == 200
+        result = response.json()
+        assert (result["received"], result["failed"]) == (2, 1)
+        assert result["errors"][0]["row"] == 1
+        assert client.get("/items/7001").json()["name"] == "a"
+        assert client.put("/items_bulk/", content=b"{").status_code == 400
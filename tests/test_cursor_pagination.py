@@ -0,0 +1,46 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from item_store import ItemStore, encode_cursor, make_fake_items
+
+
+@pytest.mark.parametrize("order_by", ["id", "created_at", "updated_at"])
+def test_pages_cover_every_row_once(order_by):
+    store = ItemStore(make_fake_items(95))
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = store.keyset_page(order_by, cursor, limit=10)
+        seen += [row["id"] for row in rows]
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(95))
+    assert len(seen) == len(set(seen))
+
+
+def test_inserts_before_the_cursor_dont_shift_the_next_page():
+    store = ItemStore(make_fake_items(30))
+    rows, cursor = store.keyset_page("id", None, limit=10)
+    store.upsert(dict(rows[0], id=-1))
+    rows, _ = store.keyset_page("id", cursor, limit=10)
+    assert [row["id"] for row in rows] == list(range(10, 20))
+
+
+def test_cursor_of_another_order_by_is_rejected():
+    store = ItemStore(make_fake_items(10))
+    cursor = encode_cursor("created_at", store.get(3))
+    with pytest.raises(ValueError):
+        store.keyset_page("id", cursor)
+
+
+def test_bad_cursor_is_a_400():
+    client = TestClient(importlib.import_module("3_query_parameter").app)
+    response = client.get("/items_cursor/", params={"limit": 40})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == list(range(40))
+    response = client.get("/items_cursor/", params={"cursor": body["next_cursor"]})
+    assert response.json()["items"][0]["id"] == 40
+    assert client.get("/items_cursor/", params={"cursor": "not-a-cursor"}).status_code == 400
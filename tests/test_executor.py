@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import httpx
+from fastapi import FastAPI
+
+from executor import ThreadPool
+from metrics import install_metrics
+
+
+def make_app(gate: threading.Event, running: list):
+    app = FastAPI()
+    install_metrics(app)
+    pool = ThreadPool(max_workers=4, max_queue=4, name="test")
+    pool.install(app)
+    lock = threading.Lock()
+
+    @app.get("/slow")
+    @pool.offload(max_concurrency=1, max_queue=1, retry_after=7)
+    def slow():
+        with lock:
+            running.append(threading.get_ident())
+        gate.wait(5)
+        return {"thread": threading.get_ident()}
+
+    return app, pool
+
+
+async def burst(app, gate: threading.Event, pool: ThreadPool):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        requests = [asyncio.ensure_future(client.get("/slow")) for _ in range(3)]
+        stats = pool.routes["slow"]
+        for _ in range(500):  # 1 running + 1 queued, the 3rd is rejected
+            if stats.pending == 2 and stats.rejected == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert (stats.running, stats.queued) == (1, 1)
+        gate.set()
+        responses = await asyncio.gather(*requests)
+        metrics = (await client.get("/metrics")).text
+    return responses, metrics
+
+
+def test_route_limit_and_queue_bound():
+    gate, running = threading.Event(), []
+    app, pool = make_app(gate, running)
+    responses, metrics = asyncio.run(burst(app, gate, pool))
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503]
+    rejected = next(response for response in responses if response.status_code == 503)
+    assert rejected.headers["Retry-After"] == "7"
+    assert len(running) == 2
+    assert 'thread_pool_completed_total{pool="test",handler="slow"} 2' in metrics
+    assert 'thread_pool_rejected_total{pool="test",handler="slow"} 1' in metrics
+
+
+def test_failed_handlers_are_counted():
+    app = FastAPI()
+    install_metrics(app)
+    pool = ThreadPool(max_workers=2, name="test")
+    pool.install(app)
+
+    @app.get("/fail")
+    @pool.offload()
+    def fail():
+        raise RuntimeError("broken")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.get("/fail")).status_code == 500
+            return (await client.get("/metrics")).text
+
+    metrics = asyncio.run(run())
+    assert 'thread_pool_completed_total{pool="test",handler="fail"} 1' in metrics
+    assert 'thread_pool_queue_wait_seconds_count{pool="test",handler="fail"} 1' in metrics
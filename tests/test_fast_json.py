@@ -0,0 +1,48 @@
+import importlib
+import json
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fast_json import dumps, json_response
+
+
+class Image(BaseModel):
+    url: str
+    name: str
+
+
+class Item(BaseModel):
+    name: str
+    price: float
+    tags: set[str] = set()
+    image: Image | None = None
+
+
+def test_same_json_as_the_default_response():
+    item = Item(name="Foo", price=42.0, tags={"rock"}, image=Image(url="http://x/a.jpg", name="a"))
+    content = {"item_id": 1, "item": item, "day": date(2024, 1, 2)}
+    default = JSONResponse(jsonable_encoder(content))  # what FastAPI does with a returned dict
+    assert json.loads(json_response(content).body) == json.loads(default.body)
+
+
+def test_nan_becomes_null():
+    assert dumps({"price": float("nan")}) == b'{"price":null}'
+
+
+def test_fallback_for_unknown_types():
+    class Point:
+        def __init__(self):
+            self.x = 1
+
+    assert json.loads(dumps({"point": Point()})) == {"point": {"x": 1}}
+
+
+def test_post_item():
+    client = TestClient(importlib.import_module("4_request_body").app)
+    response = client.post("/items/", json={"name": "Foo", "price": 42})
+    assert response.status_code == 200
+    assert response.json() == {"name": "Foo", "description": None, "price": 42.0, "tax": None}
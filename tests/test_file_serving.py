@@ -0,0 +1,84 @@
+import gc
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from file_serving import FileServer, OpenFile
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"0123456789" * 100)
+    (tmp_path / "b.txt").write_bytes(b"b")
+    (tmp_path.parent / "secret.txt").write_bytes(b"secret")
+    return FileServer(str(tmp_path), max_open=1)
+
+
+@pytest.fixture
+def client(server):
+    app = FastAPI()
+
+    @app.get("/files/{file_path:path}")
+    @app.head("/files/{file_path:path}")
+    async def read_file(file_path: str, request: Request):
+        return server.response(request, file_path)
+
+    return TestClient(app)
+
+
+def get_request(method: str = "GET", headers: dict | None = None) -> Request:
+    raw = Headers(headers or {}).raw
+    return Request({"type": "http", "method": method, "headers": raw, "path": "/", "query_string": b""})
+
+
+def test_whole_file_and_ranges(client):
+    response = client.get("/files/a.txt")
+    assert response.status_code == 200
+    assert response.content == b"0123456789" * 100
+    etag = response.headers["etag"]
+    response = client.get("/files/a.txt", headers={"Range": "bytes=10-14"})
+    assert (response.status_code, response.content) == (206, b"01234")
+    assert response.headers["content-range"] == "bytes 10-14/1000"
+    assert client.get("/files/a.txt", headers={"Range": "bytes=-3"}).content == b"789"
+    assert client.get("/files/a.txt", headers={"Range": "bytes=5000-"}).status_code == 416
+    assert client.get("/files/a.txt", headers={"If-None-Match": etag}).status_code == 304
+    old = client.get("/files/a.txt", headers={"Range": "bytes=0-1", "If-Range": '"old"'})
+    assert old.status_code == 200
+
+
+def test_empty_file(client, tmp_path):
+    (tmp_path / "empty.txt").write_bytes(b"")
+    response = client.get("/files/empty.txt")
+    assert (response.status_code, response.content, response.headers["content-length"]) == (200, b"", "0")
+    assert client.head("/files/empty.txt").status_code == 200
+    response = client.get("/files/empty.txt", headers={"range": "bytes=0-"})
+    assert (response.status_code, response.headers["content-range"]) == (416, "bytes */0")
+    entry = OpenFile(str(tmp_path / "empty.txt"))
+    assert bytes(entry.view()) == b""
+    entry.close()
+
+
+def test_paths_outside_the_root_are_404(client):
+    for path in ("/files/../secret.txt", "/files/%2e%2e/secret.txt", "/files/nope.txt", "/files/"):
+        assert client.get(path).status_code == 404
+
+
+def test_unsent_response_releases_its_entry(server):
+    response = server.response(get_request(), "a.txt")
+    entry = response.entry
+    assert entry.refs == 1
+    server.acquire("b.txt")  # max_open=1 -> a.txt is evicted while the response holds it
+    assert entry.evicted and not entry.file.closed
+    del response  # dropped by a middleware / an error before send
+    gc.collect()
+    assert entry.refs == 0
+    assert entry.file.closed
+
+
+def test_sent_response_releases_once(server, client):
+    client.get("/files/a.txt")
+    client.head("/files/a.txt")
+    gc.collect()
+    assert all(entry.refs == 0 for entry in server._open.values())
@@ -0,0 +1,51 @@
+import importlib
+
+from fastapi.testclient import TestClient
+
+from id_catalog import IdCatalog
+
+PAIRS = [
+    ("isbn-9781529046137", "The Hitchhiker's Guide"),
+    ("imdb-tt0371724", "The Hitchhiker's Guide to the Galaxy"),
+    ("isbn-9781439512982", "Isaac Asimov: The Complete Stories"),
+    ("isbn-9780000000001", "Other"),
+    ("asin-B000000001", "Thing"),
+]
+
+
+def test_get_and_contains():
+    catalog = IdCatalog(PAIRS)
+    assert len(catalog) == 5
+    assert catalog.get("imdb-tt0371724") == "The Hitchhiker's Guide to the Galaxy"
+    assert catalog.get("imdb-nope") is None
+    assert "isbn-9780000000001" in catalog
+    assert "isbn-97800" not in catalog
+
+
+def test_prefix_and_types():
+    catalog = IdCatalog(PAIRS)
+    assert [id for id, _ in catalog.prefix("isbn-978")] == [
+        "isbn-9780000000001",
+        "isbn-9781439512982",
+        "isbn-9781529046137",
+    ]
+    assert [id for id, _ in catalog.prefix("isbn-978", offset=1, limit=1)] == ["isbn-9781439512982"]
+    assert catalog.prefix("zzz") == []
+    assert catalog.types() == {"asin": 1, "imdb": 1, "isbn": 3}
+    assert catalog.by_type("imdb") == [("imdb-tt0371724", "The Hitchhiker's Guide to the Galaxy")]
+
+
+def test_later_pair_wins_and_buffer_round_trip():
+    catalog = IdCatalog([*PAIRS, ("asin-B000000001", "Renamed")])
+    assert catalog.get("asin-B000000001") == "Renamed"
+    copy = IdCatalog.from_buffer(memoryview(catalog.to_bytes()))
+    assert list(copy.items()) == list(catalog.items())
+    assert copy.sample() in list(catalog.items())
+
+
+def test_item_ids_endpoint():
+    client = TestClient(importlib.import_module("5_query_parameter_string_validation").app)
+    types = client.get("/item_ids/").json()
+    assert types["total"] == sum(types["types"].values())
+    items = client.get("/item_ids/", params={"prefix": "isbn-978"}).json()["items"]
+    assert items and all(item["id"].startswith("isbn-978") for item in items)
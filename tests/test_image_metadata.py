@@ -0,0 +1,138 @@
+import asyncio
+import importlib
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from image_metadata import ImageCache, ImageMetadata, image_size, normalize_url, url_key
+
+PUBLIC = "93.184.216.34"  # a public address literal -> no DNS in the tests
+
+
+def png(width: int, height: int, padding: int = 0) -> bytes:
+    return b"\x89PNG\r\n\x1a\n" + b"\0\0\0\x0d" + b"IHDR" + struct.pack(">II", width, height) + b"\0" * padding
+
+
+def test_normalized_urls_share_a_key():
+    assert normalize_url("HTTP://Example.COM:80/a/./b/../c.jpg?b=2&a=1#top") == "http://example.com/a/c.jpg?a=1&b=2"
+    assert url_key("http://example.com/c.jpg") == url_key("http://EXAMPLE.com:80/./c.jpg#x")
+    assert image_size(png(3, 2)) == ("image/png", 3, 2)
+    assert image_size(b"GIF89a\x05\x00\x07\x00") == ("image/gif", 5, 7)
+    assert image_size(b"nope") is None
+
+
+def fetch_all(metadata: ImageMetadata, urls: list[str]) -> list:
+    async def run():
+        async with metadata.lifespan(None):
+            for url in urls:
+                metadata.lookup(url)
+            await metadata.join()
+            return [metadata.lookup(url) for url in urls]
+
+    return asyncio.run(run())
+
+
+def make_metadata(tmp_path, handler, **kwargs) -> tuple[ImageMetadata, list]:
+    requested = []
+
+    def record(request):
+        requested.append(str(request.url))
+        return handler(request)
+
+    metadata = ImageMetadata(
+        ImageCache(str(tmp_path / "cache")), workers=2, transport=httpx.MockTransport(record), **kwargs
+    )
+    return metadata, requested
+
+
+def test_fetched_once_per_image(tmp_path):
+    metadata, requested = make_metadata(
+        tmp_path, lambda request: httpx.Response(200, content=png(4, 3)), allowed_hosts=[PUBLIC]
+    )
+    a, b = fetch_all(metadata, [f"http://{PUBLIC}/a.png", f"HTTP://{PUBLIC}:80/./a.png", f"http://{PUBLIC}/b.png"])[1:]
+    assert (a["width"], a["height"], a["type"]) == (4, 3, "image/png")
+    assert a["sha256"] == b["sha256"]
+    assert sorted(requested) == [f"http://{PUBLIC}/a.png", f"http://{PUBLIC}/b.png"]
+    assert metadata.cache.bytes == len(png(4, 3))  # one blob for both urls
+
+
+def test_nothing_is_fetched_without_image_hosts(tmp_path, monkeypatch):
+    monkeypatch.delenv("IMAGE_HOSTS", raising=False)
+    metadata, requested = make_metadata(tmp_path, lambda request: httpx.Response(200, content=png(1, 1)))
+    assert fetch_all(metadata, [f"http://{PUBLIC}/a.png"]) == [None]
+    assert requested == []
+    assert metadata.refused == 2
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "10.1.2.3", "169.254.169.254", "localhost", "[::1]"])
+def test_internal_addresses_are_refused_even_when_allowed(tmp_path, host):
+    metadata, requested = make_metadata(
+        tmp_path, lambda request: httpx.Response(200, content=png(1, 1)), allowed_hosts=[host.strip("[]")]
+    )
+    assert fetch_all(metadata, [f"http://{host}/a.png"]) == [None]
+    assert requested == []
+    assert metadata.failures == 1
+
+
+def test_redirects_are_checked_too(tmp_path):
+    def handler(request):
+        return httpx.Response(302, headers={"Location": "http://127.0.0.1/admin"})
+
+    metadata, requested = make_metadata(tmp_path, handler, allowed_hosts=[PUBLIC, "127.0.0.1"])
+    assert fetch_all(metadata, [f"http://{PUBLIC}/a.png"]) == [None]
+    assert requested == [f"http://{PUBLIC}/a.png"]
+    assert metadata.failures == 1
+
+
+def test_concurrent_puts_keep_the_cache_consistent(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=2000)
+    images = [png(i, i, padding=400) for i in range(8)]
+
+    def put(i: int):
+        return cache.put(f"key{i}", f"http://x/{i}", images[i % len(images)])
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(put, range(200)))
+    on_disk = [
+        os.path.getsize(os.path.join(dirpath, name))
+        for dirpath, _, names in os.walk(tmp_path / "blobs")
+        for name in names
+    ]
+    assert cache.bytes == sum(on_disk) == sum(cache._blobs.values()) <= 2000
+    assert all(cache.get(key)["sha256"] in cache._blobs for key in cache._meta)
+
+
+def test_image_file_removed_by_another_worker_is_a_miss(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    meta = cache.put("a", "http://x/a", png(1, 1))
+    os.unlink(cache._blob_path(meta["sha256"]))
+    cache.put("b", "http://x/b", png(1, 1))  # same image -> written again
+    assert os.path.exists(cache._blob_path(meta["sha256"]))
+    assert cache.bytes == len(png(1, 1))
+    assert cache.get("a")["sha256"] == cache.get("b")["sha256"]
+
+
+BAD_URLS = ["http://[bad/x.jpg", "http://example.com:99999/a.jpg", "http://example.com:abc/a.jpg"]
+
+
+@pytest.mark.parametrize("url", BAD_URLS)
+def test_unparsable_urls_are_refused(tmp_path, url):
+    metadata, requested = make_metadata(tmp_path, lambda request: httpx.Response(200), allowed_hosts=[PUBLIC])
+    assert fetch_all(metadata, [url]) == [None]
+    assert requested == []
+    assert metadata.refused == 2
+
+
+def test_unparsable_image_url_in_module_10():
+    module = importlib.import_module("10_body_nested_models")
+    with TestClient(module.app) as client:
+        for item_id, url in enumerate(BAD_URLS, start=920_000):
+            item = {"name": "Foo", "price": 1.0, "image": {"url": url, "name": "x"}}
+            response = client.put(f"/items_model/{item_id}", json=item)
+            assert response.status_code == 200
+            assert response.json()["image_metadata"] is None
+            assert client.get("/images/metadata/", params={"url": url}).status_code == 202
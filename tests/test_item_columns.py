@@ -0,0 +1,62 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from item_columns import ColumnarCatalog
+from item_store import make_fake_items
+
+ITEMS = [dict(item, tags=["sale"]) if item["id"] % 7 == 0 else item for item in make_fake_items(300)]
+
+
+def scan(tags=(), category=None, is_available=None, min_price=None, max_rating=None, created_from=None):
+    # the python loop the catalog replaces
+    return [
+        item
+        for item in ITEMS
+        if all(tag == item["category"] or tag in item.get("tags", ()) for tag in tags)
+        and (category is None or item["category"] == category)
+        and (is_available is None or item["is_available"] == is_available)
+        and (min_price is None or item["price"] >= min_price)
+        and (max_rating is None or item["rating"] <= max_rating)
+        and (created_from is None or item["created_at"] >= created_from)
+    ]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"category": "food"},
+        {"tags": ["sale"]},
+        {"tags": ["sale", "books"]},
+        {"is_available": False, "min_price": 50},
+        {"max_rating": 4.0, "created_from": "2023-06-01"},
+        {"category": "nope"},
+        {"tags": ["nope"]},
+    ],
+)
+def test_select_matches_a_scan(filters):
+    catalog = ColumnarCatalog.from_items(ITEMS)
+    expected = sorted(scan(**filters), key=lambda item: item["created_at"])
+    positions = catalog.select("created_at", **filters)
+    assert [ITEMS[i]["id"] for i in positions.tolist()] == [item["id"] for item in expected]
+
+
+def test_query_pages_in_order():
+    catalog = ColumnarCatalog.from_items(ITEMS)
+    page = catalog.query("created_at", offset=5, limit=10, category="toys")
+    expected = sorted(scan(category="toys"), key=lambda item: item["created_at"])[5:15]
+    assert page == expected
+    with pytest.raises(ValueError):
+        catalog.select("price")
+
+
+def test_filter_params_endpoint():
+    client = TestClient(importlib.import_module("7_query_parameter_models").app)
+    response = client.get("/items/", params={"category": "books", "is_available": "true", "limit": 5})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) == 5
+    assert all(item["category"] == "books" and item["is_available"] for item in items)
+    assert [item["created_at"] for item in items] == sorted(item["created_at"] for item in items)
@@ -0,0 +1,62 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from item_records import ItemTable
+from item_store import ItemStore, make_fake_item, make_fake_items
+
+
+def test_rows_read_back_like_the_dicts():
+    items = list(make_fake_items(50))
+    items[3] = items[3] | {"updated_at": "2024-01-02"}
+    items[4] = {k: v for k, v in items[4].items() if k != "description"}
+    table = ItemTable.from_items(items)
+    assert len(table) == 50
+    assert [record.to_dict() for record in table] == items
+    assert dict(table[3]) == items[3]
+    assert "description" not in table[4] and table[4].get("description") is None
+    assert table[4].get("updated_at") is None and "updated_at" not in table[4]
+    assert table[-1]["id"] == 49
+    with pytest.raises(KeyError):
+        table[0]["nope"]
+    with pytest.raises(IndexError):
+        table[50]
+
+
+def test_replaced_rows_and_compaction():
+    table = ItemTable.from_items(make_fake_items(10))
+    for version in range(10):
+        table[2] = make_fake_item(2) | {"name": f"renamed {version}" * 10}
+    assert table[2]["name"] == "renamed 9" * 10
+    assert len(table.names.data) < 2 * sum(len(record["name"]) for record in table)  # compacted
+    assert [record["name"] for record in table][:2] == ["Item 0", "Item 1"]
+    table[5] = table[5]  # a view of the same row
+    assert table[5].to_dict() == make_fake_item(5)
+
+
+def test_a_bad_row_leaves_the_table_unchanged():
+    table = ItemTable.from_items(make_fake_items(3))
+    with pytest.raises(ValueError):
+        table.append(make_fake_item(3) | {"created_at": "not a date"})
+    with pytest.raises(KeyError):
+        table[1] = {"id": 1, "name": "x"}
+    assert len(table.ids) == len(table.names) == len(table.updated) == 3
+    assert [record.to_dict() for record in table] == list(make_fake_items(3))
+
+
+def test_item_store_on_a_table():
+    items = list(make_fake_items(100))
+    store = ItemStore(rows=ItemTable.from_items(items))
+    plain = ItemStore(items)
+    assert [dict(row) for row in store.by_category("books", limit=100)] == plain.by_category("books", limit=100)
+    assert store.upsert(make_fake_item(7) | {"category": "toys"}) is False
+    assert store.get(7)["category"] == "toys"
+    assert store.upsert(make_fake_item(100)) is True
+    assert dict(store.get(100)) == make_fake_item(100)
+
+
+def test_items_endpoint_on_the_table():
+    client = TestClient(importlib.import_module("3_query_parameter").app)
+    items = client.get("/items/", params={"limit": 2}).json()
+    assert items == [make_fake_item(i) | {"updated_at": None} for i in range(2)]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from item_repository import InMemoryRepository, ItemRepository, SQLiteRepository
+
+
+def test_incomplete_backend_fails_when_created():
+    class NoDelete(ItemRepository):
+        async def get_many(self, item_ids):
+            return {}
+
+        async def upsert_many(self, rows):
+            return 0
+
+        async def count(self):
+            return 0
+
+    with pytest.raises(TypeError, match="delete"):
+        NoDelete()
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_crud(backend, tmp_path):
+    async def run():
+        repo = InMemoryRepository() if backend == "memory" else SQLiteRepository(str(tmp_path / "a.db"))
+        async with repo.lifespan(None):
+            assert await repo.upsert(1, {"name": "a"}) is True
+            assert await repo.upsert(1, {"name": "b"}) is False
+            assert await repo.upsert_many([(1, {"name": "c"}), (2, b'{"name":"d"}'), (3, {"name": "e"})]) == 2
+            assert await repo.get(1) == {"name": "c"}
+            assert await repo.get_many([2, 3, 4, 2]) == {2: {"name": "d"}, 3: {"name": "e"}}
+            assert await repo.delete(2) is True
+            assert await repo.delete(2) is False
+            assert await repo.count() == 2
+
+    asyncio.run(run())
+
+
+def test_failed_transaction_is_rolled_back(tmp_path):
+    async def run():
+        repo = SQLiteRepository(str(tmp_path / "b.db"))
+        async with repo.lifespan(None):
+            await repo.upsert(1, {"name": "a"})
+            with pytest.raises(RuntimeError):
+                async with repo._transaction() as db:
+                    await db.execute("DELETE FROM items")
+                    raise RuntimeError("boom")
+            return await repo.count()
+
+    assert asyncio.run(run()) == 1
+
+
+def test_concurrent_first_reads_open_one_pool(tmp_path):
+    async def run():
+        repo = SQLiteRepository(str(tmp_path / "c.db"), readers=2)
+        results = await asyncio.gather(*(repo.get(i) for i in range(10)))
+        opened = len(repo._connections)
+        await repo.close()
+        return results, opened
+
+    results, opened = asyncio.run(run())
+    assert results == [None] * 10
+    assert opened == 3  # 1 writer + 2 readers, not one set per first request
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_scan_pages_in_id_order(backend, tmp_path):
+    async def run():
+        repo = InMemoryRepository() if backend == "memory" else SQLiteRepository(str(tmp_path / "d.db"))
+        async with repo.lifespan(None):
+            await repo.upsert_many((item_id, {"n": item_id}) for item_id in (5, -3, 0, 9, 2, 7, 1))
+            return [row async for row in repo.scan(batch_size=3)]
+
+    assert asyncio.run(run()) == [(i, {"n": i}) for i in (-3, 0, 1, 2, 5, 7, 9)]
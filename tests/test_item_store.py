@@ -0,0 +1,49 @@
+import importlib
+
+from fastapi.testclient import TestClient
+
+from item_store import ItemStore, make_fake_item, make_fake_items
+
+
+def test_get_and_id_range():
+    store = ItemStore(make_fake_items(100))
+    assert len(store) == 100
+    assert store.get(42)["name"] == "Item 42"
+    assert store.get(1000) is None
+    assert [row["id"] for row in store.id_range(10, 15)] == [10, 11, 12, 13, 14]
+    assert [row["id"] for row in store.page(skip=95, limit=10)] == [95, 96, 97, 98, 99]
+
+
+def test_secondary_indexes_match_a_scan():
+    items = list(make_fake_items(200))
+    store = ItemStore(items)
+    books = [item["id"] for item in items if item["category"] == "books"]
+    assert [row["id"] for row in store.by_category("books", limit=1000)] == books
+    available = [item["id"] for item in items if not item["is_available"]]
+    assert [row["id"] for row in store.by_availability(False, limit=1000)] == available
+    created = sorted(
+        (item["created_at"], item["id"])
+        for item in items
+        if "2023-03-01" <= item["created_at"] < "2023-05-01"
+    )
+    rows = store.created_between("2023-03-01", "2023-05-01", limit=1000)
+    assert [row["id"] for row in rows] == [item_id for _, item_id in created]
+
+
+def test_upsert_moves_the_row_between_indexes():
+    store = ItemStore(make_fake_items(10))
+    item = make_fake_item(3) | {"category": "toys", "is_available": True}
+    assert store.upsert(item) is False
+    assert 3 in [row["id"] for row in store.by_category("toys")]
+    assert 3 not in [row["id"] for row in store.by_category(make_fake_item(3)["category"])]
+    assert store.upsert(make_fake_item(50)) is True
+    assert [row["id"] for row in store.id_range(9, 100)] == [9, 50]
+
+
+def test_read_user_query_item_404():
+    module = importlib.import_module("3_query_parameter")
+    client = TestClient(module.app)
+    response = client.get("/item_query/12", params={"needy": "x"})
+    assert response.status_code == 200
+    assert response.json()["item"]["id"] == 12
+    assert client.get("/item_query/1000", params={"needy": "x"}).status_code == 404
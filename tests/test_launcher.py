@@ -0,0 +1,89 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import launcher as launcher_module
+from launcher import Launcher, source_hash
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(launcher_module, "CACHE_DIR", str(tmp_path / "openapi"))
+
+
+def make_app(apps):
+    launcher = Launcher(apps)
+    app = FastAPI(lifespan=launcher.lifespan)
+    launcher.mount(app)
+    return app, launcher
+
+
+def test_docs_come_from_the_disk_cache_without_an_import():
+    app, launcher = make_app({"/a": "3_query_parameter"})
+    lazy = launcher.apps["/a"]
+    schema = {"openapi": "3.1.0", "info": {"title": "Cached", "version": "1"}, "paths": {}}
+    launcher_module.write_schema(lazy.cache_path, schema)
+    with TestClient(app) as client:
+        assert client.get("/a/openapi.json").json() == {**schema, "servers": [{"url": "/a"}]}
+        assert "Cached - Swagger UI" in client.get("/a/docs").text
+        assert "/a/openapi.json" in client.get("/a/docs").text
+    assert launcher.report()["/a"]["loaded"] is False
+    assert launcher.report()["/a"]["openapi"] == "disk"
+
+
+def test_missing_schema_is_generated_and_written():
+    app, launcher = make_app({"/a": "3_query_parameter"})
+    lazy = launcher.apps["/a"]
+    with TestClient(app) as client:
+        paths = client.get("/a/openapi.json").json()["paths"]
+    assert "/items/" in paths
+    assert launcher.report()["/a"]["openapi"] == "generated"
+    with open(lazy.cache_path) as f:
+        assert '"/items/"' in f.read()
+
+
+def test_first_request_imports_once_and_runs_the_lifespan(monkeypatch):
+    imports = []
+    import_module = importlib.import_module
+
+    def counting(name):
+        imports.append(name)
+        return import_module(name)
+
+    monkeypatch.setattr(launcher_module, "importlib", SimpleNamespace(import_module=counting))
+    app, launcher = make_app({"/a": "8_body_multiple_parameter", "/b": "3_query_parameter"})
+
+    async def run():
+        async with launcher.lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(*(client.get("/a/items/1") for _ in range(10)))
+            tasks = list(launcher._lifespans)
+            assert not any(task.done() for task in tasks)
+        return responses, tasks
+
+    responses, tasks = asyncio.run(run())
+    statuses = {response.status_code for response in responses}
+    assert len(statuses) == 1 and statuses <= {200, 404}  # served by the app, not a launcher error
+    assert imports == ["8_body_multiple_parameter"]
+    assert len(tasks) == 1 and tasks[0].done()  # shut down with the launcher
+    report = launcher.report()
+    assert report["/a"]["loaded"] and report["/a"]["import_seconds"] is not None
+    assert not report["/b"]["loaded"]
+
+
+def test_source_hash_follows_local_imports(tmp_path, monkeypatch):
+    monkeypatch.setattr(launcher_module, "ROOT", str(tmp_path))
+    (tmp_path / "app_a.py").write_text("import os\nfrom helper import x\n")
+    (tmp_path / "helper.py").write_text("x = 1\n")
+    (tmp_path / "other.py").write_text("y = 1\n")
+    before = source_hash("app_a")
+    (tmp_path / "other.py").write_text("y = 2\n")
+    assert source_hash("app_a") == before
+    (tmp_path / "helper.py").write_text("x = 2\n")
+    assert source_hash("app_a") != before
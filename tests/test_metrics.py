@@ -0,0 +1,54 @@
+import importlib
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import BUCKETS, Histogram, install_metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram()
+    for value in (0.0001, 0.003, 0.003, 100.0):
+        histogram.observe(value)
+    lines = list(histogram.lines("x", 'a="b"'))
+    assert lines[0] == 'x_bucket{a="b",le="0.0005"} 1'
+    assert f'x_bucket{{a="b",le="{BUCKETS[3]}"}} 3' in lines
+    assert lines[len(BUCKETS)] == 'x_bucket{a="b",le="+Inf"} 4'
+    assert lines[-1] == 'x_count{a="b"} 4'
+
+
+def test_requests_are_recorded_by_route_template():
+    app = FastAPI()
+    install_metrics(app)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    client = TestClient(app)
+    for item_id in (1, 2, 3):
+        client.get(f"/items/{item_id}")
+    client.get("/items/x")
+    client.get("/nope")
+    body = client.get("/metrics").text
+    labels = 'method="GET",route="/items/{item_id}"'
+    assert f'http_request_duration_seconds_count{{{labels},status="200"}} 3' in body
+    assert f'http_request_duration_seconds_count{{{labels},status="422"}} 1' in body
+    assert f'http_request_phase_seconds_count{{{labels},phase="handler"}} 3' in body
+    assert 'route="<unmatched>",status="404"' in body
+
+
+def test_metrics_show_the_cache_the_app_uses():
+    module_7 = importlib.import_module("7_query_parameter_models")
+    with TestClient(module_7.app) as client:
+        client.get("/items/?limit=3")
+        client.get("/items/?limit=3")
+        body = client.get("/metrics").text
+    hits = module_7.shared_cache.hits
+    assert hits >= 1
+    assert f'shared_cache_events_total{{cache="7_query_parameter_models",event="hits"}} {hits}' in body
+
+    module_3 = importlib.import_module("3_query_parameter")
+    body = TestClient(module_3.app).get("/metrics").text
+    assert "response_cache_events_total" not in body  # module 3 doesn't use the in-process cache
+    assert 'shared_cache_events_total{cache="3_query_parameter"' in body
@@ -0,0 +1,79 @@
+import asyncio
+import importlib
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def root(tmp_path):
+    for name, size in (("a", 100), ("b", 200), ("c", 300)):
+        (tmp_path / f"{name}.bin").write_bytes(b"x" * size)
+    return str(tmp_path)
+
+
+def test_lazy_load_and_hits(root):
+    registry = ModelRegistry(root)
+
+    async def run():
+        first = await registry.get("a")
+        again = await registry.get("a")
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first is again
+    assert bytes(first.weights[:3]) == b"xxx"
+    assert (registry.misses, registry.hits, registry.bytes) == (1, 1, 100)
+
+
+def test_concurrent_cold_requests_share_one_load(root):
+    registry = ModelRegistry(root)
+
+    async def run():
+        return await asyncio.gather(*(registry.get("b") for _ in range(10)))
+
+    models = asyncio.run(run())
+    assert all(model is models[0] for model in models)
+    assert (registry.misses, registry.coalesced) == (1, 9)
+
+
+def test_budget_evicts_the_least_recently_used(root):
+    registry = ModelRegistry(root, budget_bytes=450)
+
+    async def run():
+        for name in ("a", "b", "a", "c"):  # c needs room -> b goes, a was used again
+            await registry.get(name)
+
+    asyncio.run(run())
+    assert [model["model_name"] for model in registry.stats()["models"]] == ["c", "a"]
+    assert registry.evictions == 1
+    assert registry.bytes == 400
+
+
+def test_missing_or_unsafe_names_are_404_and_not_cached(root):
+    registry = ModelRegistry(root)
+
+    async def status(name):
+        try:
+            await registry.get(name)
+        except HTTPException as e:
+            return e.status_code
+
+    assert asyncio.run(status("nope")) == 404
+    assert asyncio.run(status("../a")) == 404
+    assert registry.failures == 2
+    assert registry.stats()["models"] == []
+
+
+def test_models_endpoint_without_artifacts():
+    # a fresh checkout has no ./models -> the tutorial answers stay the same
+    client = TestClient(importlib.import_module("main").app)
+    assert client.get("/models/alexnet").json() == {"model_name": "alexnet", "message": "this is alexnet ..."}
+    assert client.get("/models/lenet").json() == {"model_name": "lenet", "message": "LeCNN all the images"}
+    response = client.get("/models/resnet")
+    assert response.json() == {"model_name": "resnet", "message": "Deep Learning FTW!"}
+    assert client.get("/models/resnet").headers["X-Cache"] == "HIT"
+    assert client.get("/models/vgg").status_code == 422
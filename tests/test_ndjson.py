@@ -0,0 +1,42 @@
+import asyncio
+import gzip
+import importlib
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from item_columns import ColumnarCatalog
+from item_store import make_fake_items
+from ndjson import ndjson_chunks
+
+
+async def collect(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+
+def test_chunks_are_one_document_per_line():
+    rows = [{"id": i} for i in range(1234)]
+    body = asyncio.run(collect(ndjson_chunks(rows, batch_size=100)))
+    assert [json.loads(line) for line in body.splitlines()] == rows
+    gzipped = asyncio.run(collect(ndjson_chunks(rows, batch_size=100, compress=True)))
+    assert gzip.decompress(gzipped) == body
+
+
+def test_iter_rows_in_slices():
+    catalog = ColumnarCatalog.from_items(make_fake_items(50))
+    positions = np.array([49, 3, 7, 0, 12], dtype=np.int64)
+    assert [row["id"] for row in catalog.iter_rows(positions, chunk_size=2)] == [49, 3, 7, 0, 12]
+    assert list(catalog.iter_rows(positions[:0])) == []
+
+
+def test_export_endpoint():
+    client = TestClient(importlib.import_module("7_query_parameter_models").app)
+    response = client.get("/items_export/", params={"category": "food", "offset": 2, "limit": 5})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    page = client.get("/items/", params={"category": "food", "offset": 2, "limit": 5}).json()["items"]
+    assert lines == page
+    full = client.get("/items_export/", params={"gzip": "true"}, headers={"Accept-Encoding": "gzip"})
+    assert full.headers["content-encoding"] == "gzip"
+    assert len(full.text.splitlines()) == 100  # httpx decodes the gzip stream
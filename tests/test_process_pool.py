@@ -0,0 +1,71 @@
+import asyncio
+import glob
+import os
+import time
+
+import pytest
+
+from process_pool import ProcessPool
+
+pool = ProcessPool(max_workers=2, shm_threshold=1024)
+
+
+@pool.offload
+def double(data: bytes) -> bytes:
+    return data * 2
+
+
+@pool.offload
+def slow_echo(data: bytes, seconds: float) -> bytes:
+    time.sleep(seconds)
+    return data
+
+
+@pool.offload
+def pid() -> int:
+    return os.getpid()
+
+
+def segments() -> set[str]:
+    return set(glob.glob("/dev/shm/psm_*"))
+
+
+@pytest.fixture(scope="module")
+def started():
+    asyncio.run(pool.start())
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs /dev/shm")
+def test_big_payloads_leave_no_segments(started):
+    before = segments()
+
+    async def both():
+        return await asyncio.gather(double(b"ab"), double(b"x" * 100_000))
+
+    small, big = asyncio.run(both())
+    assert small == b"abab"
+    assert big == b"x" * 200_000
+    assert segments() == before
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs /dev/shm")
+def test_cancelled_call_leaves_no_segments(started):
+    before = segments()
+
+    async def cancel_while_running():
+        task = asyncio.ensure_future(slow_echo(b"y" * 100_000, 0.3))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert len(segments() - before) == 1  # the arguments, the worker may still read them
+        await asyncio.sleep(0.5)  # the worker still sends its (big) result
+
+    asyncio.run(cancel_while_running())
+    assert segments() == before
+
+
+def test_runs_in_another_process(started):
+    assert asyncio.run(pid()) != os.getpid()
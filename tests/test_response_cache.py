@@ -0,0 +1,66 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from response_cache import ResponseCache
+
+
+def make_app(cache: ResponseCache, ttl: float = 60):
+    app = FastAPI()
+    calls = []
+
+    @app.get("/items/{item_id}")
+    @cache.cached(ttl=ttl)
+    async def read_item(item_id: int, q: str | None = None):
+        calls.append(item_id)
+        return {"item_id": item_id, "q": q}
+
+    return TestClient(app), calls
+
+
+def test_miss_then_hit():
+    cache = ResponseCache()
+    client, calls = make_app(cache)
+    first = client.get("/items/1?a=1&q=x")
+    second = client.get("/items/1?q=x&a=1")  # same query in another order -> same entry
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json() == {"item_id": 1, "q": "x"}
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert calls == [1]
+    assert cache.stats()["hits"] == 1
+
+
+def test_if_none_match_is_a_304():
+    client, _ = make_app(ResponseCache())
+    etag = client.get("/items/2").headers["ETag"]
+    response = client.get("/items/2", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/items/2", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_ttl_expires():
+    client, calls = make_app(ResponseCache(), ttl=0.05)
+    client.get("/items/3")
+    time.sleep(0.1)
+    assert client.get("/items/3").headers["X-Cache"] == "MISS"
+    assert calls == [3, 3]
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    client, calls = make_app(cache)
+    for item_id in (1, 2, 1, 3):  # 1 was used again -> 2 is the least recently used
+        client.get(f"/items/{item_id}")
+    assert client.get("/items/1").headers["X-Cache"] == "HIT"
+    assert client.get("/items/2").headers["X-Cache"] == "MISS"
+    assert cache.evictions == 2
+    assert len(cache) == 2
+
+
+def test_invalid_parameters_are_not_cached():
+    client, calls = make_app(ResponseCache())
+    assert client.get("/items/abc").status_code == 422
+    assert calls == []
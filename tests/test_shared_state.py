@@ -0,0 +1,121 @@
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from shared_state import SharedResponseCache, SharedSnapshot, private_dir
+
+
+def test_snapshot_is_built_once_and_updates_reach_every_worker(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return b"v1"
+
+    # two instances on one directory = two workers
+    a, b = (SharedSnapshot("s", build=build, load=bytes, root=str(tmp_path)) for _ in range(2))
+    assert a.get() == b.get() == b"v1"
+    assert len(builds) == 1
+    assert a.update(lambda value: value + b"+") == 2
+    assert b.get() == b"v1+"
+    assert sorted(os.listdir(tmp_path)) == ["s.2", "s.gen", "s.lock"]  # the old generation is gone
+
+
+def test_snapshot_is_built_at_startup(tmp_path):
+    snapshot = SharedSnapshot("s", build=lambda: b"v1", load=bytes, root=str(tmp_path))
+
+    async def run():
+        async with snapshot.lifespan(None):
+            return snapshot._value
+
+    assert asyncio.run(run()) == b"v1"  # there before the first request
+
+
+def test_cache_is_shared_between_workers(tmp_path):
+    a, b = (SharedResponseCache("c", slots=16, slot_bytes=1024, root=str(tmp_path)) for _ in range(2))
+    etag = a.set("/items/1", b'{"id": 1}', ttl=60)
+    assert b.get("/items/1") == (etag, b'{"id": 1}')
+    assert b.get("/items/2") is None
+    a.set("/big", b"x" * 1024, ttl=60)  # over slot_bytes - 64 -> not cached
+    assert b.get("/big") is None
+    a.set("/old", b"1", ttl=-1)
+    assert b.get("/old") is None
+    assert len(b) == 1
+    a.clear()
+    assert b.get("/items/1") is None
+
+
+def test_torn_reads_are_misses(tmp_path):
+    cache = SharedResponseCache("c", slots=1, slot_bytes=1024, root=str(tmp_path))
+    cache.set("/items/1", b"1", ttl=60)
+    data = cache._open()
+    base, _ = cache._slot("/items/1")
+    data[base] += 1  # a writer is in the slot ( odd seq )
+    assert cache.get("/items/1") is None
+    assert cache.torn_reads == 3
+
+
+def test_busy_slot_skips_the_write(tmp_path):
+    cache = SharedResponseCache("c", slots=1, slot_bytes=1024, root=str(tmp_path))
+    cache._open()
+    with cache._write_lock:  # another thread of this worker
+        cache.set("/items/1", b"1", ttl=60)
+    assert cache.get("/items/1") is None
+    holder = subprocess.Popen(  # another worker
+        [
+            sys.executable,
+            "-c",
+            "import fcntl, sys; f = open(sys.argv[1], 'r+b'); fcntl.lockf(f, fcntl.LOCK_EX);"
+            "print('locked', flush=True); sys.stdin.read()",
+            cache.path,
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    try:
+        assert holder.stdout.readline() == b"locked\n"
+        cache.set("/items/1", b"1", ttl=60)
+    finally:
+        holder.communicate(b"")
+    assert cache.get("/items/1") is None
+    assert cache.busy == 2
+    cache.set("/items/1", b"1", ttl=60)
+    assert cache.get("/items/1") is not None
+
+
+def test_no_hit_after_a_restart():
+    module = importlib.import_module("3_query_parameter")
+    with TestClient(module.app) as client:
+        assert client.get("/items/7").headers["X-Cache"] == "MISS"
+        assert client.get("/items/7").headers["X-Cache"] == "HIT"
+    with TestClient(module.app) as client:  # a new run on the same files
+        assert client.get("/items/7").headers["X-Cache"] == "MISS"
+
+
+def test_private_dir(tmp_path):
+    path = str(tmp_path / "shared")
+    assert private_dir(path) == path
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    open_dir = tmp_path / "open"
+    open_dir.mkdir(mode=0o755)
+    os.chmod(open_dir, 0o755)
+    with pytest.raises(PermissionError):
+        SharedResponseCache("c", root=str(open_dir))._open()
+    link = tmp_path / "link"
+    link.symlink_to(path)
+    with pytest.raises(PermissionError):
+        private_dir(str(link))
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason="needs root to chown")
+def test_directory_of_another_user_is_refused(tmp_path):
+    other = tmp_path / "other"
+    other.mkdir(mode=0o700)
+    os.chown(other, 12345, 12345)
+    with pytest.raises(PermissionError, match="uid"):
+        private_dir(str(other))
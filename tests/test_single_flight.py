@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from single_flight import SingleFlight
+
+
+def make_app():
+    app = FastAPI()
+    flight = SingleFlight()
+    calls = []
+
+    @app.get("/items/{item_id}")
+    @flight.coalesce()
+    async def read_item(item_id: int, q: str | None = None):
+        calls.append((item_id, q))
+        await asyncio.sleep(0.05)
+        if item_id == 0:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return {"item_id": item_id, "q": q}
+
+    return app, flight, calls
+
+
+async def get_many(app, urls):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(url) for url in urls))
+
+
+def test_concurrent_identical_requests_run_once():
+    app, flight, calls = make_app()
+    responses = asyncio.run(get_many(app, ["/items/1?q=a"] * 5 + ["/items/2?q=a"]))
+    assert [response.json()["item_id"] for response in responses] == [1, 1, 1, 1, 1, 2]
+    assert sorted(calls) == [(1, "a"), (2, "a")]
+    assert flight.stats()["routes"]["read_item"] == {"leaders": 2, "followers": 4}
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_nothing_is_kept_after_the_flight():
+    app, _, calls = make_app()
+    asyncio.run(get_many(app, ["/items/1"]))
+    asyncio.run(get_many(app, ["/items/1"]))
+    assert len(calls) == 2
+
+
+def test_errors_are_shared():
+    app, _, calls = make_app()
+    responses = asyncio.run(get_many(app, ["/items/0"] * 3))
+    assert [response.status_code for response in responses] == [404, 404, 404]
+    assert len(calls) == 1
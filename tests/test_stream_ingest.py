@@ -0,0 +1,142 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from bulk import BatchError
+from stream_ingest import JsonArraySplitter, install_body_limit, pipeline, validate_elements
+
+DEEP = {"a": [[[[[[[["deep"]]]]]]]]}  # deeper than the fast path regex goes
+ELEMENTS = [
+    1,
+    "plain",
+    'quote " and ] and [ and \\ and }',
+    "\\",
+    {"tags": ["a", "b]"], "image": {"url": "http://x/a.jpg", "name": "a,b"}},
+    [],
+    {},
+    DEEP,
+    None,
+    -1.5e3,
+    "unicode ☃ ]",
+]
+
+
+def split(body: bytes, size: int) -> list:
+    splitter = JsonArraySplitter()
+    elements = []
+    for start in range(0, len(body), size):
+        elements += splitter.feed(body[start : start + size])
+    splitter.close()
+    return [json.loads(element) for element in elements]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100_000])
+def test_elements_at_every_chunk_boundary(size):
+    body = json.dumps(ELEMENTS, ensure_ascii=False).encode()
+    assert split(body, size) == ELEMENTS
+    assert split(b' \n[ 1 , "a]" ]\n ', size) == [1, "a]"]
+    assert split(b"[]", size) == []
+
+
+@pytest.mark.parametrize(
+    "body", [b'{"a": 1}', b"x[1]", b"[1,]", b"[,1]", b"[1,,2]", b"[1] 2", b"[1, 2", b'["a]', b""]
+)
+def test_broken_arrays(body):
+    with pytest.raises(BatchError):
+        split(body, 3)
+
+
+def test_element_bigger_than_the_limit_is_413():
+    splitter = JsonArraySplitter(max_item_bytes=10)
+    assert splitter.feed(b'["short", ') == [b'"short"']
+    with pytest.raises(HTTPException) as e:
+        splitter.feed(b'"' + b"x" * 20)
+    assert e.value.status_code == 413
+
+
+class Row(BaseModel):
+    item_id: int
+    price: float
+
+
+def test_bad_elements_are_reported_by_row():
+    elements = [b'{"item_id": 1, "price": 1}', b'{"item_id": "x", "price": 1}', b'{"item_id": 3, "price": 3}']
+    results = validate_elements(Row, elements, first_row=10)
+    assert [(row, model is not None) for row, model, _ in results] == [(10, True), (11, False), (12, True)]
+    assert results[1][2][0]["loc"] == ["item_id"]
+
+
+def test_pipeline_reads_ahead_at_most_max_batches():
+    read = []
+    ahead = []
+
+    async def rows():
+        for i in range(100):
+            read.append(i)
+            yield i
+
+    async def slow_sink(batch):
+        ahead.append(len(read) - batch[-1] - 1)  # rows read but not saved yet
+        await asyncio.sleep(0.001)
+
+    asyncio.run(pipeline(rows(), slow_sink, batch_size=5, max_batches=2))
+    assert len(read) == 100
+    assert max(ahead) <= 5 * (2 + 1) + 1  # the queue + the batch being collected
+
+
+def test_pipeline_stops_reading_when_the_sink_fails():
+    read = []
+
+    async def rows():
+        for i in range(1000):
+            read.append(i)
+            yield i
+
+    async def failing_sink(batch):
+        raise RuntimeError("database is down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline(rows(), failing_sink, batch_size=10, max_batches=1))
+    assert len(read) < 100
+
+
+def make_limited_app():
+    app = FastAPI()
+
+    @app.put("/small/")
+    @app.put("/stream/")
+    async def read_body(request: Request):
+        return {"bytes": len(await request.body())}
+
+    install_body_limit(app, max_bytes=100, routes={"/stream/": 1000})
+    return TestClient(app)
+
+
+def test_body_limit_per_route():
+    client = make_limited_app()
+    assert client.put("/small/", content=b"x" * 100).json() == {"bytes": 100}
+    assert client.put("/small/", content=b"x" * 101).status_code == 413
+    assert client.put("/stream/", content=b"x" * 500).json() == {"bytes": 500}
+    assert client.put("/stream/", content=b"x" * 1001).status_code == 413
+    chunked = client.put("/small/", content=iter([b"x" * 60, b"x" * 60]))  # no Content-Length
+    assert chunked.status_code == 413
+
+
+def test_streaming_put_of_module_10():
+    module = importlib.import_module("10_body_nested_models")
+    rows = [{"item_id": 910_000 + i, "name": f"n{i}", "price": i, "tags": ["stream-test"]} for i in range(1200)]
+    rows[7] = {"item_id": 910_007, "name": "bad"}
+    body = json.dumps(rows).encode()
+    with TestClient(module.app) as client:
+        chunks = (body[i : i + 1000] for i in range(0, len(body), 1000))
+        result = client.put("/items_model_stream/", content=chunks).json()
+        assert (result["received"], result["failed"]) == (1200, 1)
+        assert result["errors"][0]["row"] == 7
+        tagged = client.get("/items_by_tags/", params={"all_of": "stream-test", "limit": 1}).json()
+        assert tagged["count"] == 1199
+        assert client.put("/items_model_stream/", content=b'{"not": "an array"}').status_code == 400
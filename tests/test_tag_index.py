@@ -0,0 +1,99 @@
+import asyncio
+import importlib
+
+from fastapi.testclient import TestClient
+
+from item_repository import InMemoryRepository
+from tag_index import Bitmap, TagIndex
+
+TAGS = {
+    1: {"rock", "metal"},
+    2: {"rock", "pop"},
+    3: {"metal"},
+    70_000: {"rock", "metal", "pop"},  # another chunk
+    70_001: set(),
+}
+
+
+def make_index() -> TagIndex:
+    index = TagIndex()
+    for item_id, tags in TAGS.items():
+        index.update(item_id, tags)
+    return index
+
+
+def scan(all_of=(), any_of=(), none_of=()) -> list[int]:
+    return [
+        item_id
+        for item_id, tags in sorted(TAGS.items())
+        if set(all_of) <= tags and (not any_of or tags & set(any_of)) and not tags & set(none_of)
+    ]
+
+
+def test_queries_match_a_scan():
+    index = make_index()
+    queries = [
+        {"all_of": ["rock", "metal"]},
+        {"all_of": ["rock"], "none_of": ["pop"]},
+        {"any_of": ["pop", "metal"]},
+        {"any_of": ["pop", "metal"], "none_of": ["rock"]},
+        {"all_of": ["metal"], "any_of": ["pop"]},
+        {"none_of": ["rock"]},
+        {"all_of": ["nope"]},
+        {},
+    ]
+    for query in queries:
+        result = index.query(**query)
+        assert list(result) == scan(**query), query
+        assert len(result) == len(scan(**query))
+
+
+def test_update_replaces_tags_and_page_skips_chunks():
+    index = make_index()
+    index.update(1, {"pop"})
+    assert list(index.query(all_of=["metal"])) == [3, 70_000]
+    index.remove(3)
+    assert list(index.query(all_of=["metal"])) == [70_000]
+    assert index.counts() == {"metal": 1, "pop": 3, "rock": 2}
+    bitmap = Bitmap.from_ids([1, 5, 70_000, 70_002, 200_000])
+    assert bitmap.page(2, 2) == [70_000, 70_002]
+    assert bitmap.page(4, 10) == [200_000]
+
+
+def test_negative_ids():
+    index = make_index()
+    index.update(-1, {"rock"})
+    index.update(-70_000, {"metal"})
+    assert list(index.query(any_of=["rock", "metal"])) == [-70_000, -1, 1, 2, 3, 70_000]
+    assert list(index.query(all_of=["rock"], none_of=["pop"])) == [-1, 1]
+    assert index.query(none_of=["rock", "metal"]).page(0, 10) == [70_001]
+    index.remove(-1)
+    assert list(index.query(all_of=["rock"])) == [1, 2, 70_000]
+
+
+def test_load_replaces_the_index_with_the_saved_items():
+    async def run():
+        repo = InMemoryRepository()
+        await repo.upsert_many([(1, {"tags": ["a", "b"]}), (2, {"tags": [1, 2]}), (3, {"name": "x"})])
+        index = make_index()
+        await index.load(repo.scan())
+        return index
+
+    index = asyncio.run(run())
+    assert len(index) == 3
+    assert list(index.query(all_of=["a"])) == [1]
+    assert list(index.query(any_of=["2"])) == [2]  # int tags are indexed as strings
+    assert list(index.query(all_of=["rock"])) == []
+
+
+def test_index_is_rebuilt_on_startup(monkeypatch):
+    module = importlib.import_module("10_body_nested_models")
+    item = {"name": "Foo", "price": 1.0}
+    with TestClient(module.app) as client:
+        client.put("/items_model/900001", json=item | {"tags": ["t-rock", "t-metal"]})
+        client.put("/items_model/900002", json=item | {"tags": ["t-rock"]})
+        client.put("/items_model/-900003", json=item | {"tags": ["t-rock"]})  # negative ids are indexed too
+    monkeypatch.setattr(module, "tag_index", TagIndex())  # a fresh process
+    with TestClient(module.app) as client:
+        response = client.get("/items_by_tags/", params={"all_of": "t-rock", "none_of": "t-metal"})
+        assert response.json() == {"count": 2, "item_ids": [-900003, 900002]}
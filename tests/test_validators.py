@@ -0,0 +1,111 @@
+import importlib
+from typing import Annotated
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import StringConstraints, TypeAdapter, ValidationError
+
+from validators import ConstraintError, cached_validator, compile_check
+
+PATTERNS = ["^fixquery$", "^[a-z]+$", "abc$", "^a[$]b$", "^[]$]+$", r"^\$\d+$", "^(foo|bar)$", "b"]
+INPUTS = ["fixquery", "fixquery\n", "abc", "abc\n", "xabc", "a$b", "a$b\n", "$$]", "$12", "$12\n", "foo", "bar\n", ""]
+
+
+def pydantic_accepts(pattern: str, value: str) -> bool:
+    try:
+        TypeAdapter(Annotated[str, StringConstraints(pattern=pattern)]).validate_python(value)
+        return True
+    except ValidationError:
+        return False
+
+
+def compiled_accepts(pattern: str, value: str) -> bool:
+    try:
+        compile_check(pattern=pattern)(value)
+        return True
+    except ValueError:
+        return False
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_same_matches_as_pydantic(pattern):
+    for value in INPUTS:
+        assert compiled_accepts(pattern, value) == pydantic_accepts(pattern, value), (pattern, value)
+
+
+@pytest.mark.parametrize(
+    "constraints",
+    [
+        {"min_length": 3, "max_length": 5, "pattern": "^ab+$"},
+        {"min_length": 1, "max_length": 1},
+        {"min_length": 2, "max_length": 9, "pattern": "^fixquery$"},
+    ],
+)
+def test_same_errors_as_pydantic(constraints):
+    adapter = TypeAdapter(Annotated[str, StringConstraints(**constraints)])
+    check = compile_check(**constraints)
+    for value in ["", "a", "ab", "abbb", "ab\n", "xyz", "abbbbbbb", "fixquery", "fixquery2", "x" * 20]:
+        try:
+            adapter.validate_python(value)
+            expected = None
+        except ValidationError as e:
+            expected = [(error["type"], error["msg"], error["ctx"]) for error in e.errors()][:1]
+        try:
+            check(value)
+            got = None
+        except ConstraintError as e:
+            got = [(e.type, str(e), e.ctx)]
+        assert got == expected, value
+
+
+def test_length_and_prefixes():
+    check = compile_check(min_length=3, max_length=5, prefixes=("a", "b"))
+    assert check("abc") == "abc"
+    for value in ("ab", "abcdef", "cde"):
+        with pytest.raises(ValueError):
+            check(value)
+
+
+def test_cached_validator_caches_failures():
+    calls = []
+
+    @cached_validator(maxsize=8)
+    def check(value: str) -> str:
+        calls.append(value)
+        if value == "bad":
+            raise ValueError("bad value")
+        return value.upper()
+
+    assert check("ok") == check("ok") == "OK"
+    for _ in range(2):
+        with pytest.raises(ValueError, match="bad value"):
+            check("bad")
+    assert calls == ["ok", "bad"]
+
+
+@pytest.mark.parametrize(
+    "original, compiled, name, values",
+    [
+        (
+            "/items_query_validate/",
+            "/items_query_validate_compiled/",
+            "q",
+            [None, "fixquery", "fixquery\n", "fix", "", "fixquery2", "x" * 60],
+        ),
+        (
+            "/item_custom_validation/",
+            "/item_custom_validation_compiled/",
+            "id",
+            ["isbn-9781529046137", "isbn-9781529046137\n", "imdb-nope", "isb-1", ""],
+        ),
+    ],
+)
+def test_twin_endpoints_accept_the_same_inputs(original, compiled, name, values):
+    client = TestClient(importlib.import_module("5_query_parameter_string_validation").app)
+    for value in values:
+        params = {} if value is None else {name: value}
+        expected = client.get(original, params=params)
+        response = client.get(compiled, params=params)
+        assert response.status_code == expected.status_code, value
+        if value is not None:
+            assert response.json() == expected.json(), value  # the 422s too
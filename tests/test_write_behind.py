@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from item_repository import InMemoryRepository
+from write_behind import WriteBehind
+
+
+class FlakyRepository(InMemoryRepository):
+    """
+    fails the first `failures` batches
+    """
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def upsert_many(self, rows):
+        await asyncio.sleep(0.01)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is down")
+        return await super().upsert_many(rows)
+
+
+def test_write_through_when_disabled():
+    async def run():
+        repo = InMemoryRepository()
+        write_behind = WriteBehind(repo, enabled=False)
+        return await write_behind.save(1, {"name": "a"}), await repo.get(1)
+
+    assert asyncio.run(run()) == (200, {"name": "a"})
+
+
+def test_queued_items_are_coalesced_and_drained_on_close():
+    async def run():
+        repo = InMemoryRepository()
+        write_behind = WriteBehind(repo, enabled=True, max_delay=10)
+        async with write_behind.lifespan(None):
+            assert await write_behind.save(1, {"name": "a"}) == 202
+            assert await write_behind.save(1, {"name": "b"}) == 202
+            assert await write_behind.save(2, {"name": "c"}) == 202
+            assert await write_behind.get(1) == {"name": "b"}  # read your own write
+            assert await repo.count() == 0
+        return repo, write_behind
+
+    repo, write_behind = asyncio.run(run())
+    assert (write_behind.accepted, write_behind.coalesced, write_behind.flushed) == (3, 1, 2)
+    assert asyncio.run(repo.get_many([1, 2])) == {1: {"name": "b"}, 2: {"name": "c"}}
+
+
+def test_full_queue_is_503():
+    async def run():
+        write_behind = WriteBehind(InMemoryRepository(), enabled=True, max_pending=2, max_wait=0.01)
+        await write_behind.submit(1, "a")
+        await write_behind.submit(2, "b")
+        await write_behind.submit(2, "c")  # coalesced, takes no room
+        with pytest.raises(HTTPException) as e:
+            await write_behind.submit(3, "d")
+        return e.value, write_behind
+
+    error, write_behind = asyncio.run(run())
+    assert (error.status_code, error.headers) == (503, {"Retry-After": "1"})
+    assert write_behind.rejected == 1
+
+
+def test_failed_batches_stay_within_max_pending():
+    async def run():
+        repo = FlakyRepository(failures=3)
+        write_behind = WriteBehind(
+            repo, enabled=True, max_batch=2, max_delay=0, max_pending=4, max_wait=0.05, retry_after=0
+        )
+        sizes, newest, rejected = [], {}, 0
+
+        async def watch():
+            while True:
+                sizes.append(len(write_behind._pending) + len(write_behind._flushing))
+                await asyncio.sleep(0.001)
+
+        watcher = asyncio.create_task(watch())
+        async with write_behind.lifespan(None):
+            for version in range(20):
+                try:
+                    await write_behind.submit(version % 6, version)
+                    newest[version % 6] = version
+                except HTTPException:
+                    rejected += 1
+        watcher.cancel()
+        return repo, write_behind, sizes, newest, rejected
+
+    repo, write_behind, sizes, newest, rejected = asyncio.run(run())
+    assert max(sizes) <= 4
+    assert write_behind.failures == 3
+    assert write_behind.rejected == rejected
+    # nothing accepted is lost, the newest version of each item is the one saved
+    assert write_behind.flushed + write_behind.coalesced == write_behind.accepted
+    assert asyncio.run(repo.get_many(range(6))) == newest
+
+
+class HangingRepository(InMemoryRepository):
+    async def upsert_many(self, rows):
+        await asyncio.sleep(3600)
+
+
+def test_save_waiting_for_room_gets_503_on_shutdown():
+    async def run():
+        write_behind = WriteBehind(
+            HangingRepository(),
+            enabled=True,
+            max_batch=1,
+            max_delay=0,
+            max_pending=1,
+            max_wait=5,
+            drain_timeout=0.05,
+        )
+        await write_behind.start()
+        await write_behind.submit(1, "a")  # taken by the flusher, which never finishes
+        waiting = asyncio.create_task(write_behind.submit(2, "b"))
+        await asyncio.sleep(0.01)
+        task = write_behind._task
+        await write_behind.close()
+        start = time.monotonic()
+        with pytest.raises(HTTPException) as e:
+            await waiting
+        return e.value, write_behind, task, time.monotonic() - start
+
+    error, write_behind, task, waited = asyncio.run(run())
+    assert (error.status_code, error.detail) == (503, "Server is shutting down, try again later.")
+    assert waited < 1  # woken by the shutdown, not by max_wait
+    assert 2 not in write_behind._pending
+    assert task.done()  # close() returns once the flusher has really stopped
@@ -0,0 +1,215 @@
+import functools
+import re
+from collections.abc import Callable, Iterable
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+
+"""
+query validation compiled once at startup
+
+    Query(min_length=3, max_length=50, pattern="^fixquery$") -> the check itself is fast
+    ( pydantic-core, rust regex ), but for every request and every parameter FastAPI
+    looks at the type annotation again ( is it a list? a sequence? ... ) before validating.
+
+CompiledQuery builds one check function when the app starts:
+    - length limits, prefixes and the pattern are fused into one function
+    - a pattern that is just a fixed string ( ^fixquery$ ) becomes `value == "fixquery"`
+    - any other pattern is compiled with re.compile once ( `$` -> \\Z, same matches as pydantic )
+    - custom validators run after that ( wrap pure ones with cached_validator )
+    - limits and pattern are checked in pydantic's order ( min, max, pattern ) with its error types
+and the endpoint gets the value through a dependency that reads the raw query string.
+
+    q_query = CompiledQuery("q", min_length=3, max_length=50, pattern="^fixquery$")
+
+    @app.get("/items/", openapi_extra={"parameters": [q_query.parameter]})
+    async def read_items(q: Annotated[str | None, Depends(q_query)]): ...
+
+NOTE:
+    errors are raised as RequestValidationError -> a 422 in the same format as Query():
+    string_too_short / string_too_long / string_pattern_mismatch with pydantic's msg and ctx,
+    value_error for prefixes and custom validators ( like an AfterValidator ).
+    the dependency is not a Query() -> add `parameter` to openapi_extra to keep it in the docs.
+"""
+
+_LITERAL = re.compile(r"\^((?:[^\\.^$*+?{}\[\]|()]|\\.)*)\$")
+
+
+class ConstraintError(ValueError):
+    """
+    a failed length / pattern check, with the error type and ctx pydantic would report
+    """
+
+    def __init__(self, type: str, msg: str, ctx: dict):
+        super().__init__(msg)
+        self.type = type
+        self.ctx = ctx
+
+
+def _characters(n: int) -> str:
+    return "character" if n == 1 else "characters"
+
+
+def cached_validator(maxsize: int = 4096):
+    """
+    memoize a pure validator ( same input -> same output or same error ) in a bounded LRU
+    failures are cached too, so a bad value is not checked twice
+    """
+
+    def decorator(func: Callable[[str], str]):
+        @functools.lru_cache(maxsize=maxsize)
+        def run(value: str):
+            try:
+                return True, func(value)
+            except ValueError as e:
+                return False, str(e)
+
+        @functools.wraps(func)
+        def wrapper(value: str):
+            ok, result = run(value)
+            if not ok:
+                raise ValueError(result)
+            return result
+
+        wrapper.cache_info = run.cache_info
+        wrapper.cache_clear = run.cache_clear
+        return wrapper
+
+    return decorator
+
+
+def _rust_anchors(pattern: str) -> str:
+    """
+    pydantic-core checks patterns with the rust regex crate: `$` matches only at the very end.
+    python re `$` also matches before a final "\\n" -> turn every `$` ( outside of [...] ) into \\Z
+    """
+    out = []
+    i, in_class = 0, False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            out.append(pattern[i : i + 2])
+            i += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+        elif char == "[":
+            # "[]...]" and "[^]...]": the first "]" of a class is a literal
+            end = i + 1 + (pattern[i + 1 : i + 2] == "^")
+            end += pattern[end : end + 1] == "]"
+            out.append(pattern[i:end])
+            i, in_class = end, True
+            continue
+        elif char == "$":
+            char = r"\Z"
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def compile_check(
+    min_length: int | None = None,
+    max_length: int | None = None,
+    pattern: str | None = None,
+    prefixes: Iterable[str] = (),
+    validators: Iterable[Callable[[str], str]] = (),
+) -> Callable[[str], str]:
+    """
+    one function that runs every constraint, raises ValueError like a pydantic validator
+    ( ConstraintError for the limits and the pattern )
+    """
+    prefixes = tuple(prefixes)
+    validators = tuple(validators)
+    literal = None
+    regex = None
+    if pattern is not None:
+        match = _LITERAL.fullmatch(pattern)
+        if match:
+            literal = re.sub(r"\\(.)", r"\1", match.group(1))
+        else:
+            regex = re.compile(_rust_anchors(pattern))
+    low = min_length or 0
+    high = max_length if max_length is not None else float("inf")
+
+    def check_length(value: str) -> None:
+        if len(value) < low:
+            raise ConstraintError(
+                "string_too_short",
+                f"String should have at least {low} {_characters(low)}",
+                {"min_length": low},
+            )
+        if len(value) > high:
+            raise ConstraintError(
+                "string_too_long",
+                f"String should have at most {high} {_characters(high)}",
+                {"max_length": high},
+            )
+
+    def mismatch() -> ConstraintError:
+        return ConstraintError(
+            "string_pattern_mismatch", f"String should match pattern '{pattern}'", {"pattern": pattern}
+        )
+
+    def check(value: str) -> str:
+        if literal is not None:
+            # the pattern allows one string -> its length is the only one that can pass,
+            # the limits are only looked at to report the same error as pydantic
+            if value != literal:
+                check_length(value)
+                raise mismatch()
+        else:
+            check_length(value)
+            if regex is not None and regex.search(value) is None:
+                raise mismatch()
+            if prefixes and not value.startswith(prefixes):
+                raise ValueError(f"String should start with one of {list(prefixes)}")
+        for validator in validators:
+            value = validator(value)
+        return value
+
+    if literal is not None and not low <= len(literal) <= high:
+        raise ValueError(f"pattern {pattern!r} can never pass the length limits")
+    return check
+
+
+class CompiledQuery:
+    """
+    FastAPI dependency for one optional str query parameter with compiled constraints
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        default: str | None = None,
+        description: str | None = None,
+        **constraints,
+    ):
+        self.name = name
+        self.default = default
+        self.check = compile_check(**constraints)
+        schema = {"type": "string"}
+        for key in ("min_length", "max_length", "pattern"):
+            if constraints.get(key) is not None:
+                schema[key.replace("_l", "L")] = constraints[key]
+        self.parameter = {"name": name, "in": "query", "required": False, "schema": schema}
+        if description:
+            self.parameter["description"] = description
+
+    async def __call__(self, request: Request) -> str | None:
+        value = request.query_params.get(self.name)
+        if value is None:
+            return self.default
+        try:
+            return self.check(value)
+        except ConstraintError as e:
+            error = {"type": e.type, "loc": ("query", self.name), "msg": str(e), "input": value, "ctx": e.ctx}
+        except ValueError as e:
+            error = {
+                "type": "value_error",
+                "loc": ("query", self.name),
+                "msg": f"Value error, {e}",
+                "input": value,
+                "ctx": {"error": e},
+            }
+        raise RequestValidationError([error])
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Iterable
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import Any
+
+from fastapi import FastAPI, HTTPException
+
+from item_repository import ItemRepository
+from metrics import Histogram
+
+"""
+write-behind queue in front of an ItemRepository
+
+saving every PUT on its own = one transaction ( one fsync ) per request. in write-behind mode
+the handler only puts the item in a queue and answers 202 Accepted, a background task
+saves the queue in batches:
+
+    write_behind = WriteBehind(items_repo, max_batch=500, max_delay=0.05)
+    app = FastAPI(lifespan=...)  # items_repo.lifespan, then write_behind.lifespan
+    write_behind.install(app)  # queue metrics on /metrics
+
+    status_code = await write_behind.save(item_id, item)  # 202 ( queued ) or 200 ( saved now )
+
+    - the same item_id twice before a flush -> only the newest version is written ( coalesced )
+    - a batch is written when max_batch items are waiting or max_delay seconds after the first one
+    - max_pending items waiting or being written -> save() waits up to max_wait for room,
+      then 503 + Retry-After
+    - a failed batch is tried again ( before anything newer ) and still counts against
+      max_pending -> a database outage can't grow the queue past its bound
+    - shutdown: no new items ( 503 ), everything queued is written before the app stops
+      ( up to drain_timeout, then the queue is dropped )
+
+NOTE:
+    off by default ( $WRITE_BEHIND=1 turns it on ), then save() writes through the repository.
+    202 = accepted, not saved yet: a crash loses what is still in the queue.
+    get() sees queued items -> a client reads its own writes right after the 202.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    def __init__(
+        self,
+        repository: ItemRepository,
+        enabled: bool | None = None,
+        max_batch: int = 500,
+        max_delay: float = 0.05,
+        max_pending: int = 10_000,
+        max_wait: float = 1.0,
+        drain_timeout: float = 30.0,
+        retry_after: int = 1,
+    ):
+        self.repository = repository
+        self.enabled = os.getenv("WRITE_BEHIND") == "1" if enabled is None else enabled
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.drain_timeout = drain_timeout
+        self.retry_after = retry_after
+        self._pending: dict[int, Any] = {}
+        self._flushing: dict[int, Any] = {}
+        self._work = asyncio.Event()  # something is queued
+        self._full = asyncio.Event()  # a whole batch is queued
+        self._space = asyncio.Event()  # the queue has room again
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self.accepted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.flush_time = Histogram()
+
+    def _busy(self, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=503, detail=detail, headers={"Retry-After": str(self.retry_after)}
+        )
+
+    async def save(self, item_id: int, item: Any) -> int:
+        """
+        queue the item ( 202 ) in write-behind mode, else save it right away ( 200 )
+        """
+        if not self.enabled:
+            await self.repository.upsert(item_id, item)
+            return 200
+        await self.submit(item_id, item)
+        return 202
+
+    async def submit(self, item_id: int, item: Any) -> None:
+        if self._closed:
+            raise self._busy("Server is shutting down, try again later.")
+        if item_id in self._pending:
+            self.coalesced += 1
+        else:
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) + len(self._flushing) >= self.max_pending:
+                # backpressure: wait for the flusher to take a batch
+                self._space.clear()
+                try:
+                    await asyncio.wait_for(self._space.wait(), deadline - time.monotonic())
+                except TimeoutError:
+                    self.rejected += 1
+                    raise self._busy("Write queue is full, try again later.")
+                if self._closed:
+                    # shutdown started while it waited -> the drain may be over, never a 202 now
+                    raise self._busy("Server is shutting down, try again later.")
+        self._pending[item_id] = item
+        self.accepted += 1
+        self._work.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    async def get(self, item_id: int) -> Any:
+        """
+        newest version of an item: queued, being written or already saved
+        """
+        for queue in (self._pending, self._flushing):
+            if item_id in queue:
+                return queue[item_id]
+        return await self.repository.get(item_id)
+
+    async def _run(self) -> None:
+        while True:
+            await self._work.wait()
+            if len(self._pending) < self.max_batch and not self._closed:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except TimeoutError:
+                    pass
+            await self._flush_batch()
+            if not self._pending and not self._flushing:
+                self._work.clear()
+                if self._closed:
+                    return
+
+    def _take_batch(self) -> dict[int, Any]:
+        if len(self._pending) <= self.max_batch:
+            batch, self._pending = self._pending, {}
+        else:
+            batch = dict(islice(self._pending.items(), self.max_batch))
+            for item_id in batch:
+                del self._pending[item_id]
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        return batch
+
+    async def _flush_batch(self) -> None:
+        if not self._flushing:
+            if not self._pending:
+                return
+            self._flushing = self._take_batch()
+        # else: the last try failed -> the same batch again, it is older than anything queued
+        batch = self._flushing
+        start = time.perf_counter()
+        try:
+            await self.repository.upsert_many(batch.items())
+        except Exception:
+            self.failures += 1
+            logger.exception("write-behind flush of %d items failed, retrying", len(batch))
+            await asyncio.sleep(self.retry_after)
+            return
+        self._flushing = {}
+        self._space.set()  # room only once the batch is saved
+        self.flush_time.observe(time.perf_counter() - start)
+        self.flushed += len(batch)
+        self.batches += 1
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        stop taking items and write everything that is queued
+
+        best effort after drain_timeout: the flusher is cancelled, the batch it was writing
+        may or may not be committed ( the database finishes or rolls back on its own ).
+        """
+        self._closed = True
+        self._space.set()  # wake the save() calls waiting for room -> 503
+        if self._task is None:
+            return
+        self._work.set()
+        done, _ = await asyncio.wait({self._task}, timeout=self.drain_timeout)
+        if not done:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)  # stopped for real
+            logger.error(
+                "write-behind drain timed out, up to %d items may not be saved",
+                len(self._pending) + len(self._flushing),
+            )
+        self._task = None
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        await self.start()
+        try:
+            yield
+        finally:
+            await self.close()
+
+    def collect(self) -> Iterable[str]:
+        yield "# HELP write_behind_queued Items waiting to be written."
+        yield "# TYPE write_behind_queued gauge"
+        yield f"write_behind_queued {len(self._pending)}"
+        yield "# HELP write_behind_writing Items of the batch being written ( or retried )."
+        yield "# TYPE write_behind_writing gauge"
+        yield f"write_behind_writing {len(self._flushing)}"
+        yield "# HELP write_behind_items_total Items by what happened to them."
+        yield "# TYPE write_behind_items_total counter"
+        for event in ("accepted", "coalesced", "rejected", "flushed"):
+            yield f'write_behind_items_total{{event="{event}"}} {getattr(self, event)}'
+        yield "# HELP write_behind_batches_total Batches written ( ok ) or failed."
+        yield "# TYPE write_behind_batches_total counter"
+        yield f'write_behind_batches_total{{result="ok"}} {self.batches}'
+        yield f'write_behind_batches_total{{result="error"}} {self.failures}'
+        yield "# HELP write_behind_flush_seconds Time to write one batch."
+        yield "# TYPE write_behind_flush_seconds histogram"
+        yield from self.flush_time.lines("write_behind_flush_seconds", 'queue="items"')
+
+    def install(self, app: FastAPI) -> None:
+        """
+        queue size, item / batch counters and flush times on the /metrics of app
+        """
+        app.state.metrics.collectors.append(self.collect)